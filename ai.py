@@ -1,15 +1,18 @@
-#Encapsulates  AI logic (OpenAI API interaction, NLP processing)
-import openai
-import os
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-def generate_feedback(rubric, performance):
-    prompt = f"Generate feedback based on this rubric: {rubric} and student performance: {performance}"
-    response = openai.Completion.create(
-        model="text-davinci-003",
-        prompt=prompt,
-        max_tokens=150,
-        temperature=0.7
-    )
-    return response.choices[0].text.strip()
+#Encapsulates  AI logic (OpenAI API interaction, NLP processing)
+import openai
+import os
+
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+# text-davinci-003 and the Completion endpoint are retired; use a chat model
+MODEL = os.getenv("FEEDBACK_MODEL", "gpt-3.5-turbo")
+
+def generate_feedback(rubric, performance):
+    prompt = f"Generate feedback based on this rubric: {rubric} and student performance: {performance}"
+    response = openai.ChatCompletion.create(
+        model=MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=150,
+        temperature=0.7
+    )
+    return response.choices[0].message.content.strip()
@@ -15,6 +15,31 @@ def create_app(config_class=Config):
     # Initialize extensions
     db.init_app(app)
     
+    from app.nlp import FeedbackGeneratorProvider
+    FeedbackGeneratorProvider(app)
+    
+    from app.rubrics import RubricRegistry
+    RubricRegistry(app)
+    
+    from app.analytics import CohortAnalytics, ScoreHistograms
+    CohortAnalytics(app)
+    ScoreHistograms(app)
+    
+    from app.similarity import FeedbackSimilarityIndex
+    FeedbackSimilarityIndex(app)
+    
+    from app.profile_reuse import ProfileReuseIndex
+    ProfileReuseIndex(app)
+    
+    from app.jobs import job_runner
+    job_runner.init_app(app)
+    
+    from app.regeneration import RegenerationWorker
+    RegenerationWorker(app)
+    
+    from app.utils import metrics
+    metrics.init_app(app)
+    
     # Register blueprints
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
@@ -22,4 +47,11 @@ def create_app(config_class=Config):
     from app.api import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    from app.file_routes import file_bp
+    app.register_blueprint(file_bp, url_prefix='/api')
+    
+    from app.cli import batch_cli, data_cli
+    app.cli.add_command(batch_cli)
+    app.cli.add_command(data_cli)
+    
     return app
\ No newline at end of file
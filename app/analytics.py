@@ -0,0 +1,413 @@
+"""
+Cohort analytics over stored feedback scores
+
+Scores are integers from 1 to 10, so each skill's distribution is small: one
+count per score value. A single GROUP BY query returns every skill's
+histogram, and the mean, median, percentiles and category counts are exact
+functions of those counts. Per-student trends come from a windowed query that
+returns only each student's first and latest evaluation. No feedback rows are
+loaded into Python.
+
+Summaries are cached per filter set and reused until a new feedback row
+arrives, detected from the highest feedback id. ScoreHistograms keeps the
+whole-cohort counts in memory, updated as feedback is committed, for
+percentile lookups while prompts are built.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import func, literal, select, union_all
+
+from app import db
+from app.events import register_feedback_index
+from app.models import Feedback
+from app.search import student_name_filter
+
+SKILLS = ('communication', 'teamwork', 'creativity', 'critical_thinking', 'presentation')
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Same bands as FeedbackGenerator._analyze_performance
+STRENGTH_MIN_SCORE = 8
+GOOD_MIN_SCORE = 6
+
+# Distinct filter combinations kept in memory
+MAX_CACHED_SUMMARIES = 128
+
+
+def percentile(histogram: Dict[int, int], total: int, q: float) -> Optional[float]:
+    """
+    Percentile of the values described by a histogram
+
+    Interpolates linearly between the closest ranks, which matches
+    numpy.percentile on the expanded values.
+
+    Args:
+        histogram: Count of each value
+        total: Sum of the counts
+        q: Percentile between 0 and 100
+
+    Returns:
+        The percentile, or None if there are no values
+    """
+    if total == 0:
+        return None
+
+    position = (total - 1) * q / 100
+    lower_rank = math.floor(position)
+    upper_rank = math.ceil(position)
+
+    lower = upper = None
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if lower is None and seen > lower_rank:
+            lower = value
+        if seen > upper_rank:
+            upper = value
+            break
+
+    return lower + (upper - lower) * (position - lower_rank)
+
+
+def summarize_histogram(histogram: Dict[int, int]) -> Dict:
+    """
+    Statistics and category counts of one skill
+
+    Returns:
+        Dictionary with 'count', 'mean', 'median', 'percentiles',
+        'distribution' (count per score 1-10) and 'categories'
+    """
+    total = sum(histogram.values())
+    mean = sum(score * count for score, count in histogram.items()) / total if total else None
+
+    return {
+        'count': total,
+        'mean': round(mean, 2) if mean is not None else None,
+        'median': percentile(histogram, total, 50),
+        'percentiles': {f'p{q}': percentile(histogram, total, q) for q in PERCENTILES},
+        'distribution': {str(score): histogram.get(score, 0) for score in range(1, 11)},
+        'categories': {
+            'strength': sum(count for score, count in histogram.items() if score >= STRENGTH_MIN_SCORE),
+            'good': sum(count for score, count in histogram.items()
+                        if GOOD_MIN_SCORE <= score < STRENGTH_MIN_SCORE),
+            'improvement': sum(count for score, count in histogram.items() if score < GOOD_MIN_SCORE)
+        }
+    }
+
+
+def skill_score_filters() -> List:
+    """Filters selecting feedback with all five skill scores"""
+    # Rubric feedback stores its scores in criterion_scores instead
+    return [getattr(Feedback, skill).isnot(None) for skill in SKILLS]
+
+
+def histogram_query(filters: List):
+    """
+    Count of each score per skill, as (skill, score, count) rows
+
+    Also returns rows for 'average_score', where score is the sum of the
+    five skill scores.
+    """
+    total = sum(getattr(Feedback, skill) for skill in SKILLS)
+    queries = [
+        select(literal(skill).label('skill'), getattr(Feedback, skill).label('score'), func.count())
+        .where(*filters)
+        .group_by(getattr(Feedback, skill))
+        for skill in SKILLS
+    ]
+    queries.append(
+        select(literal('average_score').label('skill'), total.label('score'), func.count())
+        .where(*filters)
+        .group_by(total)
+    )
+    return union_all(*queries)
+
+
+class CohortAnalytics:
+    """Cached cohort summaries for an application"""
+
+    def __init__(self, app=None):
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the analytics cache with a Flask application"""
+        app.extensions['cohort_analytics'] = self
+
+    def summary(self,
+                since: Optional[datetime] = None,
+                until: Optional[datetime] = None,
+                student_name: Optional[str] = None,
+                match: str = 'contains') -> Dict:
+        """
+        Cohort statistics for feedback with skill scores
+
+        Args:
+            since: Only include feedback created at or after this time
+            until: Only include feedback created before this time
+            student_name: Optional student name search term
+            match: 'contains' or 'prefix', see app.search.student_name_filter
+
+        Returns:
+            Dictionary with 'evaluations', 'students', 'skills' (statistics
+            per skill), 'average_score' (statistics of the per-evaluation
+            average) and 'trends' (per student, largest improvement first)
+        """
+        key = (since, until, student_name, match)
+        version = db.session.execute(select(func.max(Feedback.id))).scalar()
+
+        with self._lock:
+            cached = self._summaries.get(key)
+            if cached is not None and cached[0] == version:
+                self._summaries.move_to_end(key)
+                return cached[1]
+
+        result = self._compute(self._filters(since, until, student_name, match))
+        result['data_version'] = version
+
+        with self._lock:
+            self._summaries[key] = (version, result)
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > MAX_CACHED_SUMMARIES:
+                self._summaries.popitem(last=False)
+
+        return result
+
+    def invalidate(self) -> None:
+        """Drop all cached summaries"""
+        with self._lock:
+            self._summaries.clear()
+
+    @staticmethod
+    def _filters(since, until, student_name, match) -> List:
+        filters = skill_score_filters()
+        if since is not None:
+            filters.append(Feedback.created_at >= since)
+        if until is not None:
+            filters.append(Feedback.created_at < until)
+        if student_name:
+            filters.append(student_name_filter(student_name, match=match))
+        return filters
+
+    def _compute(self, filters: List) -> Dict:
+        histograms = {skill: {} for skill in SKILLS}
+        histograms['average_score'] = {}
+
+        for skill, score, count in db.session.execute(histogram_query(filters)):
+            histograms[skill][score] = count
+
+        skills = {skill: summarize_histogram(histograms[skill]) for skill in SKILLS}
+
+        # Per-evaluation averages are multiples of 0.2, counted as integer totals
+        totals = histograms.pop('average_score')
+        averages = {total / len(SKILLS): count for total, count in totals.items()}
+        evaluations = sum(averages.values())
+        average_score = {
+            'mean': round(sum(value * count for value, count in averages.items()) / evaluations, 2)
+            if evaluations else None,
+            'median': percentile(averages, evaluations, 50),
+            'percentiles': {f'p{q}': percentile(averages, evaluations, q) for q in PERCENTILES}
+        }
+
+        trends = self._trends(filters)
+
+        return {
+            'evaluations': evaluations,
+            'students': len(trends),
+            'skills': skills,
+            'average_score': average_score,
+            'trends': trends
+        }
+
+    @staticmethod
+    def _trends(filters: List) -> List[Dict]:
+        total = sum(getattr(Feedback, skill) for skill in SKILLS)
+        ranked = select(
+            Feedback.student_name,
+            Feedback.created_at,
+            total.label('total'),
+            func.row_number().over(
+                partition_by=Feedback.student_name,
+                order_by=(Feedback.created_at, Feedback.id)
+            ).label('first_rank'),
+            func.row_number().over(
+                partition_by=Feedback.student_name,
+                order_by=(Feedback.created_at.desc(), Feedback.id.desc())
+            ).label('last_rank'),
+            func.count().over(partition_by=Feedback.student_name).label('evaluations')
+        ).where(*filters).subquery()
+
+        rows = db.session.execute(
+            select(ranked.c.student_name, ranked.c.created_at, ranked.c.total,
+                   ranked.c.first_rank, ranked.c.evaluations)
+            .where((ranked.c.first_rank == 1) | (ranked.c.last_rank == 1))
+        )
+
+        endpoints: Dict[str, Dict[str, Tuple]] = {}
+        for student_name, created_at, total_score, first_rank, evaluations in rows:
+            entry = endpoints.setdefault(student_name, {'evaluations': evaluations})
+            point = (total_score / len(SKILLS), created_at)
+            if first_rank == 1:
+                entry['first'] = point
+            if first_rank == evaluations:
+                entry['latest'] = point
+
+        trends = []
+        for student_name, entry in endpoints.items():
+            (first_average, first_at), (latest_average, latest_at) = entry['first'], entry['latest']
+            trends.append({
+                'student_name': student_name,
+                'evaluations': entry['evaluations'],
+                'first_average': round(first_average, 2),
+                'latest_average': round(latest_average, 2),
+                'change': round(latest_average - first_average, 2),
+                'first_at': first_at.isoformat() if first_at else None,
+                'latest_at': latest_at.isoformat() if latest_at else None
+            })
+
+        trends.sort(key=lambda trend: (-trend['change'], trend['student_name']))
+        return trends
+
+
+def get_cohort_analytics() -> CohortAnalytics:
+    """Cohort analytics of the current application"""
+    return current_app.extensions['cohort_analytics']
+
+
+class ScoreHistograms:
+    """
+    Per-skill score counts kept in memory for percentile lookups
+
+    Loaded from the database with one query and then updated as feedback
+    with skill scores is committed in this process, so a percentile is a
+    lookup into ten precomputed cumulative counts. Inserts from other worker
+    processes are picked up when COHORT_STATS_TTL expires.
+    """
+
+    def __init__(self, app=None):
+        # (total, counts, cumulative counts), replaced as a whole so readers
+        # always see one consistent snapshot; None until loaded
+        self._state = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the histograms with a Flask application"""
+        self.app = app
+        self.ttl = app.config['COHORT_STATS_TTL']
+        self.min_cohort_size = app.config['COHORT_MIN_SIZE']
+        app.extensions['score_histograms'] = self
+        register_feedback_index(app, self, SKILLS)
+
+    def percentile(self, skill: str, score: int) -> Optional[float]:
+        """
+        Percentile rank of a score within the cohort
+
+        Counts the evaluations scoring below it plus half of those with the
+        same score.
+
+        Returns:
+            Percentile between 0 and 100, or None while the cohort is smaller
+            than COHORT_MIN_SIZE
+        """
+        total, counts, below = self._get_state()
+        if total < self.min_cohort_size:
+            return None
+        return 100 * (below[skill][score] + counts[skill][score] / 2) / total
+
+    def standing(self, scores: Dict[str, int]) -> Optional[Dict]:
+        """
+        Percentile rank of each skill score
+
+        Returns:
+            Dictionary with 'cohort_size' and 'percentiles' keyed by skill, or
+            None while the cohort is smaller than COHORT_MIN_SIZE
+        """
+        total, counts, below = self._get_state()
+        if total < self.min_cohort_size:
+            return None
+
+        return {
+            'cohort_size': total,
+            'percentiles': {
+                skill: 100 * (below[skill][scores[skill]] + counts[skill][scores[skill]] / 2) / total
+                for skill in SKILLS
+            }
+        }
+
+    def add(self, rows: List[Dict]) -> None:
+        """Add committed feedback rows to the histograms"""
+        with self._lock:
+            if self._state is None:
+                # Not loaded yet; the first load reads these rows from the database
+                return
+
+            total, counts, _ = self._state
+            counts = {skill: list(values) for skill, values in counts.items()}
+            added = 0
+            for row in rows:
+                if all(1 <= (row.get(skill) or 0) <= 10 for skill in SKILLS):
+                    for skill in SKILLS:
+                        counts[skill][row[skill]] += 1
+                    added += 1
+
+            if added:
+                self._state = (total + added, counts, self._cumulative(counts))
+
+    def invalidate(self) -> None:
+        """Reload the histograms on the next lookup"""
+        with self._lock:
+            self._state = None
+
+    @staticmethod
+    def _cumulative(counts: Dict[str, List[int]]) -> Dict[str, List[int]]:
+        # below[skill][score] is the number of evaluations scoring less than score
+        below = {}
+        for skill in SKILLS:
+            running = 0
+            below[skill] = [0] * 11
+            for score in range(1, 11):
+                below[skill][score] = running
+                running += counts[skill][score]
+        return below
+
+    def _get_state(self) -> Tuple[int, Dict[str, List[int]], Dict[str, List[int]]]:
+        state = self._state
+        if state is None or (self.ttl and time.monotonic() - self._loaded_at > self.ttl):
+            with self._lock:
+                if self._state is state:
+                    self._state = self._load()
+                    self._loaded_at = time.monotonic()
+                state = self._state
+        return state
+
+    def _load(self) -> Tuple[int, Dict[str, List[int]], Dict[str, List[int]]]:
+        counts = {skill: [0] * 11 for skill in SKILLS}
+        total = 0
+
+        # A fresh application context lets worker threads use the histograms too
+        with self.app.app_context():
+            rows = db.session.execute(histogram_query(skill_score_filters())).all()
+
+        for skill, score, count in rows:
+            if skill in counts and 1 <= score <= 10:
+                counts[skill][score] = count
+            elif skill == 'average_score':
+                total += count
+
+        return total, counts, self._cumulative(counts)
+
+
+def get_score_histograms() -> ScoreHistograms:
+    """Score histograms of the current application"""
+    return current_app.extensions['score_histograms']
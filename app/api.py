@@ -1,19 +1,26 @@
 """
 API routes for the Auto Feedback Generator
 """
-from flask import Blueprint, request, jsonify
-from app.nlp import FeedbackGenerator
+from flask import Blueprint, request, jsonify, current_app, url_for, Response, stream_with_context
+from app.nlp import get_feedback_generator
+from app.analytics import get_cohort_analytics
 from app.models import Feedback, Student, db
-from app.utils.validators import validate_feedback_request
+from app.jobs import job_runner, get_job, get_job_results
+from app.regeneration import get_regeneration_worker
+from app.rubrics import get_rubric_registry, record_rubric_feedback
+from app.search import student_name_filter
+from app.utils.bulk_insert import bulk_insert_feedback, feedback_row
+from app.utils.metrics import REGISTRY, stage_timer
+from app.utils.pagination import keyset_paginate
+from app.utils.validators import validate_feedback_request, validate_batch_request, validate_rubric_feedback_request
+from datetime import datetime
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('api', __name__)
 
-# Initialize feedback generator
-feedback_generator = FeedbackGenerator()
-
 @bp.route('/generate-feedback', methods=['POST'])
 def generate_feedback():
     """Generate feedback for a student based on performance scores"""
@@ -41,11 +48,12 @@ def generate_feedback():
         feedback_type = data.get('feedback_type', 'comprehensive')
         
         # Generate feedback
-        feedback_text = feedback_generator.generate_feedback(
+        generated = get_feedback_generator().generate_feedback_with_metadata(
             student_name=student_name,
             scores=scores,
             feedback_type=feedback_type
         )
+        feedback_text = generated['feedback']
         
         # Save to database
         feedback_record = Feedback(
@@ -55,11 +63,15 @@ def generate_feedback():
             creativity=scores['creativity'],
             critical_thinking=scores['critical_thinking'],
             presentation=scores['presentation'],
-            feedback_text=feedback_text
+            feedback_text=feedback_text,
+            model_used=generated['model_used'],
+            feedback_type=feedback_type,
+            template_version=generated.get('template_version')
         )
         
         db.session.add(feedback_record)
-        db.session.commit()
+        with stage_timer('db_commit'):
+            db.session.commit()
         
         # Return response
         response = {
@@ -67,7 +79,8 @@ def generate_feedback():
             'feedback': feedback_text,
             'student_name': student_name,
             'scores': scores,
-            'feedback_id': feedback_record.id
+            'feedback_id': feedback_record.id,
+            'model_used': generated['model_used']
         }
         
         logger.info(f"Generated feedback for {student_name} (ID: {feedback_record.id})")
@@ -80,6 +93,85 @@ def generate_feedback():
             'error': 'Internal server error occurred while generating feedback'
         }), 500
 
+@bp.route('/generate-feedback/stream', methods=['POST'])
+def stream_feedback():
+    """Generate feedback and stream it to the client as Server-Sent Events"""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No JSON data provided'}), 400
+    
+    validation_result = validate_feedback_request(data)
+    if not validation_result['valid']:
+        return jsonify({'error': validation_result['message']}), 400
+    
+    student_name = data['student_name']
+    scores = {
+        'communication': data['communication'],
+        'teamwork': data['teamwork'],
+        'creativity': data['creativity'],
+        'critical_thinking': data['critical_thinking'],
+        'presentation': data['presentation']
+    }
+    feedback_type = data.get('feedback_type', 'comprehensive')
+    
+    try:
+        feedback_generator = get_feedback_generator()
+    except Exception as e:
+        logger.error(f"Error in stream_feedback: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error occurred while generating feedback'
+        }), 500
+    
+    def events():
+        for event in feedback_generator.stream_feedback(student_name, scores, feedback_type):
+            if event['type'] == 'token':
+                yield _sse('token', {'content': event['content']})
+                continue
+            
+            # Persist once the stream has completed
+            try:
+                feedback_record = Feedback(
+                    student_name=student_name,
+                    communication=scores['communication'],
+                    teamwork=scores['teamwork'],
+                    creativity=scores['creativity'],
+                    critical_thinking=scores['critical_thinking'],
+                    presentation=scores['presentation'],
+                    feedback_text=event['feedback'],
+                    model_used=event['model_used'],
+                    feedback_type=feedback_type,
+                    template_version=event.get('template_version')
+                )
+                db.session.add(feedback_record)
+                with stage_timer('db_commit'):
+                    db.session.commit()
+                
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error saving streamed feedback for {student_name}: {str(e)}")
+                yield _sse('error', {'error': 'Feedback was generated but could not be saved'})
+                return
+            
+            logger.info(f"Streamed feedback for {student_name} (ID: {feedback_record.id})")
+            yield _sse('done', {
+                'success': True,
+                'feedback': event['feedback'],
+                'student_name': student_name,
+                'scores': scores,
+                'feedback_id': feedback_record.id,
+                'model_used': event['model_used']
+            })
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Disable proxy buffering so tokens arrive immediately
+    })
+
+def _sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @bp.route('/batch-feedback', methods=['POST'])
 def batch_generate_feedback():
     """Generate feedback for multiple students"""
@@ -93,33 +185,36 @@ def batch_generate_feedback():
             return jsonify({'error': 'Students data must be a list'}), 400
         
         # Process batch
-        results = feedback_generator.batch_generate_feedback(students_data)
+        results = get_feedback_generator().batch_generate_feedback(
+            students_data,
+            max_workers=current_app.config['FEEDBACK_BATCH_CONCURRENCY'],
+            pack_size=current_app.config['FEEDBACK_PACK_SIZE']
+        )
         
-        # Save successful results to database
-        saved_count = 0
-        for result in results:
+        # Results are in input order, so pair each result with its input by index
+        saved_results = []
+        rows = []
+        for result, student_data in zip(results, students_data):
             if result['status'] == 'success':
                 try:
-                    student_data = next(s for s in students_data if s['student_name'] == result['student_name'])
-                    scores = student_data['scores']
-                    
-                    feedback_record = Feedback(
-                        student_name=result['student_name'],
-                        communication=scores['communication'],
-                        teamwork=scores['teamwork'],
-                        creativity=scores['creativity'],
-                        critical_thinking=scores['critical_thinking'],
-                        presentation=scores['presentation'],
-                        feedback_text=result['feedback']
-                    )
-                    
-                    db.session.add(feedback_record)
-                    saved_count += 1
+                    rows.append(feedback_row(result['student_name'], student_data['scores'],
+                                             result['feedback'], result.get('model_used'),
+                                             result.get('template_version'),
+                                             student_data.get('feedback_type', 'comprehensive')))
+                    saved_results.append(result)
                     
                 except Exception as e:
                     logger.error(f"Error saving feedback for {result['student_name']}: {str(e)}")
         
-        db.session.commit()
+        # Save successful results to database; chunked inserts commit per chunk,
+        # FEEDBACK_BULK_CHUNK_SIZE=0 inserts in one statement left for us to commit
+        with stage_timer('db_commit'):
+            feedback_ids = bulk_insert_feedback(rows, chunk_size=current_app.config['FEEDBACK_BULK_CHUNK_SIZE'])
+            db.session.commit()
+        
+        for result, feedback_id in zip(saved_results, feedback_ids):
+            result['feedback_id'] = feedback_id
+        saved_count = len(feedback_ids)
         
         return jsonify({
             'success': True,
@@ -135,6 +230,132 @@ def batch_generate_feedback():
             'error': 'Internal server error occurred during batch processing'
         }), 500
 
+@bp.route('/jobs', methods=['POST'])
+def submit_batch_job():
+    """Submit a batch feedback job and return its id immediately"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        
+        validation_result = validate_batch_request(
+            data, max_students=current_app.config['JOB_MAX_STUDENTS']
+        )
+        if not validation_result['valid']:
+            return jsonify({'error': validation_result['message']}), 400
+        
+        job = job_runner.create_job(data['students'])
+        job_runner.submit(job.id, get_feedback_generator())
+        
+        logger.info(f"Submitted batch job {job.id} with {job.total} students")
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'status_url': url_for('api.get_batch_job', job_id=job.id),
+            'results_url': url_for('api.get_batch_job_results', job_id=job.id)
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"Error in submit_batch_job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error occurred while submitting batch job'
+        }), 500
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def get_batch_job(job_id):
+    """Retrieve the status of a batch job"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    }), 200
+
+@bp.route('/jobs/<job_id>/results', methods=['GET'])
+def get_batch_job_results(job_id):
+    """Retrieve results completed since the last poll"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    after = request.args.get('after', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(),
+        **get_job_results(job, after=after, limit=limit)
+    }), 200
+
+@bp.route('/rubrics/<int:rubric_id>', methods=['GET'])
+def get_rubric(rubric_id):
+    """Retrieve a rubric and its criteria"""
+    rubric = get_rubric_registry().get(rubric_id)
+    if rubric is None:
+        return jsonify({'success': False, 'error': 'Rubric not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'rubric': rubric
+    }), 200
+
+@bp.route('/rubrics/<int:rubric_id>/feedback', methods=['POST'])
+def generate_rubric_feedback(rubric_id):
+    """Generate feedback for scores on any rubric"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        
+        validation_result = validate_rubric_feedback_request(data)
+        if not validation_result['valid']:
+            return jsonify({'error': validation_result['message']}), 400
+        
+        rubric = get_rubric_registry().compiled(rubric_id)
+        if rubric is None:
+            return jsonify({'success': False, 'error': 'Rubric not found'}), 404
+        
+        try:
+            vector = rubric.vector(data['scores'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        student_name = data['student_name'].strip()
+        generated = get_feedback_generator().generate_rubric_feedback(
+            student_name=student_name,
+            rubric=rubric,
+            vector=vector,
+            feedback_type=data.get('feedback_type', 'comprehensive')
+        )
+        
+        feedback_record = record_rubric_feedback(
+            student_name, rubric, vector, generated, evaluator_id=data.get('evaluator_id')
+        )
+        
+        logger.info(f"Generated {rubric.name} feedback for {student_name} (ID: {feedback_record.id})")
+        return jsonify({
+            'success': True,
+            'feedback': generated['feedback'],
+            'student_name': student_name,
+            'rubric_id': rubric.id,
+            'rubric_name': rubric.name,
+            'scores': rubric.scores_dict(vector),
+            'feedback_id': feedback_record.id,
+            'mentor_input_id': feedback_record.mentor_input_id,
+            'model_used': generated['model_used']
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in generate_rubric_feedback: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error occurred while generating feedback'
+        }), 500
+
 @bp.route('/feedback/<int:feedback_id>', methods=['GET'])
 def get_feedback(feedback_id):
     """Retrieve a specific feedback record"""
@@ -154,31 +375,67 @@ def get_feedback(feedback_id):
 
 @bp.route('/feedback', methods=['GET'])
 def list_feedback():
-    """List all feedback records with pagination"""
+    """
+    List feedback records, newest first
+    
+    Uses cursor pagination by default: pass the returned next_cursor as
+    ?cursor= to fetch the following page, and include_total=true to also
+    count all matching rows. Passing ?page= selects the legacy offset mode.
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        per_page = min(request.args.get('per_page', 10, type=int), 100)
         student_name = request.args.get('student_name')
+        match = request.args.get('match', 'contains')
+        model_used = request.args.get('model_used')
+        
+        if match not in ('contains', 'prefix'):
+            return jsonify({'error': 'match must be one of: contains, prefix'}), 400
         
         query = Feedback.query
         
         if student_name:
-            query = query.filter(Feedback.student_name.ilike(f'%{student_name}%'))
+            query = query.filter(student_name_filter(student_name, match=match))
+        if model_used:
+            query = query.filter(Feedback.model_used == model_used)
         
-        feedbacks = query.order_by(Feedback.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        if 'page' in request.args:
+            page = request.args.get('page', 1, type=int)
+            feedbacks = query.order_by(Feedback.created_at.desc(), Feedback.id.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            
+            return jsonify({
+                'success': True,
+                'feedbacks': [f.to_dict() for f in feedbacks.items],
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': feedbacks.total,
+                    'pages': feedbacks.pages,
+                    'has_next': feedbacks.has_next,
+                    'has_prev': feedbacks.has_prev
+                }
+            }), 200
+        
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        try:
+            result = keyset_paginate(
+                query, Feedback.created_at, Feedback.id,
+                per_page=per_page,
+                cursor=request.args.get('cursor'),
+                include_total=include_total
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'success': True,
-            'feedbacks': [f.to_dict() for f in feedbacks.items],
+            'feedbacks': [f.to_dict() for f in result['items']],
             'pagination': {
-                'page': page,
                 'per_page': per_page,
-                'total': feedbacks.total,
-                'pages': feedbacks.pages,
-                'has_next': feedbacks.has_next,
-                'has_prev': feedbacks.has_prev
+                'next_cursor': result['next_cursor'],
+                'has_next': result['has_next'],
+                'total': result['total']
             }
         }), 200
         
@@ -189,11 +446,111 @@ def list_feedback():
             'error': 'Error retrieving feedback list'
         }), 500
 
+@bp.route('/analytics/cohort', methods=['GET'])
+def cohort_analytics():
+    """
+    Per-skill statistics, distributions and student trends for a cohort
+    
+    Optional filters: since and until (ISO dates, until exclusive),
+    student_name with match. trend_limit caps the number of students in
+    trends, and trend_order=declining lists the largest drops first.
+    """
+    try:
+        match = request.args.get('match', 'contains')
+        trend_order = request.args.get('trend_order', 'improving')
+        trend_limit = min(request.args.get('trend_limit', 20, type=int), 500)
+        
+        if match not in ('contains', 'prefix'):
+            return jsonify({'error': 'match must be one of: contains, prefix'}), 400
+        if trend_order not in ('improving', 'declining'):
+            return jsonify({'error': 'trend_order must be one of: improving, declining'}), 400
+        
+        try:
+            since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+            until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        except ValueError:
+            return jsonify({'error': 'since and until must be ISO dates'}), 400
+        
+        summary = get_cohort_analytics().summary(
+            since=since,
+            until=until,
+            student_name=request.args.get('student_name'),
+            match=match
+        )
+        
+        trends = summary['trends']
+        if trend_order == 'declining':
+            trends = trends[::-1]
+        
+        return jsonify({
+            'success': True,
+            'analytics': {**summary, 'trends': trends[:max(trend_limit, 0)]}
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error computing cohort analytics: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Error computing cohort analytics'
+        }), 500
+
+@bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Response cache hit/miss counters and score-profile reuse ratio"""
+    try:
+        feedback_generator = get_feedback_generator()
+        cache = feedback_generator.cache
+    except Exception as e:
+        logger.error(f"Error reading cache stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Feedback generator unavailable'}), 500
+    
+    return jsonify({
+        'success': True,
+        'enabled': cache is not None,
+        'stats': cache.stats() if cache is not None else None,
+        'profile_reuse': {
+            'enabled': feedback_generator.profile_index is not None,
+            **feedback_generator.reuse_stats()
+        }
+    }), 200
+
+@bp.route('/regeneration/stats', methods=['GET'])
+def regeneration_stats():
+    """Regeneration queue counts by task status"""
+    try:
+        return jsonify({'success': True, **get_regeneration_worker().stats()}), 200
+    except Exception as e:
+        logger.error(f"Error reading regeneration stats: {str(e)}")
+        return jsonify({'success': False, 'error': 'Error reading regeneration stats'}), 500
+
+@bp.route('/models', methods=['GET'])
+def model_routes():
+    """Model routes per feedback type with their prices, error rates and latencies"""
+    try:
+        router = get_feedback_generator().model_router
+    except Exception as e:
+        logger.error(f"Error reading model routes: {str(e)}")
+        return jsonify({'success': False, 'error': 'Feedback generator unavailable'}), 500
+
+    return jsonify({
+        'success': True,
+        'budget_per_student': router.budget_per_student,
+        'max_latency': router.max_latency,
+        'routes': router.stats()
+    }), 200
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Pipeline stage latencies, result sources and token counts for Prometheus"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    breakers = current_app.extensions['feedback_generator'].circuit_breakers
     return jsonify({
         'status': 'healthy',
         'service': 'Auto Feedback Generator API',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'llm_circuits': breakers.stats() if breakers is not None else None
     }), 200
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""
+Command line tools
+
+Data import:
+
+    flask --app "app:create_app()" data import-performance student_performance_list.csv --rubrics rubrics.csv
+    flask --app "app:create_app()" data sign-feedback
+    flask --app "app:create_app()" data regenerate [--limit 500]
+
+Offline batch generation:
+
+    flask --app "app:create_app()" batch prepare student_performance_list.csv requests.jsonl --rubrics rubrics.csv
+    flask --app "app:create_app()" batch submit requests.jsonl [--local]
+    flask --app "app:create_app()" batch status <job_id>
+    flask --app "app:create_app()" batch download <job_id> results.jsonl
+    flask --app "app:create_app()" batch load results.jsonl
+"""
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app import db
+from app.models import BatchJob
+from app import ingest, offline_batch
+from app.nlp import get_feedback_generator
+from app.regeneration import get_regeneration_worker
+from app.similarity import backfill_signatures
+
+data_cli = AppGroup('data', help='Import data into the normalized schema')
+batch_cli = AppGroup('batch', help='Offline bulk feedback generation through the Batch API')
+
+
+def _backend(job: BatchJob = None, local: bool = False):
+    if local or (job is not None and (job.external_batch_id or '').startswith('local:')):
+        return offline_batch.LocalBatchBackend()
+
+    api_key = current_app.config['OPENAI_API_KEY']
+    if not api_key:
+        raise click.ClickException('OPENAI_API_KEY is required to use the Batch API')
+    return offline_batch.OpenAIBatchBackend(api_key)
+
+
+def _get_job(job_id: str) -> BatchJob:
+    job = db.session.get(BatchJob, job_id)
+    if job is None:
+        raise click.ClickException(f'Batch job {job_id} not found')
+    if not job.external_batch_id:
+        raise click.ClickException(f'Batch job {job_id} has not been submitted')
+    return job
+
+
+@data_cli.command('import-performance')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--rubrics', 'rubrics_path', default=None, type=click.Path(exists=True, dir_okay=False),
+              help='Rubric definitions CSV; rubrics missing from the database are created first')
+@click.option('--chunk-size', default=None, type=int,
+              help='Rows inserted per transaction [default: IMPORT_CHUNK_SIZE]')
+@click.option('--force', is_flag=True,
+              help='Import every row again as new evaluations, even if this file was imported before')
+def import_performance(csv_path, rubrics_path, chunk_size, force):
+    """Import a student performance CSV into mentor inputs and performance data"""
+    if rubrics_path:
+        created = ingest.sync_rubrics(ingest.load_rubric_criteria(rubrics_path))
+        click.echo(f'Created {created} rubrics from {rubrics_path}')
+
+    def report(stats):
+        click.echo(f"  {stats['rows_imported']} rows imported, {stats['rows_skipped']} skipped "
+                   f"({stats['rows_per_second']:.0f} rows/s)")
+
+    stats = ingest.import_performance_csv(
+        csv_path, chunk_size or current_app.config['IMPORT_CHUNK_SIZE'], progress=report, force=force
+    )
+    click.echo(f"Imported {stats['rows_imported']} rows ({stats['scores_imported']} scores, "
+               f"{stats['students_created']} new students) in {stats['elapsed_seconds']:.2f}s, "
+               f"{stats['rows_per_second']:.0f} rows/s; {stats['rows_skipped']} rows skipped")
+    if stats['rows_already_imported']:
+        click.echo(f"{stats['rows_already_imported']} rows were already imported from this file "
+                   f"and were skipped; use --force to import them again")
+
+
+@data_cli.command('sign-feedback')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows updated per transaction')
+def sign_feedback(chunk_size):
+    """Compute near-duplicate signatures for feedback stored without one"""
+    start = time.perf_counter()
+    updated = backfill_signatures(chunk_size, progress=lambda count: click.echo(f'  {count} rows signed'))
+    elapsed = time.perf_counter() - start
+    click.echo(f'Signed {updated} feedback rows in {elapsed:.2f}s')
+
+
+@data_cli.command('regenerate')
+@click.option('--limit', default=None, type=int, help='Maximum number of feedback rows to regenerate')
+def regenerate(limit):
+    """Regenerate fallback, degraded and overflow feedback with the LLM"""
+    start = time.perf_counter()
+    counts = get_regeneration_worker().run_once(get_feedback_generator(), limit=limit)
+    elapsed = time.perf_counter() - start
+    click.echo(f"Queued {counts['queued']} rows; regenerated {counts['regenerated']}, "
+               f"{counts['retried']} to retry, {counts['failed']} failed in {elapsed:.2f}s")
+
+
+@batch_cli.command('prepare')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output_path', type=click.Path(dir_okay=False))
+@click.option('--rubrics', 'rubrics_path', default='rubrics.csv', show_default=True,
+              type=click.Path(exists=True, dir_okay=False), help='Rubric definitions CSV')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows inserted per database write')
+def prepare(csv_path, output_path, rubrics_path, chunk_size):
+    """Write a Batch API request file from a student performance CSV"""
+    rubrics = ingest.load_rubric_criteria(rubrics_path)
+    job = offline_batch.prepare_batch_file(csv_path, output_path, rubrics, chunk_size)
+    click.echo(f'Prepared {job.total} requests in {output_path} (job {job.id})')
+
+
+@batch_cli.command('submit')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--local', is_flag=True, help='Answer the requests locally instead of calling the API')
+def submit(path, local):
+    """Upload a prepared request file and create a batch"""
+    job = offline_batch.submit_batch_file(path, _backend(local=local))
+    click.echo(f'Submitted job {job.id} as batch {job.external_batch_id}')
+
+
+@batch_cli.command('status')
+@click.argument('job_id')
+def status(job_id):
+    """Show the status of a submitted batch"""
+    job = _get_job(job_id)
+    batch = _backend(job).status(job.external_batch_id)
+    click.echo(f"Batch {job.external_batch_id}: {batch.get('status')}")
+    counts = batch.get('request_counts')
+    if counts:
+        click.echo(f"  completed {counts.get('completed', 0)}, failed {counts.get('failed', 0)}, "
+                   f"total {counts.get('total', 0)}")
+
+
+@batch_cli.command('download')
+@click.argument('job_id')
+@click.argument('output_path', type=click.Path(dir_okay=False))
+def download(job_id, output_path):
+    """Download the results file of a finished batch"""
+    job = _get_job(job_id)
+    if _backend(job).download(job.external_batch_id, output_path) is None:
+        raise click.ClickException(f'Batch {job.external_batch_id} has no results yet')
+    click.echo(f'Saved results to {output_path}')
+
+
+@batch_cli.command('load')
+@click.argument('results_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=None, type=int,
+              help='Results inserted per transaction [default: FEEDBACK_BULK_CHUNK_SIZE]')
+def load(results_path, chunk_size):
+    """Load a Batch API results file into the feedback table"""
+    counts = offline_batch.load_batch_results(
+        results_path, chunk_size or current_app.config['FEEDBACK_BULK_CHUNK_SIZE']
+    )
+    click.echo(f"Loaded {counts['loaded']} feedback entries "
+               f"({counts['failed']} failed, {counts['skipped']} already loaded)")
@@ -11,6 +11,10 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     
+    # OpenAI-compatible API to call instead of api.openai.com, e.g. the
+    # benchmark stub server (benchmarks/mock_llm.py)
+    OPENAI_API_BASE = os.environ.get('OPENAI_API_BASE')
+    
     # Database configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///feedback.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -18,6 +22,119 @@ class Config:
     # Application settings
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     
+    # OpenAI client: pooled keep-alive connections per worker process, timeouts
+    # in seconds, retries for rate limits and server errors, and an optional
+    # client-side request limit (0 = follow the API rate-limit headers only)
+    OPENAI_HTTP_POOL_SIZE = int(os.environ.get('OPENAI_HTTP_POOL_SIZE', 16))
+    OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 5))
+    OPENAI_REQUEST_TIMEOUT = float(os.environ.get('OPENAI_REQUEST_TIMEOUT', 30))
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 3))
+    OPENAI_REQUESTS_PER_MINUTE = int(os.environ.get('OPENAI_REQUESTS_PER_MINUTE', 0))
+    
+    # Circuit breaker: once LLM_BREAKER_MIN_CALLS calls were made in the window
+    # (seconds) and the share of failed calls, or of calls slower than
+    # LLM_BREAKER_SLOW_SECONDS, reaches its rate, requests get local feedback
+    # (model_used 'local-fallback') without calling the LLM. After
+    # LLM_BREAKER_OPEN_SECONDS, LLM_BREAKER_PROBES successful calls close it again
+    LLM_BREAKER = os.environ.get('LLM_BREAKER', 'True').lower() == 'true'
+    LLM_BREAKER_WINDOW = float(os.environ.get('LLM_BREAKER_WINDOW', 60))
+    LLM_BREAKER_MIN_CALLS = int(os.environ.get('LLM_BREAKER_MIN_CALLS', 10))
+    LLM_BREAKER_ERROR_RATE = float(os.environ.get('LLM_BREAKER_ERROR_RATE', 0.5))
+    LLM_BREAKER_SLOW_SECONDS = float(os.environ.get('LLM_BREAKER_SLOW_SECONDS', 20))
+    LLM_BREAKER_SLOW_RATE = float(os.environ.get('LLM_BREAKER_SLOW_RATE', 0.5))
+    LLM_BREAKER_OPEN_SECONDS = float(os.environ.get('LLM_BREAKER_OPEN_SECONDS', 30))
+    LLM_BREAKER_PROBES = int(os.environ.get('LLM_BREAKER_PROBES', 2))
+    
+    # Model routing: comma-separated provider:model routes per feedback type in
+    # order of preference ('openai' or 'local', the offline stub provider).
+    # Routes whose estimated cost exceeds FEEDBACK_BUDGET_PER_STUDENT (USD,
+    # 0 = no limit) or whose error rate in the LLM_BREAKER_WINDOW reaches
+    # LLM_BREAKER_ERROR_RATE are skipped; when the preferred route averages more
+    # than FEEDBACK_ROUTER_MAX_LATENCY seconds (0 = ignore) the fastest is used.
+    # FEEDBACK_MODEL_PRICES adds or overrides USD per 1K prompt/completion tokens
+    FEEDBACK_MODELS_COMPREHENSIVE = os.environ.get('FEEDBACK_MODELS_COMPREHENSIVE', 'openai:gpt-3.5-turbo')
+    FEEDBACK_MODELS_BRIEF = os.environ.get('FEEDBACK_MODELS_BRIEF', 'openai:gpt-3.5-turbo')
+    FEEDBACK_MODEL_PRICES = os.environ.get('FEEDBACK_MODEL_PRICES', '')
+    FEEDBACK_BUDGET_PER_STUDENT = float(os.environ.get('FEEDBACK_BUDGET_PER_STUDENT', 0))
+    FEEDBACK_ROUTER_MAX_LATENCY = float(os.environ.get('FEEDBACK_ROUTER_MAX_LATENCY', 0))
+    
+    # Optional markdown file whose '### <name>' sections replace built-in prompt templates
+    PROMPT_TEMPLATES_PATH = os.environ.get('PROMPT_TEMPLATES_PATH')
+    
+    # Feedback generation settings
+    FEEDBACK_BATCH_CONCURRENCY = int(os.environ.get('FEEDBACK_BATCH_CONCURRENCY', 8))
+    
+    # Students combined into one LLM request by batch generation (0 = one request per student)
+    FEEDBACK_PACK_SIZE = int(os.environ.get('FEEDBACK_PACK_SIZE', 0))
+    
+    # Concurrent LLM calls per process before requests overflow to local
+    # template rendering (0 = never overflow)
+    FEEDBACK_LLM_MAX_INFLIGHT = int(os.environ.get('FEEDBACK_LLM_MAX_INFLIGHT', 0))
+    
+    # Tell the model where each score ranks within the cohort of stored feedback
+    FEEDBACK_COHORT_CONTEXT = os.environ.get('FEEDBACK_COHORT_CONTEXT', 'False').lower() == 'true'
+    
+    # Evaluations needed before percentiles are reported, and seconds before a
+    # worker reloads the score histograms to include other processes' inserts (0 = never)
+    COHORT_MIN_SIZE = int(os.environ.get('COHORT_MIN_SIZE', 30))
+    COHORT_STATS_TTL = int(os.environ.get('COHORT_STATS_TTL', 300))
+    
+    # Regenerate LLM feedback once when it is this similar (estimated word 3-gram
+    # Jaccard) to recent feedback for another student. The index keeps the most
+    # recent entries and reloads after the TTL to include other processes' rows (0 = never)
+    FEEDBACK_DEDUP = os.environ.get('FEEDBACK_DEDUP', 'False').lower() == 'true'
+    FEEDBACK_DEDUP_THRESHOLD = float(os.environ.get('FEEDBACK_DEDUP_THRESHOLD', 0.6))
+    FEEDBACK_DEDUP_MAX_ENTRIES = int(os.environ.get('FEEDBACK_DEDUP_MAX_ENTRIES', 100000))
+    FEEDBACK_DEDUP_TTL = int(os.environ.get('FEEDBACK_DEDUP_TTL', 600))
+    
+    # Serve stored LLM feedback for the nearest score profile, renamed for the
+    # student, instead of calling the model. Neighbours must be within this sum
+    # of score differences with every skill in the same band; the index reloads
+    # after the TTL to include other processes' rows (0 = never)
+    FEEDBACK_PROFILE_REUSE = os.environ.get('FEEDBACK_PROFILE_REUSE', 'False').lower() == 'true'
+    FEEDBACK_REUSE_MAX_DISTANCE = int(os.environ.get('FEEDBACK_REUSE_MAX_DISTANCE', 2))
+    FEEDBACK_REUSE_TTL = int(os.environ.get('FEEDBACK_REUSE_TTL', 600))
+    
+    # Batch results are inserted and committed in chunks of this many rows
+    FEEDBACK_BULK_CHUNK_SIZE = int(os.environ.get('FEEDBACK_BULK_CHUNK_SIZE', 500))
+    
+    # Background batch jobs
+    JOB_MAX_CONCURRENT = int(os.environ.get('JOB_MAX_CONCURRENT', 2))
+    JOB_MAX_STUDENTS = int(os.environ.get('JOB_MAX_STUDENTS', 1000))
+    
+    # A process owns a job for JOB_LEASE_SECONDS after its last progress; jobs
+    # whose owner stopped are resumed by the next process to serve a request
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+    JOB_RESUME_ON_START = os.environ.get('JOB_RESUME_ON_START', 'True').lower() == 'true'
+    
+    # Regeneration of fallback, degraded and overflow feedback by the LLM: the
+    # worker polls every REGEN_INTERVAL seconds, only within REGEN_HOURS (local
+    # hours such as '1-6', empty = any time), and retries failed attempts after
+    # REGEN_RETRY_DELAY seconds, doubling each time. Each scan also rechecks
+    # the REGEN_SCAN_LOOKBACK feedback ids below the last one scanned, for rows
+    # whose transactions committed after a higher id
+    REGEN_WORKER = os.environ.get('REGEN_WORKER', 'False').lower() == 'true'
+    REGEN_CONCURRENCY = int(os.environ.get('REGEN_CONCURRENCY', 2))
+    REGEN_REQUESTS_PER_MINUTE = int(os.environ.get('REGEN_REQUESTS_PER_MINUTE', 30))
+    REGEN_BATCH_SIZE = int(os.environ.get('REGEN_BATCH_SIZE', 50))
+    REGEN_INTERVAL = int(os.environ.get('REGEN_INTERVAL', 300))
+    REGEN_HOURS = os.environ.get('REGEN_HOURS', '')
+    REGEN_MAX_ATTEMPTS = int(os.environ.get('REGEN_MAX_ATTEMPTS', 5))
+    REGEN_RETRY_DELAY = int(os.environ.get('REGEN_RETRY_DELAY', 600))
+    REGEN_SCAN_LOOKBACK = int(os.environ.get('REGEN_SCAN_LOOKBACK', 1000))
+    
+    # Performance CSV imports are inserted and committed in chunks of this many rows
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 2000))
+    
+    # Seconds before a worker reloads rubrics uploaded through another process (0 = never)
+    RUBRIC_CACHE_TTL = int(os.environ.get('RUBRIC_CACHE_TTL', 300))
+    
+    # Response cache: 'memory' (per process LRU), 'sqlite' (shared on disk) or 'none'
+    FEEDBACK_CACHE_BACKEND = os.environ.get('FEEDBACK_CACHE_BACKEND', 'memory')
+    FEEDBACK_CACHE_PATH = os.environ.get('FEEDBACK_CACHE_PATH', 'feedback_cache.db')
+    FEEDBACK_CACHE_TTL = int(os.environ.get('FEEDBACK_CACHE_TTL', 7 * 24 * 3600))
+    FEEDBACK_CACHE_MAX_ENTRIES = int(os.environ.get('FEEDBACK_CACHE_MAX_ENTRIES', 10000))
+    
     @staticmethod
     def validate_config():
         """Validate required configuration"""
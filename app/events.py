@@ -0,0 +1,117 @@
+"""
+Committed feedback notifications
+
+Score histograms, the near-duplicate index and the profile reuse index keep
+in-memory views of stored feedback. Each one registers here and names the
+Feedback columns it reads. One set of session listeners collects the
+Feedback rows inserted in a transaction, from ORM flushes and multi-row
+INSERT statements alike, and the columns it updated or deleted. After the
+commit every registered index gets the new rows through add(rows), or
+invalidate() when an update or delete touched one of its columns. Nothing
+is reported for a rolled back transaction.
+"""
+from typing import FrozenSet, Iterable
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models import Feedback
+
+_INSERTED_KEY = 'inserted_feedback'
+_CHANGED_KEY = 'changed_feedback_columns'
+
+FEEDBACK_COLUMNS: FrozenSet[str] = frozenset(attr.key for attr in inspect(Feedback).column_attrs)
+
+
+def register_feedback_index(app, index, columns: Iterable[str]) -> None:
+    """
+    Notify an index about feedback committed in this application
+
+    Args:
+        app: Flask application
+        index: Object with add(rows) and invalidate() methods
+        columns: Feedback columns the index reads; updates to other columns
+            leave it alone
+    """
+    app.extensions.setdefault('feedback_indexes', []).append((index, frozenset(columns)))
+
+
+def _inserted(session) -> list:
+    return session.info.setdefault(_INSERTED_KEY, [])
+
+
+def _changed(session) -> set:
+    return session.info.setdefault(_CHANGED_KEY, set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_feedback(session, flush_context):
+    # new, dirty and deleted still hold their pre-flush state here
+    for instance in session.new:
+        if isinstance(instance, Feedback):
+            values = inspect(instance).dict
+            _inserted(session).append({key: values[key] for key in FEEDBACK_COLUMNS if key in values})
+
+    for instance in session.dirty:
+        if isinstance(instance, Feedback):
+            attrs = inspect(instance).attrs
+            changed = {key for key in FEEDBACK_COLUMNS if attrs[key].history.has_changes()}
+            if changed:
+                _changed(session).update(changed)
+
+    if any(isinstance(instance, Feedback) for instance in session.deleted):
+        _changed(session).update(FEEDBACK_COLUMNS)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_feedback_statements(orm_execute_state):
+    # Multi-row statements such as app.utils.bulk_insert.bulk_insert_feedback
+    if orm_execute_state.bind_mapper is not Feedback.__mapper__:
+        return
+
+    parameters = orm_execute_state.parameters
+    if isinstance(parameters, dict):
+        parameters = [parameters]
+
+    if orm_execute_state.is_insert:
+        if not parameters:
+            return
+        rows = [dict(row) for row in parameters]
+        _inserted(orm_execute_state.session).extend(rows)
+        if 'id' in orm_execute_state.statement.exported_columns.keys():
+            # Run the INSERT here to give the rows their RETURNING ids (in
+            # parameter order, as bulk_insert_feedback requests), and hand
+            # the caller an equivalent result
+            frozen = orm_execute_state.invoke_statement().freeze()
+            for row, returned in zip(rows, frozen().mappings()):
+                row['id'] = returned['id']
+            return frozen()
+    elif orm_execute_state.is_update and parameters:
+        # Bulk UPDATE by primary key, one mapping per row
+        _changed(orm_execute_state.session).update(
+            key for row in parameters for key in row if key != 'id'
+        )
+    elif orm_execute_state.is_update or orm_execute_state.is_delete:
+        _changed(orm_execute_state.session).update(FEEDBACK_COLUMNS)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_feedback_indexes(session):
+    rows = session.info.pop(_INSERTED_KEY, None)
+    changed = session.info.pop(_CHANGED_KEY, None)
+    if not (rows or changed) or not has_app_context():
+        return
+
+    for index, columns in current_app.extensions.get('feedback_indexes', ()):
+        if changed and changed & columns:
+            # A reload also picks up the rows inserted in this transaction
+            index.invalidate()
+        elif rows:
+            index.add(rows)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_feedback(session, previous_transaction):
+    session.info.pop(_INSERTED_KEY, None)
+    session.info.pop(_CHANGED_KEY, None)
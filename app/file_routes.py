@@ -0,0 +1,87 @@
+"""
+Rubric file upload routes
+"""
+import io
+import logging
+import os
+from flask import Blueprint, request, jsonify
+from werkzeug.utils import secure_filename
+from app.ingest import iter_rubric_rows
+from app.models import db
+from app.rubrics import get_rubric_registry, store_rubrics
+
+logger = logging.getLogger(__name__)
+
+file_bp = Blueprint('file_bp', __name__)
+
+RUBRIC_FOLDER = os.path.join(os.getcwd(), 'uploads', 'rubric_files')
+
+ALLOWED_EXTENSIONS = {'csv'}
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def _save_lines(lines, out):
+    """Pass lines through while copying them to the saved upload"""
+    for line in lines:
+        out.write(line)
+        yield line
+
+@file_bp.route('/upload-rubric', methods=['POST'])
+def upload_rubric():
+    """
+    Upload a rubric CSV in the rubrics.csv format
+
+    The upload is parsed line by line into Criterion rows while it is
+    copied to the rubric folder, so the file is never held in memory.
+    """
+    if 'file' not in request.files:
+        return jsonify({'message': 'No file part'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'message': 'No file selected'}), 400
+
+    if not allowed_file(file.filename):
+        return jsonify({'message': 'File type not allowed'}), 400
+
+    filename = secure_filename(file.filename)
+    os.makedirs(RUBRIC_FOLDER, exist_ok=True)
+    filepath = os.path.join(RUBRIC_FOLDER, filename)
+
+    try:
+        lines = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+        with open(filepath, 'w', encoding='utf-8', newline='') as out:
+            rubrics = store_rubrics(iter_rubric_rows(_save_lines(lines, out)))
+
+        if not rubrics:
+            os.remove(filepath)
+            return jsonify({'message': 'No rubric criteria found in file'}), 400
+
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        return jsonify({'message': f'Invalid rubric file: {str(e)}'}), 400
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error uploading rubric: {str(e)}")
+        return jsonify({'message': 'Failed to store rubric file'}), 500
+
+    logger.info(f"Stored {len(rubrics)} rubrics from {filename}")
+    return jsonify({
+        'message': 'Rubric file uploaded and saved to DB',
+        'rubric_id': rubrics[0].id,
+        'filename': filename,
+        'rubrics': [
+            {'id': rubric.id, 'name': rubric.name, 'criteria': len(rubric.active_criteria)}
+            for rubric in rubrics
+        ]
+    }), 200
+
+@file_bp.route('/rubric-files', methods=['GET'])
+def list_rubric_files():
+    return jsonify({
+        'rubrics': get_rubric_registry().all()
+    })
@@ -0,0 +1,291 @@
+"""
+Streaming import of student performance exports into the normalized schema
+
+A performance CSV (Student, Rubric ID, Criterion 1..N) becomes one
+MentorInput per row and one PerformanceData row per criterion score.
+Rubric, criterion and student ids are resolved from in-memory lookups
+built once per import. Rows are inserted with multi-row statements and
+committed in chunks, so memory use stays flat however large the file is.
+
+Each mentor input records the SHA-256 of its file and its line number, under
+a unique constraint. Importing the same file again skips the lines already
+imported, so an interrupted import can simply be re-run.
+"""
+import csv
+import hashlib
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.models import Criterion, MentorInput, PerformanceData, Rubric, Student
+from app.rubrics import get_rubric_registry
+from app.utils.bulk_insert import chunked
+
+logger = logging.getLogger(__name__)
+
+_SCORE_RANGE_MAX = re.compile(r'(\d+)\s*$')
+
+
+def parse_max_score(score_range: str, default: int = 10) -> int:
+    """Upper bound of a Score Range value such as '1-10'"""
+    match = _SCORE_RANGE_MAX.search(score_range or '')
+    return int(match.group(1)) if match else default
+
+
+def iter_rubric_rows(lines: Iterable[str]) -> Iterator[Dict]:
+    """
+    Parse rubric definitions in the rubrics.csv format
+
+    Args:
+        lines: Lines of a CSV with Rubric ID, Criterion, Description and
+            Score Range columns, e.g. an open file or upload stream
+
+    Yields:
+        Dictionaries with 'rubric_name', 'name', 'description' and 'max_score'
+
+    Raises:
+        ValueError: If a required column is missing
+    """
+    reader = csv.DictReader(lines)
+    missing = {'Rubric ID', 'Criterion'} - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"Missing rubric columns: {', '.join(sorted(missing))}")
+
+    for row in reader:
+        rubric_name = (row['Rubric ID'] or '').strip()
+        criterion = (row['Criterion'] or '').strip()
+        if not rubric_name or not criterion:
+            continue
+        yield {
+            'rubric_name': rubric_name,
+            'name': criterion,
+            'description': (row.get('Description') or '').strip(),
+            'max_score': parse_max_score(row.get('Score Range'))
+        }
+
+
+def load_rubric_criteria(path: str) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Read rubric definitions from a file in the rubrics.csv format
+
+    Returns:
+        Mapping of rubric id to its (criterion, description) pairs in file order
+    """
+    rubrics = {}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in iter_rubric_rows(f):
+            rubrics.setdefault(row['rubric_name'], []).append((row['name'], row['description']))
+    return rubrics
+
+
+def iter_performance_rows(path: str) -> Iterator[Dict]:
+    """
+    Stream rows of a student performance CSV
+
+    Rows with non-numeric scores are logged and skipped.
+
+    Yields:
+        Dictionaries with 'student_name', 'rubric_name', 'scores' (the
+        Criterion 1..N values in column order) and the file 'line' number
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        criterion_columns = [index for index, name in enumerate(header) if name.startswith('Criterion')]
+
+        for line_number, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            try:
+                scores = [int(row[index]) for index in criterion_columns if row[index].strip()]
+            except (ValueError, IndexError):
+                logger.warning(f"Skipping malformed row on line {line_number}: {row}")
+                continue
+
+            yield {
+                'student_name': row[0].strip(),
+                'rubric_name': row[1].strip(),
+                'scores': scores,
+                'line': line_number
+            }
+
+
+def sync_rubrics(rubrics: Dict[str, List[Tuple[str, str]]], max_score: int = 10) -> int:
+    """
+    Create the rubrics and criteria that are not in the database yet
+
+    Args:
+        rubrics: Rubric criteria from load_rubric_criteria
+        max_score: Maximum score recorded for new criteria
+
+    Returns:
+        Number of rubrics created
+    """
+    existing = set(db.session.execute(select(Rubric.name)).scalars())
+    created = 0
+
+    for name, criteria in rubrics.items():
+        if name in existing:
+            continue
+        rubric = Rubric(name=name, criteria=dict(criteria))
+        rubric.criteria_rows = [
+            Criterion(name=criterion, description=description, max_score=max_score, position=position)
+            for position, (criterion, description) in enumerate(criteria)
+        ]
+        db.session.add(rubric)
+        created += 1
+
+    db.session.commit()
+    if created:
+        get_rubric_registry().invalidate()
+    return created
+
+
+def build_criterion_lookup() -> Dict[str, Tuple[int, List[int]]]:
+    """
+    Map every rubric name to its id and active criterion ids in position order
+
+    Built with a single query so an import never looks up ids per row.
+    """
+    lookup = {}
+    rows = db.session.execute(
+        select(Rubric.name, Rubric.id, Criterion.id)
+        .join(Criterion, Criterion.rubric_id == Rubric.id)
+        .where(Criterion.retired_at.is_(None))
+        .order_by(Rubric.id, Criterion.position, Criterion.id)
+    )
+    for rubric_name, rubric_id, criterion_id in rows:
+        # Keep the first rubric when names are duplicated
+        entry = lookup.setdefault(rubric_name, (rubric_id, []))
+        if entry[0] == rubric_id:
+            entry[1].append(criterion_id)
+    return lookup
+
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def import_performance_csv(path: str,
+                           chunk_size: int = 2000,
+                           progress: Optional[Callable[[Dict], None]] = None,
+                           force: bool = False) -> Dict:
+    """
+    Import a student performance CSV into mentor_inputs and performance_data
+
+    Students are matched by name and created when missing. Rows naming an
+    unknown rubric, or with a different number of scores than the rubric
+    has criteria, are skipped. Lines already imported from a file with the
+    same contents are skipped too, so importing a file twice does not
+    duplicate its scores.
+
+    Args:
+        path: Student performance CSV
+        chunk_size: Rows inserted and committed together
+        progress: Called with the running statistics after every chunk
+        force: Import every line again as new evaluations, without
+            recording the source file
+
+    Returns:
+        Statistics: rows_imported, rows_skipped, rows_already_imported,
+        students_created, scores_imported, elapsed_seconds and rows_per_second
+    """
+    source_hash = None
+    imported_through = 0
+    if not force:
+        source_hash = file_sha256(path)
+        # Chunks are committed in file order, so imported lines form a prefix
+        imported_through = db.session.execute(
+            select(func.max(MentorInput.source_line)).where(MentorInput.source_hash == source_hash)
+        ).scalar() or 0
+
+    criterion_lookup = build_criterion_lookup()
+    students = {}
+    for student_id, name in db.session.execute(select(Student.id, Student.name).order_by(Student.id)):
+        students.setdefault(name, student_id)
+
+    stats = {
+        'rows_imported': 0,
+        'rows_skipped': 0,
+        'rows_already_imported': 0,
+        'students_created': 0,
+        'scores_imported': 0,
+        'elapsed_seconds': 0.0,
+        'rows_per_second': 0.0
+    }
+    started = time.perf_counter()
+
+    for chunk in chunked(iter_performance_rows(path), chunk_size):
+        rows = []
+        for row in chunk:
+            if row['line'] <= imported_through:
+                stats['rows_already_imported'] += 1
+                continue
+            entry = criterion_lookup.get(row['rubric_name'])
+            if entry is None or len(entry[1]) != len(row['scores']):
+                stats['rows_skipped'] += 1
+                continue
+            rows.append((row, entry))
+
+        if rows:
+            _insert_chunk(rows, students, stats, source_hash)
+
+        stats['elapsed_seconds'] = time.perf_counter() - started
+        stats['rows_per_second'] = stats['rows_imported'] / stats['elapsed_seconds']
+        if progress:
+            progress(dict(stats))
+
+    logger.info(f"Imported {stats['rows_imported']} performance rows from {path} "
+                f"({stats['rows_skipped']} skipped, {stats['rows_already_imported']} already imported) "
+                f"at {stats['rows_per_second']:.0f} rows/s")
+    return stats
+
+
+def _insert_chunk(rows: List[Tuple[Dict, Tuple[int, List[int]]]],
+                  students: Dict[str, int],
+                  stats: Dict,
+                  source_hash: Optional[str] = None) -> None:
+    """Insert the students, mentor inputs and scores of one chunk and commit"""
+    new_names = list(dict.fromkeys(
+        row['student_name'] for row, _ in rows if row['student_name'] not in students
+    ))
+    if new_names:
+        student_ids = db.session.execute(
+            insert(Student).returning(Student.id, sort_by_parameter_order=True),
+            [{'name': name} for name in new_names]
+        ).scalars().all()
+        students.update(zip(new_names, student_ids))
+        stats['students_created'] += len(new_names)
+
+    submitted_at = datetime.utcnow()
+    input_ids = db.session.execute(
+        insert(MentorInput).returning(MentorInput.id, sort_by_parameter_order=True),
+        [{
+            'student_id': students[row['student_name']],
+            'rubric_id': rubric_id,
+            'submitted_at': submitted_at,
+            'source_hash': source_hash,
+            'source_line': row['line'] if source_hash else None
+        } for row, (rubric_id, _) in rows]
+    ).scalars().all()
+
+    performance_rows = [
+        {'mentor_input_id': input_id, 'criterion_id': criterion_id, 'score': score}
+        for input_id, (row, (_, criterion_ids)) in zip(input_ids, rows)
+        for criterion_id, score in zip(criterion_ids, row['scores'])
+    ]
+    db.session.execute(insert(PerformanceData), performance_rows)
+    db.session.commit()
+
+    stats['rows_imported'] += len(rows)
+    stats['scores_imported'] += len(performance_rows)
@@ -0,0 +1,268 @@
+"""
+Background batch jobs for the Auto Feedback Generator
+
+A submitted batch is persisted as a BatchJob with one BatchJobItem per
+student and processed on a background executor, so the HTTP request returns
+immediately. Job state lives in the database, which lets unfinished jobs be
+resumed after a restart. The process running a job holds a lease on it,
+renewed as items complete; jobs whose lease has expired are claimed with a
+conditional UPDATE, so each is resumed by exactly one process.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, update
+
+from app import db
+from app.models import BatchJob, BatchJobItem, Feedback
+from app.utils.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """Runs batch feedback jobs on a background thread pool"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self.worker_id = uuid.uuid4().hex
+        # Jobs submitted to this process's executor and not finished yet
+        self._queued = set()
+        self._resumed = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the runner with a Flask application"""
+        self.app = app
+        self.max_jobs = app.config['JOB_MAX_CONCURRENT']
+        self.max_workers = app.config['FEEDBACK_BATCH_CONCURRENCY']
+        self.lease = timedelta(seconds=app.config['JOB_LEASE_SECONDS'])
+        if app.config['JOB_RESUME_ON_START']:
+            # Runs under any server (gunicorn, flask run, run.py) but not CLI commands
+            app.before_request(self._resume_on_first_request)
+        app.extensions['job_runner'] = self
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Created on first use so importing the app does not spawn threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_jobs,
+                                                thread_name_prefix='feedback-job')
+        return self._executor
+
+    def create_job(self, students_data: List[Dict]) -> BatchJob:
+        """Persist a new job and its items"""
+        job = BatchJob(id=uuid.uuid4().hex, status='pending', total=len(students_data),
+                       worker_id=self.worker_id, locked_until=datetime.utcnow() + self.lease)
+        db.session.add(job)
+        db.session.flush()
+
+        db.session.execute(BatchJobItem.__table__.insert(), [
+            {
+                'job_id': job.id,
+                'position': position,
+                'student_name': data['student_name'],
+                'scores': data['scores'],
+                'feedback_type': data.get('feedback_type', 'comprehensive'),
+                'status': 'pending'
+            }
+            for position, data in enumerate(students_data)
+        ])
+        db.session.commit()
+        return job
+
+    def submit(self, job_id: str, generator) -> None:
+        """Queue a persisted job for background processing"""
+        with self._lock:
+            self._queued.add(job_id)
+        self.executor.submit(self._run_job, job_id, generator)
+
+    def resume_incomplete(self, generator) -> int:
+        """
+        Claim and re-queue pending or running jobs whose owner's lease expired
+
+        Jobs owned by a live process, including this one, are left alone, so
+        calling this again or from several processes resumes each job once.
+
+        Returns:
+            Number of jobs resumed
+        """
+        with self._lock:
+            self._resumed = True
+            queued = set(self._queued)
+
+        now = datetime.utcnow()
+        job_ids = [job_id for (job_id,) in db.session.query(BatchJob.id).filter(
+            BatchJob.status.in_(['pending', 'running']),
+            or_(BatchJob.locked_until.is_(None), BatchJob.locked_until < now)
+        ).order_by(BatchJob.created_at)]
+
+        resumed = 0
+        for job_id in job_ids:
+            if job_id in queued or not self._claim(job_id, own=False):
+                continue
+            logger.info(f"Resuming batch job {job_id}")
+            self.submit(job_id, generator)
+            resumed += 1
+
+        return resumed
+
+    def _resume_on_first_request(self) -> None:
+        if self._resumed:
+            return
+        try:
+            from app.nlp import get_feedback_generator
+
+            resumed = self.resume_incomplete(get_feedback_generator())
+            if resumed:
+                logger.info(f"Resumed {resumed} unfinished batch job(s)")
+        except Exception as e:
+            logger.error(f"Error resuming batch jobs: {str(e)}")
+            db.session.rollback()
+
+    def _claim(self, job_id: str, own: bool) -> bool:
+        """
+        Take the lease on an unfinished job
+
+        Args:
+            job_id: Job to claim
+            own: Whether a job already leased by this process may be claimed
+
+        Returns:
+            True if this process now owns the job
+        """
+        now = datetime.utcnow()
+        unowned = or_(BatchJob.locked_until.is_(None), BatchJob.locked_until < now)
+        result = db.session.execute(
+            update(BatchJob)
+            .where(BatchJob.id == job_id,
+                   BatchJob.status.in_(['pending', 'running']),
+                   or_(unowned, BatchJob.worker_id == self.worker_id) if own else unowned)
+            .values(status='running', worker_id=self.worker_id, locked_until=now + self.lease, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _run_job(self, job_id: str, generator) -> None:
+        with self.app.app_context():
+            try:
+                self._process_job(job_id, generator)
+            except Exception as e:
+                logger.error(f"Batch job {job_id} failed: {str(e)}")
+                db.session.rollback()
+                job = db.session.get(BatchJob, job_id)
+                if job is not None and job.worker_id == self.worker_id:
+                    job.status = 'failed'
+                    job.error = str(e)
+                    job.finished_at = datetime.utcnow()
+                    job.worker_id = None
+                    job.locked_until = None
+                    db.session.commit()
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._queued.discard(job_id)
+
+    def _process_job(self, job_id: str, generator) -> None:
+        # Another process may have taken over a job that waited past its lease
+        if not self._claim(job_id, own=True):
+            logger.warning(f"Batch job {job_id} is finished, gone or owned by another process")
+            return
+
+        job = db.session.get(BatchJob, job_id)
+        pending = job.items.filter_by(status='pending').order_by(BatchJobItem.position).all()
+
+        # LLM calls run on the worker pool; results are written from this thread
+        # only, so each item gets a unique completion sequence number
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers),
+                                thread_name_prefix='feedback-job-item') as pool:
+            futures = {
+                pool.submit(generator.generate_batch_item, item.to_student_data()): item
+                for item in pending
+            }
+
+            for future in as_completed(futures):
+                self._record_result(job, futures[future], future.result())
+
+        job.status = 'completed'
+        job.finished_at = datetime.utcnow()
+        job.worker_id = None
+        job.locked_until = None
+        db.session.commit()
+        logger.info(f"Batch job {job_id} completed: {job.succeeded} succeeded, {job.failed} failed")
+
+    def _record_result(self, job: BatchJob, item: BatchJobItem, result: Dict) -> None:
+        """Store one item result and its Feedback record"""
+        item.completed_at = datetime.utcnow()
+
+        if result['status'] == 'success':
+            scores = item.scores
+            feedback_record = Feedback(
+                student_name=item.student_name,
+                communication=scores['communication'],
+                teamwork=scores['teamwork'],
+                creativity=scores['creativity'],
+                critical_thinking=scores['critical_thinking'],
+                presentation=scores['presentation'],
+                feedback_text=result['feedback'],
+                model_used=result.get('model_used'),
+                feedback_type=item.feedback_type,
+                template_version=result.get('template_version')
+            )
+            db.session.add(feedback_record)
+            db.session.flush()
+
+            item.status = 'success'
+            item.feedback_text = result['feedback']
+            item.feedback_id = feedback_record.id
+            job.succeeded += 1
+        else:
+            item.status = 'error'
+            item.error = result.get('error')
+            job.failed += 1
+
+        item.sequence = job.processed
+        job.locked_until = datetime.utcnow() + self.lease
+        with stage_timer('db_commit'):
+            db.session.commit()
+
+
+def get_job_results(job: BatchJob, after: int = 0, limit: int = 100) -> Dict:
+    """
+    Completed items of a job in completion order
+
+    Args:
+        job: Batch job
+        after: Only return items with a completion sequence above this value
+        limit: Maximum number of items to return
+
+    Returns:
+        Dictionary with the items and the cursor for the next poll
+    """
+    items = job.items.filter(
+        BatchJobItem.sequence.isnot(None),
+        BatchJobItem.sequence > after
+    ).order_by(BatchJobItem.sequence).limit(limit).all()
+
+    next_after = items[-1].sequence if items else after
+    return {
+        'items': [item.to_dict() for item in items],
+        'next_after': next_after,
+        'has_more': next_after < job.processed or job.status in ('pending', 'running')
+    }
+
+
+def get_job(job_id: str) -> Optional[BatchJob]:
+    """Look up a job by id"""
+    return db.session.get(BatchJob, job_id)
+
+
+job_runner = JobRunner()
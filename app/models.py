@@ -9,7 +9,7 @@ class Student(db.Model):
     __tablename__ = 'students'
     
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     email = db.Column(db.String(120), unique=True, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -33,6 +33,15 @@ class Rubric(db.Model):
     criteria = db.Column(db.JSON, nullable=False)  # Store criteria as JSON
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Normalized criteria, one row per criterion, including retired ones
+    criteria_rows = db.relationship('Criterion', backref='rubric', lazy=True,
+                                    order_by='[Criterion.position, Criterion.id]', cascade='all, delete-orphan')
+    
+    @property
+    def active_criteria(self):
+        """Criteria of the current definition in rubric order"""
+        return [criterion for criterion in self.criteria_rows if criterion.retired_at is None]
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -41,20 +50,100 @@ class Rubric(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class Criterion(db.Model):
+    """Single criterion of a rubric"""
+    __tablename__ = 'criteria'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    rubric_id = db.Column(db.Integer, db.ForeignKey('rubrics.id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    max_score = db.Column(db.Integer, nullable=True)
+    
+    # Place in the rubric, matching the Criterion 1..N columns of performance exports
+    position = db.Column(db.Integer, nullable=True)
+    # Set when a re-uploaded rubric no longer has the criterion; its scores are kept
+    retired_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'rubric_id': self.rubric_id,
+            'name': self.name,
+            'description': self.description,
+            'max_score': self.max_score,
+            'position': self.position
+        }
+
+class MentorInput(db.Model):
+    """One evaluation of a student against a rubric"""
+    __tablename__ = 'mentor_inputs'
+    __table_args__ = (
+        # A row of an imported file is stored once, however often the file is imported
+        db.UniqueConstraint('source_hash', 'source_line', name='uq_mentor_inputs_source'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id', ondelete='CASCADE'), nullable=False, index=True)
+    rubric_id = db.Column(db.Integer, db.ForeignKey('rubrics.id', ondelete='CASCADE'), nullable=False, index=True)
+    evaluator_id = db.Column(db.Integer, nullable=True)
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # SHA-256 of the CSV a row was imported from and its line number; null for
+    # API submissions and forced re-imports
+    source_hash = db.Column(db.String(64), nullable=True)
+    source_line = db.Column(db.Integer, nullable=True)
+    
+    # Relationship with per-criterion scores
+    performance_data = db.relationship('PerformanceData', backref='mentor_input', lazy=True,
+                                       cascade='all, delete-orphan')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'student_id': self.student_id,
+            'rubric_id': self.rubric_id,
+            'evaluator_id': self.evaluator_id,
+            'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None,
+            'scores': {data.criterion_id: data.score for data in self.performance_data}
+        }
+
+class PerformanceData(db.Model):
+    """Score for one criterion within a mentor input"""
+    __tablename__ = 'performance_data'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    mentor_input_id = db.Column(db.Integer, db.ForeignKey('mentor_inputs.id', ondelete='CASCADE'),
+                                nullable=False, index=True)
+    criterion_id = db.Column(db.Integer, db.ForeignKey('criteria.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Integer, nullable=True)
+    remarks = db.Column(db.Text, nullable=True)
+
 class Feedback(db.Model):
     """Feedback model"""
     __tablename__ = 'feedbacks'
+    __table_args__ = (
+        db.Index('ix_feedbacks_student_name_created_at', 'student_name', 'created_at'),
+        db.Index('ix_feedbacks_created_at_id', 'created_at', 'id'),
+        # Finds degraded rows (model_used 'local-fallback') to regenerate
+        db.Index('ix_feedbacks_model_used_created_at', 'model_used', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=True)
     student_name = db.Column(db.String(100), nullable=False)  # For cases without student record
     
-    # Performance scores
-    communication = db.Column(db.Integer, nullable=False)
-    teamwork = db.Column(db.Integer, nullable=False)
-    creativity = db.Column(db.Integer, nullable=False)
-    critical_thinking = db.Column(db.Integer, nullable=False)
-    presentation = db.Column(db.Integer, nullable=False)
+    # Performance scores (null for rubric-based feedback)
+    communication = db.Column(db.Integer, nullable=True)
+    teamwork = db.Column(db.Integer, nullable=True)
+    creativity = db.Column(db.Integer, nullable=True)
+    critical_thinking = db.Column(db.Integer, nullable=True)
+    presentation = db.Column(db.Integer, nullable=True)
+    
+    # Rubric-based scores, keyed by criterion name
+    rubric_name = db.Column(db.String(100), nullable=True)
+    criterion_scores = db.Column(db.JSON, nullable=True)
+    mentor_input_id = db.Column(db.Integer, db.ForeignKey('mentor_inputs.id', ondelete='SET NULL'), nullable=True)
     
     # Generated feedback
     feedback_text = db.Column(db.Text, nullable=False)
@@ -62,19 +151,146 @@ class Feedback(db.Model):
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     model_used = db.Column(db.String(50), default='gpt-3.5-turbo')
+    feedback_type = db.Column(db.String(20), nullable=True)  # 'comprehensive', 'brief' or 'local'
+    template_version = db.Column(db.String(20), nullable=True)  # Prompt templates that produced LLM feedback
+    text_signature = db.Column(db.LargeBinary, nullable=True)  # MinHash of feedback_text, see app.similarity
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'student_name': self.student_name,
-            'scores': {
+        if self.criterion_scores is not None:
+            scores = self.criterion_scores
+        else:
+            scores = {
                 'communication': self.communication,
                 'teamwork': self.teamwork,
                 'creativity': self.creativity,
                 'critical_thinking': self.critical_thinking,
                 'presentation': self.presentation
-            },
+            }
+        
+        return {
+            'id': self.id,
+            'student_name': self.student_name,
+            'rubric_name': self.rubric_name,
+            'mentor_input_id': self.mentor_input_id,
+            'scores': scores,
             'feedback_text': self.feedback_text,
             'created_at': self.created_at.isoformat(),
-            'model_used': self.model_used
-        }
\ No newline at end of file
+            'model_used': self.model_used,
+            'feedback_type': self.feedback_type,
+            'template_version': self.template_version
+        }
+
+class BatchJob(db.Model):
+    """Asynchronous batch feedback job"""
+    __tablename__ = 'batch_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    # pending, running, completed, failed; offline Batch API jobs: prepared, submitted, completed
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    external_batch_id = db.Column(db.String(100), nullable=True)  # OpenAI Batch API id for offline jobs
+    total = db.Column(db.Integer, nullable=False, default=0)
+    succeeded = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    
+    # Process that owns a pending or running job, until its lease expires
+    worker_id = db.Column(db.String(32), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    
+    # Metadata
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationship with job items
+    items = db.relationship('BatchJobItem', backref='job', lazy='dynamic',
+                            cascade='all, delete-orphan')
+    
+    @property
+    def processed(self):
+        return self.succeeded + self.failed
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'external_batch_id': self.external_batch_id,
+            'total': self.total,
+            'processed': self.processed,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class BatchJobItem(db.Model):
+    """Single student entry within a batch job"""
+    __tablename__ = 'batch_job_items'
+    __table_args__ = (
+        db.Index('ix_batch_job_items_job_status', 'job_id', 'status'),
+        db.Index('ix_batch_job_items_job_sequence', 'job_id', 'sequence'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('batch_jobs.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # Index in the submitted students list
+    
+    # Input
+    student_name = db.Column(db.String(100), nullable=False)
+    rubric_name = db.Column(db.String(100), nullable=True)  # Set when scores are keyed by rubric criterion
+    scores = db.Column(db.JSON, nullable=False)
+    feedback_type = db.Column(db.String(20), nullable=False, default='comprehensive')
+    
+    # Result
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, success, error
+    sequence = db.Column(db.Integer, nullable=True)  # Completion order within the job
+    feedback_text = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    feedback_id = db.Column(db.Integer, db.ForeignKey('feedbacks.id'), nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_student_data(self):
+        return {
+            'student_name': self.student_name,
+            'scores': self.scores,
+            'feedback_type': self.feedback_type
+        }
+    
+    def to_dict(self):
+        return {
+            'position': self.position,
+            'sequence': self.sequence,
+            'student_name': self.student_name,
+            'status': self.status,
+            'feedback': self.feedback_text,
+            'error': self.error,
+            'feedback_id': self.feedback_id,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class RegenerationTask(db.Model):
+    """Stored feedback queued for regeneration by the LLM, see app.regeneration"""
+    __tablename__ = 'regeneration_tasks'
+    __table_args__ = (
+        db.Index('ix_regeneration_tasks_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    feedback_id = db.Column(db.Integer, db.ForeignKey('feedbacks.id', ondelete='CASCADE'),
+                            nullable=False, unique=True)
+    reason = db.Column(db.String(20), nullable=False)  # fallback, overflow or legacy_fallback
+    
+    # pending, running, done or failed (attempts exhausted)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    worker_id = db.Column(db.String(32), nullable=True)  # Worker holding a running task
+    locked_until = db.Column(db.DateTime, nullable=True)  # Running tasks past this are reclaimed
+    error = db.Column(db.Text, nullable=True)
+    
+    # Metadata
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
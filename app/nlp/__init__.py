@@ -3,5 +3,6 @@ NLP Module for Auto Feedback Generation
 """
 from .feedback_generator import FeedbackGenerator
 from .prompt_templates import PromptTemplates
+from .provider import FeedbackGeneratorProvider, get_feedback_generator
 
-__all__ = ['FeedbackGenerator', 'PromptTemplates']
\ No newline at end of file
+__all__ = ['FeedbackGenerator', 'PromptTemplates', 'FeedbackGeneratorProvider', 'get_feedback_generator']
\ No newline at end of file
@@ -0,0 +1,290 @@
+"""
+Response cache for generated feedback
+
+Feedback is keyed on a hash of everything that determines the model output
+(system prompt, user prompt, model, sampling parameters and template
+version), so identical inputs are served without another paid LLM call.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+
+@lru_cache(maxsize=64)
+def _prefix_digest(system_prompt: str, model: str, params_json: str, template_version: Optional[str]):
+    """Hash state after the parts of a request shared by every student"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([system_prompt, model, params_json, template_version]).encode('utf-8'))
+    return digest
+
+
+def make_cache_key(system_prompt: str,
+                   user_prompt: str,
+                   model: str,
+                   params: Dict[str, Any],
+                   template_version: Optional[str] = None) -> str:
+    """
+    Build a content-addressed cache key for an LLM request
+
+    The static system prompt, model, parameters and template version are
+    hashed once and the stored hash state is extended with each user prompt.
+
+    Args:
+        system_prompt: System prompt sent to the model
+        user_prompt: User prompt sent to the model
+        model: Model name
+        params: Sampling parameters (temperature, max_tokens, ...)
+        template_version: Version of the templates that built the prompts
+
+    Returns:
+        Hex SHA-256 digest identifying the request
+    """
+    params_json = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    digest = _prefix_digest(system_prompt, model, params_json, template_version).copy()
+    digest.update(b'\0')
+    digest.update(user_prompt.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResponseCache(ABC):
+    """Base class for feedback response caches"""
+
+    backend_name = None
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 10000):
+        """
+        Args:
+            ttl: Seconds an entry stays valid; None keeps entries until evicted
+            max_entries: Maximum number of entries before the oldest are evicted
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None on a miss"""
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a value under key"""
+        self._set(key, value)
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry"""
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'backend': self.backend_name,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'size': len(self),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl
+        }
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        """Return the stored value for key, or None when missing or expired"""
+
+    @abstractmethod
+    def _set(self, key: str, value: str) -> None:
+        """Store a value under key, evicting entries beyond max_entries"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored entries"""
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache with optional TTL"""
+
+    backend_name = 'memory'
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 10000):
+        super().__init__(ttl, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (value, self._expires_at())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+    """Disk-backed cache shared by every worker process on the host"""
+
+    backend_name = 'sqlite'
+
+    # Writes between eviction passes, at most 1% of max_entries; the table may
+    # exceed max_entries by that many rows per process in between
+    evict_every = 100
+
+    def __init__(self,
+                 path: str,
+                 ttl: Optional[float] = None,
+                 max_entries: int = 100000):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS feedback_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'expires_at REAL, accessed_at REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS ix_feedback_cache_accessed_at '
+            'ON feedback_cache (accessed_at)'
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value, expires_at FROM feedback_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            conn.execute('DELETE FROM feedback_cache WHERE key = ?', (key,))
+            conn.commit()
+            return None
+
+        conn.execute('UPDATE feedback_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        conn.commit()
+        return value
+
+    def _set(self, key: str, value: str) -> None:
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO feedback_cache (key, value, expires_at, accessed_at) '
+            'VALUES (?, ?, ?, ?)',
+            (key, value, self._expires_at(), now)
+        )
+        with self._writes_lock:
+            self._writes += 1
+            evict = self._writes % max(1, min(self.evict_every, self.max_entries // 100)) == 0
+        if evict:
+            self._evict(conn, now)
+        conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then the least recently used ones above max_entries"""
+        conn.execute(
+            'DELETE FROM feedback_cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,)
+        )
+        # max(rowid) bounds the row count without a table scan; count only when it may be over
+        max_rowid = conn.execute('SELECT MAX(rowid) FROM feedback_cache').fetchone()[0] or 0
+        if max_rowid <= self.max_entries:
+            return
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                'DELETE FROM feedback_cache WHERE key IN ('
+                'SELECT key FROM feedback_cache ORDER BY accessed_at LIMIT ?)',
+                (overflow,)
+            )
+
+    def clear(self) -> None:
+        conn = self._connection()
+        conn.execute('DELETE FROM feedback_cache')
+        conn.commit()
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM feedback_cache').fetchone()[0]
+
+
+def create_cache(backend: str,
+                 path: Optional[str] = None,
+                 ttl: Optional[float] = None,
+                 max_entries: int = 10000) -> Optional[ResponseCache]:
+    """
+    Create a response cache from configuration values
+
+    Args:
+        backend: 'memory', 'sqlite' or 'none'
+        path: Database file for the sqlite backend
+        ttl: Entry lifetime in seconds (0 or None disables expiry)
+        max_entries: Size limit used for eviction
+
+    Returns:
+        Cache instance, or None when caching is disabled
+    """
+    backend = (backend or 'none').lower()
+    ttl = ttl or None
+
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return MemoryCache(ttl=ttl, max_entries=max_entries)
+    if backend == 'sqlite':
+        return SQLiteCache(path or 'feedback_cache.db', ttl=ttl, max_entries=max_entries)
+
+    raise ValueError(f"Unknown cache backend: {backend}. Must be one of: memory, sqlite, none")
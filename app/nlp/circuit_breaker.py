@@ -0,0 +1,211 @@
+"""
+Circuit breaker for LLM calls
+
+The breaker keeps the outcome and duration of every call made in the last
+window_seconds. Once the window holds at least min_calls calls and the
+share of failures or slow calls reaches its threshold, the breaker opens:
+callers skip the LLM and render local feedback at once instead of each
+waiting for its own call to fail. After open_seconds it lets up to
+half_open_probes calls through. If they all succeed it closes again, and
+any failed or slow probe opens it for another open_seconds.
+
+RouteBreakers keeps one breaker per model route, so an outage of one
+provider or model does not stop requests from being routed to another.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the LLM while the breaker is open"""
+
+
+class CircuitBreaker:
+    """Sliding-window error-rate and latency breaker, safe to share between threads"""
+
+    def __init__(self,
+                 window_seconds: float = 60.0,
+                 min_calls: int = 10,
+                 error_rate_threshold: float = 0.5,
+                 slow_call_seconds: float = 20.0,
+                 slow_rate_threshold: float = 0.5,
+                 open_seconds: float = 30.0,
+                 half_open_probes: int = 2,
+                 name: Optional[str] = None):
+        """
+        Args:
+            window_seconds: Age of the oldest call outcome kept
+            min_calls: Calls in the window before the breaker can open
+            error_rate_threshold: Share of failed calls that opens the breaker
+            slow_call_seconds: Successful calls taking longer count as slow
+            slow_rate_threshold: Share of slow calls that opens the breaker
+            open_seconds: Time the breaker stays open before probing
+            half_open_probes: Successful probes needed to close the breaker,
+                and the number of probes allowed at once
+            name: Route the breaker guards, used in log messages
+        """
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        # (finished at, failed, slow) per call
+        self._calls = deque()
+        self._failures = 0
+        self._slow = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Whether the next LLM call may be made
+
+        Every allowed call must be followed by record().
+        """
+        with self._lock:
+            self._advance(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes - self._probe_successes:
+                self._probes_in_flight += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, success: bool, seconds: float) -> None:
+        """Record the outcome of an allowed call"""
+        slow = success and seconds >= self.slow_call_seconds
+        failed = not success
+
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._open(now, 'probe ' + ('failed' if failed else f'took {seconds:.1f}s'))
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._close()
+                return
+            if self._state == OPEN:
+                # Calls started before the breaker opened do not count towards a new window
+                return
+
+            self._calls.append((now, failed, slow))
+            self._failures += failed
+            self._slow += slow
+            self._trim(now)
+
+            calls = len(self._calls)
+            if calls >= self.min_calls:
+                if self._failures / calls >= self.error_rate_threshold:
+                    self._open(now, f'{self._failures}/{calls} calls failed')
+                elif self._slow / calls >= self.slow_rate_threshold:
+                    self._open(now, f'{self._slow}/{calls} calls took over {self.slow_call_seconds:g}s')
+
+    def stats(self) -> Dict:
+        """Current state and the calls in the window"""
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            self._trim(now)
+            return {
+                'state': self._state,
+                'window_calls': len(self._calls),
+                'window_failures': self._failures,
+                'window_slow_calls': self._slow,
+                'rejected_calls': self._rejected,
+                'seconds_until_probe': (max(0.0, self._opened_at + self.open_seconds - now)
+                                        if self._state == OPEN else None)
+            }
+
+    @property
+    def _label(self) -> str:
+        return f"LLM circuit for {self.name}" if self.name else "LLM circuit"
+
+    def _advance(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            logger.info(f"{self._label} half-open, probing")
+
+    def _open(self, now: float, reason: str) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        logger.warning(f"{self._label} opened ({reason}), refusing calls for {self.open_seconds:g}s")
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._calls.clear()
+        self._failures = 0
+        self._slow = 0
+        logger.info(f"{self._label} closed")
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+
+class RouteBreakers:
+    """One CircuitBreaker per model route, created on first use"""
+
+    def __init__(self, **settings):
+        """
+        Args:
+            **settings: CircuitBreaker arguments shared by every route
+        """
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, route_name: str) -> CircuitBreaker:
+        """Breaker of a route, such as 'openai:gpt-4o'"""
+        breaker = self._breakers.get(route_name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(route_name)
+                if breaker is None:
+                    breaker = CircuitBreaker(name=route_name, **self.settings)
+                    self._breakers[route_name] = breaker
+        return breaker
+
+    def is_open(self, route_name: str) -> bool:
+        """Whether a route's breaker currently refuses calls; routes never called are closed"""
+        breaker = self._breakers.get(route_name)
+        return breaker is not None and breaker.state == OPEN
+
+    def stats(self) -> Dict[str, Dict]:
+        """State and window calls of every route called so far"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.stats() for name, breaker in breakers.items()}
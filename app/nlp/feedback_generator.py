@@ -1,30 +1,157 @@
 """
 Advanced NLP Feedback Generator using OpenAI GPT models
 """
-import openai
+import functools
+import json
 import logging
-from typing import Dict, List, Optional
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from app.config import Config
-from .prompt_templates import PromptTemplates
+from app.utils import metrics
+from app.utils.metrics import stage_timer
+from .prompt_templates import PromptTemplates, load_template_set
+from .cache import ResponseCache, create_cache, make_cache_key
+from .llm_client import LLMClient
+from .circuit_breaker import CircuitOpenError, RouteBreakers
+from .model_providers import ModelRouter, OpenAIProvider, Route
+from .local_renderer import LocalFeedbackRenderer, LOCAL_MODEL_NAME, FALLBACK_MODEL_NAME
+from .rubric_scoring import CompiledRubric
 
 logger = logging.getLogger(__name__)
 
+
+def _counted(method):
+    """Count the result source and total time of a generation method"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = method(self, *args, **kwargs)
+        metrics.record_result(result['source'], time.perf_counter() - started)
+        return result
+    return wrapper
+
+
+def _counted_stream(method):
+    """Count the source and total time of a streaming method's done event"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        for event in method(self, *args, **kwargs):
+            if event['type'] == 'done':
+                metrics.record_result(event['source'], time.perf_counter() - started)
+            yield event
+    return wrapper
+
+
 class FeedbackGenerator:
     """Advanced feedback generation using NLP techniques"""
     
-    def __init__(self, api_key: str = None):
-        """Initialize the feedback generator"""
+    model = "gpt-3.5-turbo"
+    generation_params = {
+        'temperature': 0.7,
+        'max_tokens': 300,
+        'presence_penalty': 0.1,
+        'frequency_penalty': 0.1
+    }
+    
+    # Output token ceiling for a packed multi-student request
+    max_pack_tokens = 4000
+    
+    def __init__(self,
+                 api_key: str = None,
+                 cache: Optional[ResponseCache] = None,
+                 max_inflight: Optional[int] = None,
+                 llm_client: Optional[LLMClient] = None,
+                 prompt_templates: Optional[PromptTemplates] = None,
+                 cohort_stats=None,
+                 similarity_index=None,
+                 profile_index=None,
+                 circuit_breakers: Optional[RouteBreakers] = None,
+                 model_router: Optional[ModelRouter] = None):
+        """
+        Initialize the feedback generator
+        
+        Args:
+            api_key: OpenAI API key for the default llm_client, defaults to
+                OPENAI_API_KEY
+            cache: Response cache, defaults to the FEEDBACK_CACHE_* settings;
+                False disables caching
+            max_inflight: Concurrent LLM calls allowed before requests overflow
+                to the local renderer, defaults to FEEDBACK_LLM_MAX_INFLIGHT
+                (0 disables overflow)
+            llm_client: Client used for OpenAI calls; without it or a
+                model_router, one is built from the OPENAI_* settings
+            prompt_templates: Prompt templates, defaults to the built-in
+                templates with overrides from PROMPT_TEMPLATES_PATH
+            cohort_stats: Object with a standing(scores) method, such as
+                app.analytics.ScoreHistograms, whose percentile ranks are
+                added to the performance analysis and prompts
+            similarity_index: Object with a find_near_duplicate(text,
+                student_name, cohort) method, such as
+                app.similarity.FeedbackSimilarityIndex; LLM feedback that
+                nearly duplicates another student's is regenerated once
+            profile_index: Object with a find(scores, feedback_type,
+                template_version) method, such as
+                app.profile_reuse.ProfileReuseIndex; when set, stored
+                feedback for the nearest score profile is reused by default
+            circuit_breakers: Breakers tracking failures and latency per
+                route; routes whose breaker is open are routed around, and
+                when every route's is open requests get local feedback
+                without an LLM call
+            model_router: Router choosing the provider and model per request,
+                defaults to the OpenAI client with the model attribute; a
+                router of local routes needs no API key
+        """
         self.api_key = api_key or Config.OPENAI_API_KEY
-        if not self.api_key:
-            raise ValueError("OpenAI API key is required")
         
-        openai.api_key = self.api_key
-        self.prompt_templates = PromptTemplates()
+        # A given router brings its own provider clients; only the default
+        # single OpenAI route needs a client, and so a key, from here
+        self.llm_client = llm_client
+        if self.llm_client is None and model_router is None:
+            if not self.api_key:
+                raise ValueError("OpenAI API key is required")
+            self.llm_client = LLMClient(
+                self.api_key,
+                api_base=Config.OPENAI_API_BASE,
+                pool_size=Config.OPENAI_HTTP_POOL_SIZE,
+                connect_timeout=Config.OPENAI_CONNECT_TIMEOUT,
+                read_timeout=Config.OPENAI_REQUEST_TIMEOUT,
+                max_retries=Config.OPENAI_MAX_RETRIES,
+                requests_per_minute=Config.OPENAI_REQUESTS_PER_MINUTE
+            )
+        self.prompt_templates = prompt_templates or PromptTemplates(
+            templates=load_template_set(Config.PROMPT_TEMPLATES_PATH)
+        )
+        if cache is None:
+            cache = create_cache(
+                Config.FEEDBACK_CACHE_BACKEND,
+                path=Config.FEEDBACK_CACHE_PATH,
+                ttl=Config.FEEDBACK_CACHE_TTL,
+                max_entries=Config.FEEDBACK_CACHE_MAX_ENTRIES
+            )
+        # An empty cache is falsy (len 0), so compare with False explicitly
+        self.cache = None if cache is False else cache
+        self.local_renderer = LocalFeedbackRenderer(self.prompt_templates)
+        self.cohort_stats = cohort_stats
+        self.similarity_index = similarity_index
+        self.profile_index = profile_index
+        self.circuit_breakers = circuit_breakers
+        self.model_router = model_router or ModelRouter.single(OpenAIProvider(self.llm_client), self.model)
+        self._reuse_lookups = 0
+        self._reuse_hits = 0
+        self._reuse_lock = threading.Lock()
+        self.max_inflight = Config.FEEDBACK_LLM_MAX_INFLIGHT if max_inflight is None else max_inflight
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
     
     def generate_feedback(self, 
                          student_name: str,
                          scores: Dict[str, int],
-                         feedback_type: str = "comprehensive") -> str:
+                         feedback_type: str = "comprehensive",
+                         reuse: Optional[bool] = None) -> str:
         """
         Generate personalized feedback based on student scores
         
@@ -32,44 +159,506 @@ class FeedbackGenerator:
             student_name: Name of the student
             scores: Dictionary of skill scores (1-10)
             feedback_type: Type of feedback to generate
+            reuse: Reuse stored feedback for the nearest score profile,
+                renamed for this student, instead of calling the model;
+                defaults to True when a profile index is configured
             
         Returns:
             Generated feedback text
         """
+        return self.generate_feedback_with_metadata(student_name, scores, feedback_type, reuse)['feedback']
+    
+    @_counted
+    def generate_feedback_with_metadata(self,
+                                        student_name: str,
+                                        scores: Dict[str, int],
+                                        feedback_type: str = "comprehensive",
+                                        reuse: Optional[bool] = None) -> Dict[str, str]:
+        """
+        Generate feedback and report how it was produced
+        
+        Args:
+            student_name: Name of the student
+            scores: Dictionary of skill scores (1-10)
+            feedback_type: 'comprehensive', 'brief' or 'local' (rendered
+                without calling the LLM)
+            reuse: See generate_feedback
+            
+        Returns:
+            Dictionary with 'feedback', 'model_used' and 'source' (one of
+            'llm', 'cache', 'reuse', 'local', 'overflow', 'degraded' or
+            'fallback'; degraded and fallback results are marked with
+            model_used FALLBACK_MODEL_NAME); LLM,
+            cached and reused results also carry the 'template_version' of
+            the prompt
+        """
         try:
             # Validate scores
-            self._validate_scores(scores)
+            with stage_timer('validate'):
+                self._validate_scores(scores)
             
             # Analyze performance patterns
-            performance_analysis = self._analyze_performance(scores)
+            with stage_timer('analyze'):
+                performance_analysis = self._analyze_performance(scores)
+            
+            if feedback_type == "local":
+                return self._render_local(student_name, scores, performance_analysis, 'local')
+            
+            if self.profile_index is not None and (reuse is None or reuse):
+                with stage_timer('reuse_lookup'):
+                    reused = self._reuse_feedback(student_name, scores, feedback_type)
+                if reused is not None:
+                    return reused
             
             # Generate appropriate prompt
-            prompt = self._create_prompt(student_name, scores, performance_analysis, feedback_type)
+            with stage_timer('prompt'):
+                prompt = self._create_prompt(student_name, scores, performance_analysis, feedback_type)
             
-            # Generate feedback using OpenAI
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": self.prompt_templates.get_system_prompt()},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=300,
-                presence_penalty=0.1,
-                frequency_penalty=0.1
-            )
+            system_prompt = self.prompt_templates.get_system_prompt()
             
-            feedback = response.choices[0].message.content.strip()
+            result = self._llm_feedback(system_prompt, prompt, student_name, feedback_type)
+            if result is None:
+                # Shed load to the local renderer when too many LLM calls are in flight
+                logger.info(f"LLM concurrency limit reached, rendering local feedback for {student_name}")
+                return self._render_local(student_name, scores, performance_analysis, 'overflow')
             
-            # Post-process feedback
-            feedback = self._post_process_feedback(feedback, student_name)
+            return result
             
-            logger.info(f"Generated feedback for {student_name}")
-            return feedback
+        except CircuitOpenError:
+            logger.info(f"LLM circuit open, rendering local feedback for {student_name}")
+            return self._render_local(student_name, scores, self._analyze_performance(scores), 'degraded',
+                                      model_used=FALLBACK_MODEL_NAME)
             
         except Exception as e:
             logger.error(f"Error generating feedback: {str(e)}")
-            return self._generate_fallback_feedback(student_name, scores)
+            return {
+                'feedback': self._generate_fallback_feedback(student_name, scores),
+                'model_used': FALLBACK_MODEL_NAME,
+                'source': 'fallback'
+            }
+    
+    @_counted
+    def generate_rubric_feedback(self,
+                                 student_name: str,
+                                 rubric: CompiledRubric,
+                                 vector: Tuple[int, ...],
+                                 feedback_type: str = "comprehensive") -> Dict[str, str]:
+        """
+        Generate feedback for scores on any rubric
+        
+        Args:
+            student_name: Name of the student
+            rubric: Compiled rubric the scores belong to
+            vector: Scores in criterion order, from rubric.vector()
+            feedback_type: 'comprehensive', 'brief' or 'local'
+            
+        Returns:
+            Dictionary with 'feedback', 'model_used' and 'source', as returned
+            by generate_feedback_with_metadata
+        """
+        analysis = rubric.analyze(vector)
+        try:
+            if feedback_type == "local":
+                return self._render_rubric_local(student_name, rubric, vector, analysis, 'local')
+            
+            with stage_timer('prompt'):
+                prompt = self.prompt_templates.get_rubric_scores_prompt(
+                    student_name, rubric.name, rubric.render_criteria(vector), analysis, feedback_type
+                )
+            
+            result = self._llm_feedback(self.prompt_templates.get_system_prompt(), prompt, student_name,
+                                        feedback_type, cohort=rubric.name)
+            if result is None:
+                logger.info(f"LLM concurrency limit reached, rendering local feedback for {student_name}")
+                return self._render_rubric_local(student_name, rubric, vector, analysis, 'overflow')
+            
+            return result
+            
+        except CircuitOpenError:
+            logger.info(f"LLM circuit open, rendering local feedback for {student_name}")
+            return self._render_rubric_local(student_name, rubric, vector, analysis, 'degraded',
+                                             model_used=FALLBACK_MODEL_NAME)
+            
+        except Exception as e:
+            logger.error(f"Error generating rubric feedback: {str(e)}")
+            return self._render_rubric_local(student_name, rubric, vector, analysis, 'fallback',
+                                             model_used=FALLBACK_MODEL_NAME)
+    
+    @_counted_stream
+    def stream_feedback(self,
+                        student_name: str,
+                        scores: Dict[str, int],
+                        feedback_type: str = "comprehensive") -> Iterator[Dict[str, str]]:
+        """
+        Generate feedback incrementally using the OpenAI streaming API
+        
+        Args:
+            student_name: Name of the student
+            scores: Dictionary of skill scores (1-10)
+            feedback_type: Type of feedback to generate
+            
+        Yields:
+            {'type': 'token', 'content': ...} for each streamed chunk, then one
+            {'type': 'done', 'feedback', 'model_used', 'source'} event carrying
+            the post-processed text. If generation fails part way, the done
+            event carries fallback feedback that replaces any streamed tokens.
+        """
+        try:
+            with stage_timer('validate'):
+                self._validate_scores(scores)
+            with stage_timer('analyze'):
+                performance_analysis = self._analyze_performance(scores)
+            
+            if feedback_type == "local":
+                yield {'type': 'done', **self._render_local(student_name, scores, performance_analysis, 'local')}
+                return
+            
+            with stage_timer('prompt'):
+                prompt = self._create_prompt(student_name, scores, performance_analysis, feedback_type)
+            system_prompt = self.prompt_templates.get_system_prompt()
+            route = self._route(feedback_type, system_prompt, prompt)
+            
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self._cache_key(system_prompt, prompt, route.model)
+                cached = self._cache_get(cache_key)
+                if cached is not None:
+                    yield {'type': 'done', 'feedback': cached, 'model_used': route.model, 'source': 'cache',
+                           'template_version': self.prompt_templates.template_version}
+                    return
+            
+            if not self._acquire_llm_slot():
+                yield {'type': 'done', **self._render_local(student_name, scores, performance_analysis, 'overflow')}
+                return
+            
+            breaker = self.circuit_breakers.get(route.name) if self.circuit_breakers is not None else None
+            if breaker is not None and not breaker.allow():
+                self._release_llm_slot()
+                logger.info(f"LLM circuit open, rendering local feedback for {student_name}")
+                yield {'type': 'done', **self._render_local(student_name, scores, performance_analysis, 'degraded',
+                                                            model_used=FALLBACK_MODEL_NAME)}
+                return
+            
+            chunks = []
+            succeeded = False
+            started = time.perf_counter()
+            try:
+                # Streamed responses carry no usage, so only the duration is recorded
+                with stage_timer('llm_stream'):
+                    response = route.provider.chat_completion(
+                        route.model,
+                        [
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": prompt}
+                        ],
+                        stream=True,
+                        **self.generation_params
+                    )
+                    
+                    for chunk in response:
+                        content = chunk.choices[0].delta.get('content') if chunk.choices else None
+                        if content:
+                            chunks.append(content)
+                            yield {'type': 'token', 'content': content}
+                succeeded = True
+            except GeneratorExit:
+                # The client went away, which says nothing about the LLM
+                succeeded = True
+                raise
+            finally:
+                self._release_llm_slot()
+                seconds = time.perf_counter() - started
+                if breaker is not None:
+                    breaker.record(succeeded, seconds)
+                self.model_router.record(route, succeeded, seconds)
+            
+            with stage_timer('post_process'):
+                feedback = self._post_process_feedback(''.join(chunks).strip(), student_name)
+            
+            if cache_key is not None:
+                self.cache.set(cache_key, feedback)
+            
+            logger.info(f"Streamed feedback for {student_name}")
+            yield {'type': 'done', 'feedback': feedback, 'model_used': route.model, 'source': 'llm',
+                   'template_version': self.prompt_templates.template_version}
+            
+        except Exception as e:
+            logger.error(f"Error streaming feedback: {str(e)}")
+            yield {
+                'type': 'done',
+                'feedback': self._generate_fallback_feedback(student_name, scores),
+                'model_used': FALLBACK_MODEL_NAME,
+                'source': 'fallback'
+            }
+    
+    def _reuse_feedback(self,
+                        student_name: str,
+                        scores: Dict[str, int],
+                        feedback_type: str) -> Optional[Dict[str, str]]:
+        """Stored feedback for the nearest score profile, renamed for this student"""
+        match = self.profile_index.find(scores, feedback_type, self.prompt_templates.template_version)
+        feedback = None
+        if match is not None:
+            feedback = self._swap_name(match['feedback'], match['student_name'], student_name)
+        
+        with self._reuse_lock:
+            self._reuse_lookups += 1
+            if feedback is not None:
+                self._reuse_hits += 1
+        
+        if feedback is None:
+            return None
+        
+        logger.info(f"Reused feedback {match['feedback_id']} for {student_name} "
+                    f"(score distance {match['distance']})")
+        return {
+            'feedback': feedback,
+            'model_used': match['model_used'] or self.model_router.default_model,
+            'source': 'reuse',
+            'template_version': match['template_version'],
+            'reused_feedback_id': match['feedback_id']
+        }
+    
+    def reuse_stats(self) -> Dict[str, float]:
+        """Score-profile lookups, how many reused stored feedback, and the ratio"""
+        with self._reuse_lock:
+            lookups, hits = self._reuse_lookups, self._reuse_hits
+        return {
+            'lookups': lookups,
+            'reused': hits,
+            'reuse_ratio': hits / lookups if lookups else 0.0
+        }
+    
+    @staticmethod
+    def _swap_name(feedback: str, old_name: str, new_name: str) -> Optional[str]:
+        """
+        Replace a student's full and first name with another student's
+        
+        A full name of several words is replaced wherever it appears. A single
+        name, usually the first name, is only replaced at positions where it
+        must be a name: within a sentence, where only names are capitalised,
+        or followed by punctuation or a possessive. A first name that starts
+        a sentence before another word may be an ordinary word ("Will you",
+        "Grace under pressure"), so such feedback is not reused. Neither is
+        feedback that still mentions any part of the old name in another
+        case or on its own, such as "alice" or "Ms. Smith".
+        
+        Returns:
+            Feedback addressed to the new student, or None when it cannot be
+            renamed safely
+        """
+        old_parts, new_parts = old_name.split(), new_name.split()
+        if not old_parts or not new_parts or old_name == new_name:
+            return feedback
+        
+        # One pass, so a new name containing the old first name is left alone
+        names = [re.escape(old_name)] if len(old_parts) > 1 else []
+        pattern = re.compile(rf"\b(?:{'|'.join(names + [re.escape(old_parts[0])])})\b")
+        pieces = []
+        kept = []
+        position = 0
+        for match in pattern.finditer(feedback):
+            kept.append(feedback[position:match.start()])
+            if len(old_parts) > 1 and match.group(0) == old_name:
+                replacement = new_name
+            else:
+                before = feedback[:match.start()].rstrip(' \t"\'(')
+                starts_sentence = not before or before[-1] in '.!?:\n-*'
+                if starts_sentence and re.match(r"\s+\w", feedback[match.end():]):
+                    return None
+                replacement = new_parts[0]
+            pieces.append(feedback[position:match.start()])
+            pieces.append(replacement)
+            position = match.end()
+        pieces.append(feedback[position:])
+        kept.append(feedback[position:])
+        
+        # Any other mention of the old name in the text left unchanged leaks it
+        tokens = [re.escape(token) for token in (part.strip('.,') for part in old_parts) if len(token) > 1]
+        if tokens:
+            leftover = re.compile(rf"\b(?:{'|'.join(tokens)})\b", re.IGNORECASE)
+            if any(leftover.search(text) for text in kept):
+                return None
+        return ''.join(pieces)
+    
+    def _render_local(self,
+                      student_name: str,
+                      scores: Dict[str, int],
+                      analysis: Dict[str, List[str]],
+                      source: str,
+                      model_used: str = LOCAL_MODEL_NAME) -> Dict[str, str]:
+        """Render feedback with the local template engine"""
+        return {
+            'feedback': self.local_renderer.render(student_name, scores, analysis),
+            'model_used': model_used,
+            'source': source
+        }
+    
+    def _llm_feedback(self,
+                      system_prompt: str,
+                      prompt: str,
+                      student_name: str,
+                      feedback_type: str = "comprehensive",
+                      cohort: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """
+        Complete a feedback prompt from the cache or the model chosen by the router
+        
+        With a similarity index, feedback that nearly duplicates recent
+        feedback for another student in the same cohort is regenerated once.
+        
+        Args:
+            system_prompt: System prompt
+            prompt: User prompt
+            student_name: Name of the student
+            feedback_type: 'comprehensive' or 'brief', for model routing
+            cohort: Rubric name, or None for skill-score feedback
+            
+        Returns:
+            Result dictionary with source 'cache' or 'llm', or None when the
+            LLM concurrency limit is reached
+        """
+        route = self._route(feedback_type, system_prompt, prompt)
+        
+        # Serve identical requests from the cache
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(system_prompt, prompt, route.model)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                logger.info(f"Served cached feedback for {student_name}")
+                return {'feedback': cached, 'model_used': route.model, 'source': 'cache',
+                        'template_version': self.prompt_templates.template_version}
+        
+        if not self._acquire_llm_slot():
+            return None
+        
+        try:
+            feedback = self._complete(route, system_prompt, prompt, student_name)
+            
+            if self.similarity_index is not None:
+                with stage_timer('dedup_lookup'):
+                    duplicate = self.similarity_index.find_near_duplicate(feedback, student_name, cohort)
+                if duplicate is not None:
+                    logger.info(f"Feedback for {student_name} is {duplicate['similarity']:.0%} similar to "
+                                f"feedback {duplicate['feedback_id']}, regenerating")
+                    feedback = self._complete(
+                        route, system_prompt, self.prompt_templates.get_distinct_wording_prompt(prompt, student_name),
+                        student_name
+                    )
+        finally:
+            self._release_llm_slot()
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, feedback)
+        
+        logger.info(f"Generated feedback for {student_name} with {route.name}")
+        return {'feedback': feedback, 'model_used': route.model, 'source': 'llm',
+                'template_version': self.prompt_templates.template_version}
+    
+    def _complete(self, route: Route, system_prompt: str, prompt: str, student_name: str) -> str:
+        """Generate post-processed feedback text with one LLM call"""
+        with stage_timer('llm'):
+            response = self._call_llm(
+                route,
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                **self.generation_params
+            )
+        metrics.record_usage(response)
+        
+        with stage_timer('post_process'):
+            return self._post_process_feedback(response.choices[0].message.content.strip(), student_name)
+    
+    def _call_llm(self, route: Route, messages: List[Dict[str, str]], **params):
+        """
+        Create a chat completion on a route, recording the outcome with the
+        route's circuit breaker and the model router
+        
+        Raises:
+            CircuitOpenError: When the route's breaker is open; no call is made
+        """
+        breaker = self.circuit_breakers.get(route.name) if self.circuit_breakers is not None else None
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"LLM circuit for {route.name} is open")
+        
+        started = time.perf_counter()
+        try:
+            response = route.provider.chat_completion(route.model, messages, **params)
+        except Exception:
+            seconds = time.perf_counter() - started
+            if breaker is not None:
+                breaker.record(False, seconds)
+            self.model_router.record(route, False, seconds)
+            raise
+        seconds = time.perf_counter() - started
+        if breaker is not None:
+            breaker.record(True, seconds)
+        self.model_router.record(route, True, seconds, response)
+        return response
+    
+    def _route(self, feedback_type: str, system_prompt: str, prompt: str) -> Route:
+        """Route chosen by the model router for a one-student prompt, avoiding open circuits"""
+        is_open = self.circuit_breakers.is_open if self.circuit_breakers is not None else None
+        return self.model_router.choose(feedback_type, len(system_prompt) + len(prompt),
+                                        self.generation_params['max_tokens'], is_open=is_open)
+    
+    def llm_available(self) -> bool:
+        """Whether any configured route's circuit breaker accepts calls"""
+        if self.circuit_breakers is None:
+            return True
+        return any(not self.circuit_breakers.is_open(route.name)
+                   for routes in self.model_router.routes.values() for route in routes)
+    
+    def _cache_get(self, cache_key: str) -> Optional[str]:
+        """Look up a cached response and count the hit or miss"""
+        with stage_timer('cache_lookup'):
+            cached = self.cache.get(cache_key)
+        metrics.CACHE_LOOKUPS.inc(result='miss' if cached is None else 'hit')
+        return cached
+    
+    def _render_rubric_local(self,
+                             student_name: str,
+                             rubric: CompiledRubric,
+                             vector: Tuple[int, ...],
+                             analysis: Dict,
+                             source: str,
+                             model_used: str = LOCAL_MODEL_NAME) -> Dict[str, str]:
+        """Short template feedback for rubric scores, used without the LLM"""
+        sentences = [f"{student_name} averages {analysis['average_score']:.1f}/10 against {rubric.name}."]
+        
+        if analysis['strengths']:
+            sentences.append(f"Strongest areas: {', '.join(analysis['strengths'])}.")
+        if analysis['good_areas']:
+            sentences.append(f"Progressing well in {', '.join(analysis['good_areas'])}.")
+        
+        if analysis['improvement_areas']:
+            lowest = min(range(len(vector)), key=lambda index: vector[index] / rubric.max_scores[index])
+            sentences.append(
+                f"The next focus should be {rubric.names[lowest]} "
+                f"({vector[lowest]}/{rubric.max_scores[lowest]}), with regular practice and feedback."
+            )
+        else:
+            sentences.append("Keep building on this consistent performance.")
+        
+        return {'feedback': ' '.join(sentences), 'model_used': model_used, 'source': source}
+    
+    def _cache_key(self, system_prompt: str, prompt: str, model: str) -> str:
+        return make_cache_key(system_prompt, prompt, model, self.generation_params,
+                              self.prompt_templates.template_version)
+    
+    def _acquire_llm_slot(self) -> bool:
+        """Reserve an in-flight LLM call, or return False when at the limit"""
+        with self._inflight_lock:
+            if self.max_inflight and self._inflight >= self.max_inflight:
+                return False
+            self._inflight += 1
+            return True
+    
+    def _release_llm_slot(self) -> None:
+        with self._inflight_lock:
+            self._inflight -= 1
     
     def _validate_scores(self, scores: Dict[str, int]) -> None:
         """Validate input scores"""
@@ -84,7 +673,11 @@ class FeedbackGenerator:
                 raise ValueError(f"Invalid score for {skill}: {score}. Must be integer 1-10")
     
     def _analyze_performance(self, scores: Dict[str, int]) -> Dict[str, List[str]]:
-        """Analyze performance patterns to categorize strengths and areas for improvement"""
+        """
+        Analyze performance patterns to categorize strengths and areas for improvement
+        
+        With cohort stats, also adds 'cohort': percentile ranks of each score.
+        """
         strengths = []
         good_areas = []
         improvement_areas = []
@@ -99,12 +692,19 @@ class FeedbackGenerator:
             else:
                 improvement_areas.append(skill_display)
         
-        return {
+        analysis = {
             'strengths': strengths,
             'good_areas': good_areas,
             'improvement_areas': improvement_areas,
             'average_score': sum(scores.values()) / len(scores)
         }
+        
+        if self.cohort_stats is not None:
+            cohort = self.cohort_stats.standing(scores)
+            if cohort is not None:
+                analysis['cohort'] = cohort
+        
+        return analysis
     
     def _create_prompt(self, 
                       student_name: str, 
@@ -120,7 +720,8 @@ class FeedbackGenerator:
         else:
             return self.prompt_templates.get_comprehensive_prompt(student_name, scores, analysis)
     
-    def _post_process_feedback(self, feedback: str, student_name: str) -> str:
+    @staticmethod
+    def _post_process_feedback(feedback: str, student_name: str) -> str:
         """Post-process the generated feedback"""
         # Ensure student name is properly used
         if student_name not in feedback:
@@ -144,30 +745,215 @@ class FeedbackGenerator:
         else:
             return f"{student_name} has room for improvement with an average score of {avg_score:.1f}/10. Consider additional practice and support in key skill areas."
     
-    def batch_generate_feedback(self, student_data: List[Dict]) -> List[Dict]:
-        """Generate feedback for multiple students"""
-        results = []
+    def batch_generate_feedback(self,
+                                student_data: List[Dict],
+                                max_workers: Optional[int] = None,
+                                pack_size: Optional[int] = None) -> List[Dict]:
+        """
+        Generate feedback for multiple students
         
-        for data in student_data:
+        Args:
+            student_data: List of dictionaries with student_name, scores and
+                optional feedback_type
+            max_workers: Maximum number of concurrent LLM calls. Defaults to
+                the FEEDBACK_BATCH_CONCURRENCY setting; 1 runs sequentially.
+            pack_size: Students per packed LLM request. Defaults to the
+                FEEDBACK_PACK_SIZE setting; 0 or 1 sends one request per student.
+            
+        Returns:
+            List of result dictionaries in the same order as student_data
+        """
+        if max_workers is None:
+            max_workers = Config.FEEDBACK_BATCH_CONCURRENCY
+        max_workers = max(1, min(max_workers, len(student_data) or 1))
+        
+        if pack_size is None:
+            pack_size = Config.FEEDBACK_PACK_SIZE
+        
+        if pack_size > 1:
+            return self._batch_generate_packed(student_data, max_workers, pack_size)
+        
+        if max_workers == 1:
+            return [self.generate_batch_item(data) for data in student_data]
+        
+        # executor.map yields results in input order regardless of completion order
+        with ThreadPoolExecutor(max_workers=max_workers,
+                                thread_name_prefix='feedback-batch') as executor:
+            return list(executor.map(self.generate_batch_item, student_data))
+    
+    def _batch_generate_packed(self,
+                               student_data: List[Dict],
+                               max_workers: int,
+                               pack_size: int) -> List[Dict]:
+        """
+        Generate feedback for several students per LLM request
+        
+        Students whose packed output is missing or malformed, and entries that
+        cannot be packed (invalid input, local feedback), fall back to
+        individual generate_batch_item calls.
+        """
+        results = [None] * len(student_data)
+        system_prompt = self.prompt_templates.get_system_prompt()
+        groups = {}
+        # One route per feedback type, so every pack of a type uses one model
+        routes = {}
+        
+        for index, data in enumerate(student_data):
             try:
-                feedback = self.generate_feedback(
-                    data['student_name'],
-                    data['scores'],
-                    data.get('feedback_type', 'comprehensive')
-                )
-                
-                results.append({
-                    'student_name': data['student_name'],
-                    'feedback': feedback,
-                    'status': 'success'
-                })
+                feedback_type = data.get('feedback_type', 'comprehensive')
+                if feedback_type not in ('comprehensive', 'brief'):
+                    continue
                 
-            except Exception as e:
-                results.append({
-                    'student_name': data.get('student_name', 'Unknown'),
-                    'feedback': None,
-                    'status': 'error',
-                    'error': str(e)
-                })
-        
-        return results
\ No newline at end of file
+                student_name = data['student_name']
+                scores = data['scores']
+                self._validate_scores(scores)
+            except Exception:
+                continue
+            
+            analysis = self._analyze_performance(scores)
+            prompt = self._create_prompt(student_name, scores, analysis, feedback_type)
+            if feedback_type not in routes:
+                routes[feedback_type] = self._route(feedback_type, system_prompt, prompt)
+            route = routes[feedback_type]
+            
+            # Students already answered by an identical single request need no call
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self._cache_key(system_prompt, prompt, route.model)
+                cached = self._cache_get(cache_key)
+                if cached is not None:
+                    results[index] = self._batch_result(student_name, cached, route.model,
+                                                         self.prompt_templates.template_version)
+                    continue
+            
+            groups.setdefault(feedback_type, []).append((index, student_name, scores, analysis, cache_key))
+        
+        packs = [
+            (feedback_type, entries[start:start + pack_size])
+            for feedback_type, entries in groups.items()
+            for start in range(0, len(entries), pack_size)
+        ]
+        
+        def run_pack(pack):
+            feedback_type, entries = pack
+            route = routes[feedback_type]
+            for index, student_name, feedback in self._generate_pack(route, system_prompt, entries, feedback_type):
+                results[index] = self._batch_result(student_name, feedback, route.model,
+                                                    self.prompt_templates.template_version)
+        
+        def run_single(index):
+            results[index] = self.generate_batch_item(student_data[index])
+        
+        with ThreadPoolExecutor(max_workers=max_workers,
+                                thread_name_prefix='feedback-batch') as executor:
+            list(executor.map(run_pack, packs))
+            
+            remaining = [index for index, result in enumerate(results) if result is None]
+            if remaining:
+                logger.info(f"Generating {len(remaining)} of {len(results)} batch entries individually")
+            list(executor.map(run_single, remaining))
+        
+        return results
+    
+    def _generate_pack(self,
+                       route: Route,
+                       system_prompt: str,
+                       entries: List[tuple],
+                       feedback_type: str) -> List[tuple]:
+        """
+        Request feedback for a pack of students in a single LLM call
+        
+        Returns:
+            (index, student_name, feedback) for every student with valid output
+        """
+        students = [
+            (f"s{position + 1}", student_name, scores, analysis)
+            for position, (_, student_name, scores, analysis, _) in enumerate(entries)
+        ]
+        prompt = self.prompt_templates.get_packed_prompt(students, feedback_type)
+        params = dict(self.generation_params,
+                      max_tokens=min(self.max_pack_tokens, self.generation_params['max_tokens'] * len(entries)))
+        
+        if not self._acquire_llm_slot():
+            return []
+        
+        try:
+            with stage_timer('llm_packed'):
+                response = self._call_llm(
+                    route,
+                    [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    **params
+                )
+            metrics.record_usage(response)
+            packed = self._parse_packed_response(response.choices[0].message.content)
+        except CircuitOpenError:
+            # Each student falls back to generate_batch_item, which renders local feedback
+            return []
+        except Exception as e:
+            logger.error(f"Error generating packed feedback for {len(entries)} students: {str(e)}")
+            return []
+        finally:
+            self._release_llm_slot()
+        
+        generated = []
+        for (student_id, _, _, _), (index, student_name, _, _, cache_key) in zip(students, entries):
+            text = packed.get(student_id)
+            if not isinstance(text, str) or not text.strip():
+                continue
+            
+            feedback = self._post_process_feedback(text.strip(), student_name)
+            if cache_key is not None:
+                self.cache.set(cache_key, feedback)
+            generated.append((index, student_name, feedback))
+        
+        return generated
+    
+    def _parse_packed_response(self, content: str) -> Dict[str, str]:
+        """Parse the JSON object returned for a packed request, tolerating surrounding text"""
+        content = (content or '').strip()
+        start, end = content.find('{'), content.rfind('}')
+        if start == -1 or end <= start:
+            return {}
+        
+        try:
+            parsed = json.loads(content[start:end + 1])
+        except ValueError:
+            return {}
+        
+        return parsed if isinstance(parsed, dict) else {}
+    
+    def _batch_result(self,
+                      student_name: str,
+                      feedback: str,
+                      model_used: str,
+                      template_version: Optional[str] = None) -> Dict:
+        return {
+            'student_name': student_name,
+            'feedback': feedback,
+            'model_used': model_used,
+            'template_version': template_version,
+            'status': 'success'
+        }
+    
+    def generate_batch_item(self, data: Dict) -> Dict:
+        """Generate feedback for a single batch entry, mapping failures to an error result"""
+        try:
+            generated = self.generate_feedback_with_metadata(
+                data['student_name'],
+                data['scores'],
+                data.get('feedback_type', 'comprehensive')
+            )
+            
+            return self._batch_result(data['student_name'], generated['feedback'],
+                                      generated['model_used'], generated.get('template_version'))
+            
+        except Exception as e:
+            return {
+                'student_name': data.get('student_name', 'Unknown'),
+                'feedback': None,
+                'status': 'error',
+                'error': str(e)
+            }
@@ -0,0 +1,266 @@
+"""
+Resilient OpenAI chat client
+
+Wraps the OpenAI chat completion call with a pooled keep-alive HTTP
+session, per-call timeouts, retries with exponential backoff and jitter on
+rate limits and server errors, and a client-side token bucket that follows
+the rate-limit headers returned by the API.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate-limit reset header such as '1s', '6m0s' or '20ms'
+
+    Returns:
+        Seconds until the limit resets, or None if the value is not understood
+    """
+    if not value:
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the request rate"""
+
+    def __init__(self, rate: float = 0.0, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens added per second; 0 disables client-side limiting
+                apart from pauses requested by rate-limit headers
+            capacity: Maximum burst size, defaults to one second worth of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take one token, sleeping until one is available
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._paused_until - now
+
+                if delay <= 0:
+                    if not self.rate:
+                        return waited
+
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for the given number of seconds"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def set_rate(self, rate: float) -> None:
+        """Change the refill rate, e.g. to match the limit reported by the API"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = max(1.0, rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+class LLMClient:
+    """OpenAI chat completion client with pooling, timeouts, retries and rate limiting"""
+
+    def __init__(self,
+                 api_key: str,
+                 api_base: Optional[str] = None,
+                 pool_size: int = 16,
+                 connect_timeout: float = 5.0,
+                 read_timeout: float = 30.0,
+                 max_retries: int = 3,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 8.0,
+                 requests_per_minute: int = 0,
+                 min_token_headroom: int = 1000):
+        """
+        Args:
+            api_key: OpenAI API key
+            api_base: Base URL of an OpenAI-compatible API, None for the
+                OpenAI default
+            pool_size: Keep-alive connections kept per host
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait for the response
+            max_retries: Retries after the first attempt for retryable errors
+            backoff_base: First retry delay in seconds, doubled on each retry
+            backoff_max: Upper bound for a single retry delay
+            requests_per_minute: Client-side request limit, 0 to rely on the
+                rate-limit headers only
+            min_token_headroom: Pause until the token window resets when fewer
+                tokens than this remain
+        """
+        import openai
+        import requests
+
+        self._openai = openai
+        self.api_key = api_key
+        self.api_base = api_base
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.min_token_headroom = min_token_headroom
+        self.limiter = TokenBucket(rate=requests_per_minute / 60.0)
+        self._configured_rate = bool(requests_per_minute)
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.hooks['response'].append(self._on_response)
+
+        self._retryable = (
+            openai.error.RateLimitError,
+            openai.error.ServiceUnavailableError,
+            openai.error.Timeout,
+            openai.error.APIConnectionError,
+            openai.error.TryAgain,
+        )
+
+    def chat_completion(self, **params: Any):
+        """
+        Create a chat completion, retrying transient failures
+
+        Args:
+            **params: Arguments for openai.ChatCompletion.create
+
+        Returns:
+            The OpenAI response (an iterator of chunks when stream=True)
+
+        Raises:
+            openai.error.OpenAIError: When the request fails permanently or
+                retries are exhausted
+        """
+        params.setdefault('request_timeout', self.timeout)
+        if self.api_base:
+            params.setdefault('api_base', self.api_base)
+        attempt = 0
+
+        while True:
+            self.limiter.acquire()
+            try:
+                with self._session_scope():
+                    return self._openai.ChatCompletion.create(api_key=self.api_key, **params)
+
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+
+                delay = self._retry_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"LLM call failed ({type(e).__name__}: {str(e)}), "
+                               f"retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    @contextmanager
+    def _session_scope(self):
+        """
+        Send the requests made inside the block through the pooled session
+
+        openai 0.28 has no per-call session argument and keeps one session
+        per thread. The pooled session replaces the calling thread's session
+        for the block only, so other openai callers (such as ai.py) keep
+        their own connections and are not fed to this client's limiter.
+        """
+        context = self._openai.api_requestor._thread_context
+        previous = getattr(context, 'session', None)
+        previous_created = getattr(context, 'session_create_time', None)
+        context.session = self.session
+        context.session_create_time = time.time()
+        try:
+            yield
+        finally:
+            if previous is None:
+                del context.session
+                del context.session_create_time
+            else:
+                context.session = previous
+                context.session_create_time = previous_created
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, self._retryable):
+            return True
+        # Generic API errors are retried when the server reported a 5xx status
+        status = getattr(error, 'http_status', None)
+        return isinstance(error, self._openai.error.APIError) and (status is None or status >= 500)
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """Exponential backoff with full jitter, honouring Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+        headers = getattr(error, 'headers', None) or {}
+        retry_after = parse_reset_duration(headers.get('retry-after'))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+            self.limiter.pause(retry_after)
+
+        return delay
+
+    def _on_response(self, response, *args, **kwargs):
+        """Feed rate-limit headers from every API response into the limiter"""
+        headers = response.headers
+
+        limit = headers.get('x-ratelimit-limit-requests')
+        if limit and not self._configured_rate:
+            try:
+                self.limiter.set_rate(int(limit) / 60.0)
+            except ValueError:
+                pass
+
+        remaining = headers.get('x-ratelimit-remaining-requests')
+        if remaining is not None and remaining.isdigit() and int(remaining) == 0:
+            reset = parse_reset_duration(headers.get('x-ratelimit-reset-requests'))
+            if reset:
+                self.limiter.pause(reset)
+
+        remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+        if (remaining_tokens is not None and remaining_tokens.isdigit()
+                and int(remaining_tokens) < self.min_token_headroom):
+            reset = parse_reset_duration(headers.get('x-ratelimit-reset-tokens'))
+            if reset:
+                self.limiter.pause(reset)
+
+        return response
@@ -0,0 +1,175 @@
+"""
+Deterministic, template-based feedback rendering
+
+Builds complete feedback paragraphs from the performance analysis and the
+per-skill improvement suggestions without calling the LLM. Phrasing varies
+between students but is stable for the same input, so drafts are
+reproducible and cheap enough to render thousands per second.
+"""
+import zlib
+from typing import Dict, List
+from .prompt_templates import PromptTemplates
+
+LOCAL_MODEL_NAME = 'local-template'
+
+# model_used of feedback rendered because the LLM failed or its circuit was
+# open, so these rows can be found and regenerated later
+FALLBACK_MODEL_NAME = 'local-fallback'
+
+# Representative scores for the suggestion levels used by PromptTemplates
+_LEVEL_SCORES = {'low': 5, 'medium': 7, 'high': 10}
+
+_OPENINGS = {
+    'high': [
+        "{name} has delivered an outstanding performance, averaging {average:.1f}/10 across all areas.",
+        "With an average score of {average:.1f}/10, {name} has shown excellent work throughout.",
+        "{name} stands out with consistently strong results and an average of {average:.1f}/10.",
+    ],
+    'medium': [
+        "{name} has shown solid performance, with an average score of {average:.1f}/10.",
+        "With an average of {average:.1f}/10, {name} is building a good foundation across the skills assessed.",
+        "{name} has made steady progress and averages {average:.1f}/10 overall.",
+    ],
+    'low': [
+        "{name} has an average score of {average:.1f}/10, with clear opportunities to grow.",
+        "{name} is still developing in several areas, averaging {average:.1f}/10 so far.",
+        "With an average of {average:.1f}/10, {name} has a solid starting point to build on.",
+    ],
+}
+
+_STRENGTHS = [
+    "{name}'s strongest {areas} {skills}, where the work is consistently impressive.",
+    "{skills} {stand} out as clear {strengths} for {name}.",
+    "{name} shows real strength in {skills}.",
+]
+
+_STRENGTH_NEXT_STEPS = [
+    "To build on this, {name} could {suggestion}",
+    "As a next step in {skill}, {name} might {suggestion}",
+]
+
+_GOOD_AREAS = [
+    "{skills} {are} developing well and {show} good progress.",
+    "{name} is making good progress in {skills}.",
+    "Performance in {skills} is solid and moving in the right direction.",
+]
+
+_GOOD_NEXT_STEPS = [
+    "To take {skill} further, {name} should {suggestion}",
+    "In {skill}, {name} can {suggestion}",
+]
+
+_IMPROVEMENTS = [
+    "To strengthen {skill} ({score}/10), {name} should {suggestion}",
+    "{skill} ({score}/10) is the main area for growth; {name} would benefit if they {suggestion}",
+    "For {skill} ({score}/10), a focused plan would help: {name} should {suggestion}",
+]
+
+_CLOSINGS = [
+    "With continued effort, {name} is well placed to keep improving.",
+    "Keep up the commitment, {name}; the progress so far is encouraging.",
+    "{name} has every reason to feel confident about the road ahead.",
+]
+
+
+class LocalFeedbackRenderer:
+    """Renders feedback locally from scores and performance analysis"""
+
+    # Improvement areas beyond this many are summarised in the opening analysis only
+    max_improvement_suggestions = 2
+
+    def __init__(self, prompt_templates: PromptTemplates = None):
+        prompt_templates = prompt_templates or PromptTemplates()
+        self._suggestions = {}
+        for skill in ('communication', 'teamwork', 'creativity', 'critical_thinking', 'presentation'):
+            for level, score in _LEVEL_SCORES.items():
+                self._suggestions[skill, level] = prompt_templates.get_improvement_suggestions(skill, score)
+
+    def render(self,
+               student_name: str,
+               scores: Dict[str, int],
+               analysis: Dict[str, List[str]]) -> str:
+        """
+        Render a feedback paragraph
+
+        Args:
+            student_name: Name of the student
+            scores: Dictionary of skill scores (1-10)
+            analysis: Output of FeedbackGenerator._analyze_performance
+
+        Returns:
+            Feedback text
+        """
+        seed = zlib.crc32(f"{student_name}|{sorted(scores.items())}".encode('utf-8'))
+        keys = {self._display_name(skill): skill for skill in scores}
+        name = student_name
+        average = analysis['average_score']
+
+        if average >= 8:
+            band = 'high'
+        elif average >= 6:
+            band = 'medium'
+        else:
+            band = 'low'
+
+        sentences = [self._pick(_OPENINGS[band], seed, 0).format(name=name, average=average)]
+
+        strengths = analysis['strengths']
+        if strengths:
+            plural = len(strengths) > 1
+            sentences.append(self._pick(_STRENGTHS, seed, 1).format(
+                name=name,
+                skills=self._join(strengths),
+                areas='areas are' if plural else 'area is',
+                stand='stand' if plural else 'stands',
+                strengths='strengths' if plural else 'a strength'
+            ))
+            top = max(strengths, key=lambda skill: scores[keys[skill]])
+            sentences.append(self._pick(_STRENGTH_NEXT_STEPS, seed, 2).format(
+                name=name, skill=top, suggestion=self._suggestion(keys[top], 'high')
+            ))
+
+        good_areas = analysis['good_areas']
+        if good_areas:
+            plural = len(good_areas) > 1
+            sentences.append(self._pick(_GOOD_AREAS, seed, 3).format(
+                name=name,
+                skills=self._join(good_areas),
+                are='are' if plural else 'is',
+                show='show' if plural else 'shows'
+            ))
+            weakest = min(good_areas, key=lambda skill: scores[keys[skill]])
+            sentences.append(self._pick(_GOOD_NEXT_STEPS, seed, 4).format(
+                name=name, skill=weakest, suggestion=self._suggestion(keys[weakest], 'medium')
+            ))
+
+        improvement_areas = sorted(analysis['improvement_areas'], key=lambda skill: scores[keys[skill]])
+        for index, skill in enumerate(improvement_areas[:self.max_improvement_suggestions]):
+            sentences.append(self._pick(_IMPROVEMENTS, seed, 5 + index).format(
+                name=name, skill=skill, score=scores[keys[skill]],
+                suggestion=self._suggestion(keys[skill], 'low')
+            ))
+
+        sentences.append(self._pick(_CLOSINGS, seed, 7).format(name=name))
+        return ' '.join(sentences)
+
+    def _suggestion(self, skill: str, level: str) -> str:
+        """Suggestion text phrased to follow 'should', 'could', ..."""
+        text = self._suggestions.get(
+            (skill, level), "Continue developing this skill through practice and feedback."
+        )
+        return text[0].lower() + text[1:]
+
+    @staticmethod
+    def _pick(variants: List[str], seed: int, slot: int) -> str:
+        return variants[(seed >> slot) % len(variants)]
+
+    @staticmethod
+    def _display_name(skill: str) -> str:
+        return skill.replace('_', ' ').title()
+
+    @staticmethod
+    def _join(skills: List[str]) -> str:
+        if len(skills) == 1:
+            return skills[0]
+        return f"{', '.join(skills[:-1])} and {skills[-1]}"
@@ -0,0 +1,378 @@
+"""
+Model providers and per-request model routing
+
+A provider creates OpenAI-shaped chat completions for the models it serves:
+OpenAIProvider calls the OpenAI API through the pooled LLMClient, and
+LocalStubProvider answers instantly without network access, for tests and
+load tests. The ModelRouter holds an ordered list of routes (provider and
+model) per feedback type and picks one per request. Routes whose estimated
+cost exceeds the per-student budget are skipped, as are routes with a high
+recent error rate. When the preferred route is slower than the latency
+target, the fastest healthy route is used instead.
+
+Routes are configured as comma-separated provider:model lists, e.g.
+FEEDBACK_MODELS_BRIEF=openai:gpt-4o-mini and
+FEEDBACK_MODELS_COMPREHENSIVE=openai:gpt-4o,openai:gpt-4o-mini.
+"""
+import json
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.utils import metrics
+
+# USD per 1K prompt and completion tokens
+DEFAULT_MODEL_PRICES = {
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+    'gpt-4o-mini': (0.00015, 0.0006),
+    'gpt-4o': (0.0025, 0.01),
+    'gpt-4-turbo': (0.01, 0.03),
+}
+
+FEEDBACK_TYPES = ('comprehensive', 'brief')
+
+# Roughly four characters per token in English text
+CHARS_PER_TOKEN = 4
+
+
+def parse_routes(value: str) -> List[Tuple[str, str]]:
+    """
+    Parse a route list such as 'openai:gpt-4o,openai:gpt-4o-mini'
+
+    Entries without a provider use 'openai'.
+
+    Raises:
+        ValueError: If the list is empty
+    """
+    routes = []
+    for entry in (value or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        provider, sep, model = entry.partition(':')
+        routes.append((provider.strip(), model.strip()) if sep else ('openai', provider.strip()))
+    if not routes:
+        raise ValueError(f"No models in route list: {value!r}")
+    return routes
+
+
+def parse_prices(value: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Parse model prices such as 'gpt-4o=0.0025/0.01,gpt-4o-mini=0.00015/0.0006'
+
+    Returns:
+        (prompt, completion) USD per 1K tokens by model
+    """
+    prices = {}
+    for entry in (value or '').split(','):
+        model, sep, price = entry.strip().partition('=')
+        if not sep:
+            continue
+        prompt_price, _, completion_price = price.partition('/')
+        prices[model.strip()] = (float(prompt_price), float(completion_price or prompt_price))
+    return prices
+
+
+class ModelProvider(ABC):
+    """Creates chat completions for a family of models"""
+
+    name = None
+
+    @abstractmethod
+    def chat_completion(self, model: str, messages: List[Dict[str, str]], **params):
+        """
+        Create a chat completion
+
+        Args:
+            model: Model name
+            messages: Chat messages
+            **params: Sampling parameters and stream=True for an iterator of chunks
+
+        Returns:
+            A response with choices[0].message.content and a usage mapping,
+            or an iterator of chunks with choices[0].delta when streaming
+        """
+
+
+class OpenAIProvider(ModelProvider):
+    """OpenAI API (or a compatible endpoint) through an LLMClient"""
+
+    name = 'openai'
+
+    def __init__(self, llm_client):
+        self.llm_client = llm_client
+
+    def chat_completion(self, model: str, messages: List[Dict[str, str]], **params):
+        return self.llm_client.chat_completion(model=model, messages=messages, **params)
+
+
+class LocalStubProvider(ModelProvider):
+    """
+    Deterministic offline completions
+
+    Packed prompts get the JSON object they ask for. Usage counts are
+    estimated from the text length.
+    """
+
+    name = 'local'
+
+    _PACKED_STUDENT = re.compile(r'^\[(s\d+)\] (.+)$', re.MULTILINE)
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def chat_completion(self, model: str, messages: List[Dict[str, str]], **params):
+        if self.latency:
+            time.sleep(self.latency)
+
+        prompt = messages[-1]['content'] if messages else ''
+        text = self.completion_text(prompt)
+        if params.get('stream'):
+            return self._stream(text)
+
+        prompt_tokens = sum(len(message['content']) for message in messages) // CHARS_PER_TOKEN
+        completion_tokens = len(text) // CHARS_PER_TOKEN
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(role='assistant', content=text), finish_reason='stop')],
+            usage={'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                   'total_tokens': prompt_tokens + completion_tokens}
+        )
+
+    @classmethod
+    def completion_text(cls, prompt: str) -> str:
+        students = cls._PACKED_STUDENT.findall(prompt)
+        if students:
+            return json.dumps({student_id: cls._feedback(name.strip()) for student_id, name in students})
+        return cls._feedback('The student')
+
+    @staticmethod
+    def _feedback(name: str) -> str:
+        return (f"{name} has made steady progress, communicating clearly and working well with others. "
+                f"The next step is to structure arguments more carefully and rehearse presentations.")
+
+    @staticmethod
+    def _stream(text: str) -> Iterator:
+        for word in re.findall(r'\S+\s*', text):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta={'content': word})])
+
+
+class Route:
+    """One provider and model, with its prices and recent call outcomes"""
+
+    def __init__(self,
+                 provider: ModelProvider,
+                 model: str,
+                 prices: Optional[Tuple[float, float]] = None,
+                 window_seconds: float = 60.0):
+        self.provider = provider
+        self.model = model
+        self.prices = prices
+        self.window_seconds = window_seconds
+        # (finished at, failed, seconds) per call
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return f'{self.provider.name}:{self.model}'
+
+    def estimate_cost(self, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        """USD for a call, or None when the price of the model is unknown"""
+        if self.prices is None:
+            return None
+        prompt_price, completion_price = self.prices
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+    def record(self, success: bool, seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._calls.append((now, not success, seconds))
+            self._trim(now)
+
+    def health(self) -> Dict:
+        """Calls, error rate and mean latency of successful calls in the window"""
+        with self._lock:
+            self._trim(time.monotonic())
+            calls = list(self._calls)
+        failures = sum(1 for _, failed, _ in calls if failed)
+        latencies = [seconds for _, failed, seconds in calls if not failed]
+        return {
+            'calls': len(calls),
+            'error_rate': failures / len(calls) if calls else 0.0,
+            'mean_latency': sum(latencies) / len(latencies) if latencies else None
+        }
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+
+class ModelRouter:
+    """Chooses a route per request from the routes configured for its feedback type"""
+
+    def __init__(self,
+                 routes: Dict[str, List[Route]],
+                 budget_per_student: float = 0.0,
+                 max_latency: float = 0.0,
+                 max_error_rate: float = 0.5,
+                 min_calls: int = 5):
+        """
+        Args:
+            routes: Routes in order of preference by feedback type
+                ('comprehensive' and 'brief')
+            budget_per_student: Maximum estimated USD per student, 0 for no limit
+            max_latency: Mean latency in seconds above which a faster route
+                is preferred, 0 to ignore latency
+            max_error_rate: Error rate at which a route is skipped
+            min_calls: Calls in the window before the error rate counts
+        """
+        self.routes = routes
+        self.budget_per_student = budget_per_student
+        self.max_latency = max_latency
+        self.max_error_rate = max_error_rate
+        self.min_calls = min_calls
+
+    @classmethod
+    def single(cls, provider: ModelProvider, model: str) -> 'ModelRouter':
+        """Router sending every request to one model"""
+        route = Route(provider, model, DEFAULT_MODEL_PRICES.get(model))
+        return cls({feedback_type: [route] for feedback_type in FEEDBACK_TYPES})
+
+    @property
+    def default_model(self) -> str:
+        return self.routes['comprehensive'][0].model
+
+    def choose(self,
+               feedback_type: str,
+               prompt_chars: int,
+               max_tokens: int,
+               is_open: Optional[Callable[[str], bool]] = None) -> Route:
+        """
+        Route for a request about one student
+
+        Args:
+            feedback_type: 'comprehensive' or 'brief'
+            prompt_chars: Length of the system and user prompts
+            max_tokens: Completion token limit of the request
+            is_open: Whether a route's circuit breaker, by route name, is
+                refusing calls; such routes are skipped while any other is left
+
+        Returns:
+            The first healthy route within budget that meets the latency
+            target, else the fastest healthy one. If every route is over
+            budget or unhealthy, the cheapest route.
+        """
+        candidates = self.routes.get(feedback_type) or self.routes['comprehensive']
+        if is_open is not None:
+            candidates = [route for route in candidates if not is_open(route.name)] or candidates
+        prompt_tokens = prompt_chars // CHARS_PER_TOKEN
+
+        affordable = []
+        for route in candidates:
+            cost = route.estimate_cost(prompt_tokens, max_tokens)
+            if self.budget_per_student and cost is not None and cost > self.budget_per_student:
+                continue
+            affordable.append(route)
+        if not affordable:
+            return min(candidates, key=lambda route: route.estimate_cost(prompt_tokens, max_tokens) or 0.0)
+
+        healthy = []
+        for route in affordable:
+            health = route.health()
+            if health['calls'] >= self.min_calls and health['error_rate'] >= self.max_error_rate:
+                continue
+            healthy.append((route, health['mean_latency']))
+        if not healthy:
+            return affordable[0]
+
+        if self.max_latency:
+            for route, latency in healthy:
+                if latency is None or latency <= self.max_latency:
+                    return route
+            return min(healthy, key=lambda entry: entry[1])[0]
+        return healthy[0][0]
+
+    def record(self, route: Route, success: bool, seconds: float, response=None) -> None:
+        """Record a call's outcome and, from its usage, its cost"""
+        route.record(success, seconds)
+
+        usage = getattr(response, 'usage', None) if response is not None else None
+        if usage:
+            cost = route.estimate_cost(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+            if cost is not None:
+                metrics.LLM_COST.inc(cost, model=route.model)
+
+    def stats(self) -> Dict:
+        """Routes by feedback type with their prices and health"""
+        return {
+            feedback_type: [
+                {'route': route.name, 'model': route.model, 'prices_per_1k': route.prices, **route.health()}
+                for route in routes
+            ]
+            for feedback_type, routes in self.routes.items()
+        }
+
+
+# Route list setting of each feedback type
+ROUTE_SETTINGS = (('comprehensive', 'FEEDBACK_MODELS_COMPREHENSIVE'),
+                  ('brief', 'FEEDBACK_MODELS_BRIEF'))
+
+
+def configured_providers(config) -> Set[str]:
+    """Providers named by the FEEDBACK_MODELS_* settings"""
+    return {provider_name for _, setting in ROUTE_SETTINGS for provider_name, _ in parse_routes(config[setting])}
+
+
+def build_router(config, llm_client=None) -> ModelRouter:
+    """
+    Router from the FEEDBACK_MODELS_* and FEEDBACK_ROUTER_* settings
+
+    Args:
+        config: Flask config or Config class attributes as a mapping
+        llm_client: Client for the 'openai' provider; required when an
+            OpenAI route is configured
+
+    Raises:
+        ValueError: For an unknown provider
+    """
+    providers = {'local': LocalStubProvider()}
+    if llm_client is not None:
+        providers['openai'] = OpenAIProvider(llm_client)
+
+    prices = dict(DEFAULT_MODEL_PRICES, **parse_prices(config['FEEDBACK_MODEL_PRICES']))
+    window = config['LLM_BREAKER_WINDOW']
+
+    # Feedback types listing the same route share its health statistics
+    shared = {}
+    routes = {}
+    for feedback_type, setting in ROUTE_SETTINGS:
+        routes[feedback_type] = []
+        for provider_name, model in parse_routes(config[setting]):
+            provider = providers.get(provider_name)
+            if provider is None:
+                raise ValueError(f"Unknown model provider in {setting}: {provider_name}")
+            key = (provider_name, model)
+            if key not in shared:
+                model_prices = (0.0, 0.0) if provider_name == 'local' else prices.get(model)
+                shared[key] = Route(provider, model, model_prices, window_seconds=window)
+            routes[feedback_type].append(shared[key])
+
+    return ModelRouter(
+        routes,
+        budget_per_student=config['FEEDBACK_BUDGET_PER_STUDENT'],
+        max_latency=config['FEEDBACK_ROUTER_MAX_LATENCY'],
+        max_error_rate=config['LLM_BREAKER_ERROR_RATE']
+    )
+
+
+def batch_model(config) -> str:
+    """First OpenAI model configured for comprehensive feedback, for the Batch API"""
+    for provider_name, model in parse_routes(config['FEEDBACK_MODELS_COMPREHENSIVE']):
+        if provider_name == 'openai':
+            return model
+    return 'gpt-3.5-turbo'
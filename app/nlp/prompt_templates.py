@@ -1,14 +1,17 @@
 """
 Prompt templates for feedback generation
 """
-from typing import Dict, List
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+from .template_engine import TemplateSet, load_markdown_templates
 
-class PromptTemplates:
-    """Collection of prompt templates for different feedback types"""
-    
-    def get_system_prompt(self) -> str:
-        """System prompt to set the AI's role and behavior"""
-        return """You are an experienced educational assessor and mentor who provides constructive, 
+logger = logging.getLogger(__name__)
+
+# Built-in templates, compiled once at import. Any of them can be replaced by
+# a '### <name>' section in the markdown file named by PROMPT_TEMPLATES_PATH.
+BUILTIN_TEMPLATES = {
+    'system': """You are an experienced educational assessor and mentor who provides constructive, 
         personalized feedback to students. Your feedback should be:
         
         1. Encouraging and positive in tone
@@ -23,33 +26,23 @@ class PromptTemplates:
         - Provide specific, actionable suggestions for improvement
         - End with encouragement and forward-looking statements
         
-        Keep feedback concise but meaningful, typically 2-3 sentences."""
-    
-    def get_comprehensive_prompt(self, 
-                               student_name: str, 
-                               scores: Dict[str, int],
-                               analysis: Dict[str, List[str]]) -> str:
-        """Generate comprehensive feedback prompt"""
-        
-        strengths_text = self._format_skills_list(analysis['strengths'], "strong")
-        good_areas_text = self._format_skills_list(analysis['good_areas'], "good")
-        improvement_text = self._format_skills_list(analysis['improvement_areas'], "needs improvement")
-        
-        prompt = f"""Generate personalized feedback for {student_name} based on these performance scores:
+        Keep feedback concise but meaningful, typically 2-3 sentences.""",
+
+    'comprehensive': """Generate personalized feedback for {student_name} based on these performance scores:
 
 Performance Scores (1-10 scale):
-- Communication: {scores['communication']}/10
-- Teamwork: {scores['teamwork']}/10  
-- Creativity: {scores['creativity']}/10
-- Critical Thinking: {scores['critical_thinking']}/10
-- Presentation: {scores['presentation']}/10
+- Communication: {communication}/10
+- Teamwork: {teamwork}/10  
+- Creativity: {creativity}/10
+- Critical Thinking: {critical_thinking}/10
+- Presentation: {presentation}/10
 
 Performance Analysis:
 {strengths_text}
 {good_areas_text}
 {improvement_text}
 
-Average Score: {analysis['average_score']:.1f}/10
+Average Score: {average_score}/10
 
 Write constructive, encouraging feedback that:
 1. Acknowledges {student_name}'s strongest areas
@@ -57,54 +50,350 @@ Write constructive, encouraging feedback that:
 3. Provides specific, actionable suggestions for improvement
 4. Maintains an encouraging, growth-focused tone
 
-Focus on practical next steps and maintain a balance between recognition and development opportunities."""
+Focus on practical next steps and maintain a balance between recognition and development opportunities.""",
+
+    'brief': """Write brief, encouraging feedback for {student_name}:
+
+Scores: Communication {communication}, Teamwork {teamwork}, 
+Creativity {creativity}, Critical Thinking {critical_thinking}, 
+Presentation {presentation} (all out of 10)
+
+Highlight: {top_strength} as strength, suggest improvement in {main_improvement}.
+Keep it concise, positive, and actionable (2-3 sentences maximum).""",
+
+    'rubric': """Generate feedback for {student_name} based on this rubric:
+
+{criteria_text}
+
+Provide specific feedback that:
+1. References the rubric criteria directly
+2. Explains how the scores reflect performance against each criterion
+3. Offers targeted improvement strategies
+4. Maintains an encouraging tone
+
+Structure the feedback to address each criterion meaningfully while keeping it cohesive.""",
+
+    'rubric_scores': """Generate feedback for {student_name} assessed against {rubric_name}:
+
+{criteria_text}
+
+Performance Analysis:
+- Strengths (8+ out of 10): {strengths}
+- Good Progress (6-7 out of 10): {good_areas}
+- Needs Improvement (<6 out of 10): {improvement_areas}
+
+Provide specific feedback that:
+1. References the rubric criteria directly
+2. Explains how the scores reflect performance against each criterion
+3. Offers targeted improvement strategies
+4. Maintains an encouraging tone
+
+Structure the feedback to address each criterion meaningfully while keeping it cohesive.""",
+
+    'rubric_scores_brief': """Write brief, encouraging feedback for {student_name} assessed against {rubric_name}:
+
+{criteria_text}
+
+Highlight: {top_strength} as strength, suggest improvement in {main_improvement}.
+Keep it concise, positive, and actionable (2-3 sentences maximum).""",
+
+    'cohort_standing': """Cohort Standing (compared with all evaluated students):
+{standing_text}
+
+Where it helps, mention how {student_name} compares with peers.""",
+
+    'distinct_wording': """{prompt}
+
+Feedback written for another student with a similar profile used almost exactly the wording you would write. Make this feedback clearly individual: vary the structure and opening, and refer to {student_name}'s specific scores.""",
+
+    'packed_student': """[{student_id}] {student_name}
+Scores: Communication {communication}, Teamwork {teamwork}, Creativity {creativity}, Critical Thinking {critical_thinking}, Presentation {presentation} (all out of 10)
+Strengths: {strengths}; Progressing well: {good_areas}; Needs improvement: {improvement_areas}""",
+
+    'packed': """Generate personalized feedback for each of the following {student_count} students.
+
+{students_text}
+
+{instructions} Address each student by name and write each student's feedback independently.
+
+Respond with only a JSON object that maps every student ID to that student's feedback text, for example: {{{example_ids}}}""",
+
+    'packed_instructions': ("For each student, write constructive, encouraging feedback that acknowledges "
+                            "their strongest areas, recognizes areas showing good progress and gives "
+                            "specific, actionable suggestions for improvement."),
+
+    'packed_instructions_brief': ("For each student, write brief, encouraging feedback (2-3 sentences maximum) "
+                                  "that highlights their top strength and suggests one improvement."),
+}
+
+IMPROVEMENT_SUGGESTIONS = {
+    'communication': {
+        'low': "Practice active listening, ask clarifying questions, and work on expressing ideas clearly and concisely.",
+        'medium': "Focus on adapting communication style to different audiences and improving non-verbal communication.",
+        'high': "Develop advanced presentation skills and mentor others in effective communication techniques."
+    },
+    'teamwork': {
+        'low': "Practice collaborative problem-solving, learn to compromise, and actively contribute to group discussions.",
+        'medium': "Take on different team roles, improve conflict resolution skills, and support team members more actively.",
+        'high': "Lead team initiatives, facilitate group discussions, and help develop other team members' collaborative skills."
+    },
+    'creativity': {
+        'low': "Explore different brainstorming techniques, challenge assumptions, and seek inspiration from diverse sources.",
+        'medium': "Experiment with combining ideas from different fields and practice thinking outside conventional frameworks.",
+        'high': "Lead creative initiatives, mentor others in innovative thinking, and develop original methodologies."
+    },
+    'critical_thinking': {
+        'low': "Practice analyzing information systematically, question assumptions, and evaluate evidence objectively.",
+        'medium': "Develop skills in logical reasoning, learn to identify biases, and practice structured problem-solving.",
+        'high': "Apply critical thinking to complex scenarios, teach analytical skills to others, and develop evaluation frameworks."
+    },
+    'presentation': {
+        'low': "Practice organizing content clearly, work on public speaking confidence, and use visual aids effectively.",
+        'medium': "Develop storytelling skills, improve audience engagement techniques, and refine delivery style.",
+        'high': "Master advanced presentation techniques, adapt to diverse audiences, and mentor others in presentation skills."
+    }
+}
+
+# Percentile rank bands used to describe cohort standing, highest first
+STANDING_BANDS = (
+    (90, "top 10% of the cohort"),
+    (75, "top 25% of the cohort"),
+    (50, "above the cohort median"),
+    (25, "below the cohort median"),
+    (10, "bottom 25% of the cohort"),
+    (0, "bottom 10% of the cohort"),
+)
+
+_BUILTIN_SET = TemplateSet(BUILTIN_TEMPLATES)
+
+
+@lru_cache(maxsize=None)
+def load_template_set(path: Optional[str] = None) -> TemplateSet:
+    """
+    Compiled template set, built once per process and path
+
+    Args:
+        path: Optional markdown file whose '### <name>' sections replace
+            built-in templates of the same name
+
+    Raises:
+        ValueError: If the file defines an unknown template or slot, or is
+            a collection of example prompts rather than template overrides
+    """
+    if not path:
+        return _BUILTIN_SET
+
+    sources = load_markdown_templates(path)
+    if not any(name in _BUILTIN_SET for name in sources):
+        # Files such as final_prompt_structures.md number their prompts
+        # ('### Prompt 1') and have no slots to fill, so none can replace a template
+        found = ', '.join(f"'{name}'" for name in list(sources)[:3]) or 'no headings'
+        raise ValueError(f"{path} does not override any prompt template (found {found}); "
+                         f"use '### <name>' headings with one of: {', '.join(sorted(_BUILTIN_SET.names()))}")
+
+    template_set = _BUILTIN_SET.override(sources)
+    logger.info(f"Loaded prompt templates from {path} (version {template_set.version})")
+    return template_set
+
+
+class PromptTemplates:
+    """Collection of prompt templates for different feedback types"""
+    
+    def __init__(self, rubric_source=None, templates: Optional[TemplateSet] = None):
+        """
+        Args:
+            rubric_source: Object with a get_criteria(rubric) method, such as
+                app.rubrics.RubricRegistry, used to resolve rubrics by name or id
+            templates: Compiled templates, defaults to the built-in set
+        """
+        self.rubric_source = rubric_source
+        self.templates = templates or _BUILTIN_SET
+        self._system_prompt = self.templates.render('system')
+        
+        # Bound once so the hot path skips the template lookup
+        self._render_comprehensive = self.templates['comprehensive'].render
+        self._render_brief = self.templates['brief'].render
+        self._render_cohort_standing = self.templates['cohort_standing'].render
+    
+    @property
+    def template_version(self) -> str:
+        """Version of the template set, recorded with cache keys and stored feedback"""
+        return self.templates.version
+    
+    def get_system_prompt(self) -> str:
+        """System prompt to set the AI's role and behavior"""
+        return self._system_prompt
+    
+    def get_comprehensive_prompt(self,
+                               student_name: str,
+                               scores: Dict[str, int],
+                               analysis: Dict[str, List[str]]) -> str:
+        """Generate comprehensive feedback prompt"""
         
-        return prompt
+        prompt = self._render_comprehensive(
+            student_name=student_name,
+            communication=scores['communication'],
+            teamwork=scores['teamwork'],
+            creativity=scores['creativity'],
+            critical_thinking=scores['critical_thinking'],
+            presentation=scores['presentation'],
+            strengths_text=self._format_skills_list(analysis['strengths'], "strong"),
+            good_areas_text=self._format_skills_list(analysis['good_areas'], "good"),
+            improvement_text=self._format_skills_list(analysis['improvement_areas'], "needs improvement"),
+            average_score=f"{analysis['average_score']:.1f}"
+        )
+        return self._with_cohort_standing(prompt, student_name, analysis)
     
-    def get_brief_prompt(self, 
-                        student_name: str, 
+    def get_brief_prompt(self,
+                        student_name: str,
                         scores: Dict[str, int],
                         analysis: Dict[str, List[str]]) -> str:
         """Generate brief feedback prompt"""
         
-        top_strength = analysis['strengths'][0] if analysis['strengths'] else "overall performance"
-        main_improvement = analysis['improvement_areas'][0] if analysis['improvement_areas'] else "consistency"
+        prompt = self._render_brief(
+            student_name=student_name,
+            communication=scores['communication'],
+            teamwork=scores['teamwork'],
+            creativity=scores['creativity'],
+            critical_thinking=scores['critical_thinking'],
+            presentation=scores['presentation'],
+            top_strength=analysis['strengths'][0] if analysis['strengths'] else "overall performance",
+            main_improvement=analysis['improvement_areas'][0] if analysis['improvement_areas'] else "consistency"
+        )
+        return self._with_cohort_standing(prompt, student_name, analysis)
+    
+    def _with_cohort_standing(self, prompt: str, student_name: str, analysis: Dict) -> str:
+        """
+        Append the cohort standing section when the analysis has percentiles
         
-        prompt = f"""Write brief, encouraging feedback for {student_name}:
-
-Scores: Communication {scores['communication']}, Teamwork {scores['teamwork']}, 
-Creativity {scores['creativity']}, Critical Thinking {scores['critical_thinking']}, 
-Presentation {scores['presentation']} (all out of 10)
-
-Highlight: {top_strength} as strength, suggest improvement in {main_improvement}.
-Keep it concise, positive, and actionable (2-3 sentences maximum)."""
+        Only the band of each percentile is rendered, so the prompt, and its
+        cache key, stays the same while the cohort grows.
+        """
+        cohort = analysis.get('cohort')
+        if not cohort:
+            return prompt
         
-        return prompt
+        standing_text = "\n".join(
+            f"- {skill.replace('_', ' ').title()}: {self.standing_band(percentile)}"
+            for skill, percentile in cohort['percentiles'].items()
+        )
+        return prompt + "\n\n" + self._render_cohort_standing(
+            student_name=student_name,
+            standing_text=standing_text
+        )
     
-    def get_rubric_based_prompt(self, 
+    def get_distinct_wording_prompt(self, prompt: str, student_name: str) -> str:
+        """Ask again for feedback that came back nearly identical to another student's"""
+        return self.templates['distinct_wording'].render(prompt=prompt, student_name=student_name)
+    
+    @staticmethod
+    def standing_band(percentile: float) -> str:
+        """Describe a percentile rank, e.g. 'top 10% of the cohort'"""
+        for threshold, label in STANDING_BANDS:
+            if percentile >= threshold:
+                return label
+        return STANDING_BANDS[-1][1]
+    
+    def get_rubric_based_prompt(self,
                               student_name: str,
-                              rubric_criteria: Dict[str, str],
+                              rubric_criteria: Union[Dict[str, str], int, str],
                               scores: Dict[str, int]) -> str:
-        """Generate feedback based on specific rubric criteria"""
+        """
+        Generate feedback based on specific rubric criteria
+        
+        Args:
+            student_name: Name of the student
+            rubric_criteria: Criterion descriptions keyed by criterion name, or
+                the id or name of a rubric known to the rubric source
+            scores: Scores keyed by lower-case, underscored criterion name
+        """
+        if not isinstance(rubric_criteria, dict):
+            if self.rubric_source is None:
+                raise ValueError("A rubric source is required to look up rubrics by name")
+            rubric_criteria = self.rubric_source.get_criteria(rubric_criteria)
         
         criteria_text = "\n".join([
             f"- {criterion}: {description} (Score: {scores.get(criterion.lower().replace(' ', '_'), 'N/A')}/10)"
             for criterion, description in rubric_criteria.items()
         ])
         
-        prompt = f"""Generate feedback for {student_name} based on this rubric:
-
-{criteria_text}
-
-Provide specific feedback that:
-1. References the rubric criteria directly
-2. Explains how the scores reflect performance against each criterion
-3. Offers targeted improvement strategies
-4. Maintains an encouraging tone
-
-Structure the feedback to address each criterion meaningfully while keeping it cohesive."""
+        return self.templates['rubric'].render(student_name=student_name, criteria_text=criteria_text)
+    
+    def get_rubric_scores_prompt(self,
+                                 student_name: str,
+                                 rubric_name: str,
+                                 criteria_text: str,
+                                 analysis: Dict[str, List[str]],
+                                 feedback_type: str = "comprehensive") -> str:
+        """
+        Generate a feedback prompt for scores on any rubric
         
-        return prompt
+        Args:
+            student_name: Name of the student
+            rubric_name: Name of the rubric
+            criteria_text: Criterion lines from CompiledRubric.render_criteria
+            analysis: Output of CompiledRubric.analyze
+            feedback_type: 'comprehensive' or 'brief'
+        """
+        
+        if feedback_type == "brief":
+            return self.templates['rubric_scores_brief'].render(
+                student_name=student_name,
+                rubric_name=rubric_name,
+                criteria_text=criteria_text,
+                top_strength=analysis['strengths'][0] if analysis['strengths'] else "overall performance",
+                main_improvement=analysis['improvement_areas'][0] if analysis['improvement_areas'] else "consistency"
+            )
+        
+        return self.templates['rubric_scores'].render(
+            student_name=student_name,
+            rubric_name=rubric_name,
+            criteria_text=criteria_text,
+            strengths=', '.join(analysis['strengths']) or 'None identified',
+            good_areas=', '.join(analysis['good_areas']) or 'None identified',
+            improvement_areas=', '.join(analysis['improvement_areas']) or 'None identified'
+        )
+    
+    def get_packed_prompt(self,
+                          students: List[Tuple[str, str, Dict[str, int], Dict[str, List[str]]]],
+                          feedback_type: str = "comprehensive") -> str:
+        """
+        Generate one prompt asking for feedback on several students at once
+        
+        Args:
+            students: (student_id, student_name, scores, analysis) tuples; the
+                ids key the JSON object the model is asked to return
+            feedback_type: 'comprehensive' or 'brief'
+        """
+        
+        section = self.templates['packed_student']
+        sections = [
+            section.render(
+                student_id=student_id,
+                student_name=student_name,
+                communication=scores['communication'],
+                teamwork=scores['teamwork'],
+                creativity=scores['creativity'],
+                critical_thinking=scores['critical_thinking'],
+                presentation=scores['presentation'],
+                strengths=', '.join(analysis['strengths']) or 'none',
+                good_areas=', '.join(analysis['good_areas']) or 'none',
+                improvement_areas=', '.join(analysis['improvement_areas']) or 'none'
+            )
+            for student_id, student_name, scores, analysis in students
+        ]
+        
+        if feedback_type == "brief":
+            instructions = self.templates.render('packed_instructions_brief')
+        else:
+            instructions = self.templates.render('packed_instructions')
+        
+        return self.templates['packed'].render(
+            student_count=len(students),
+            students_text="\n\n".join(sections),
+            instructions=instructions,
+            example_ids=', '.join(f'"{student_id}": "..."' for student_id, _, _, _ in students[:2])
+        )
     
     def _format_skills_list(self, skills: List[str], performance_level: str) -> str:
         """Format skills list for prompt inclusion"""
@@ -121,34 +410,6 @@ Structure the feedback to address each criterion meaningfully while keeping it c
     def get_improvement_suggestions(self, skill: str, score: int) -> str:
         """Get specific improvement suggestions for each skill"""
         
-        suggestions = {
-            'communication': {
-                'low': "Practice active listening, ask clarifying questions, and work on expressing ideas clearly and concisely.",
-                'medium': "Focus on adapting communication style to different audiences and improving non-verbal communication.",
-                'high': "Develop advanced presentation skills and mentor others in effective communication techniques."
-            },
-            'teamwork': {
-                'low': "Practice collaborative problem-solving, learn to compromise, and actively contribute to group discussions.",
-                'medium': "Take on different team roles, improve conflict resolution skills, and support team members more actively.",
-                'high': "Lead team initiatives, facilitate group discussions, and help develop other team members' collaborative skills."
-            },
-            'creativity': {
-                'low': "Explore different brainstorming techniques, challenge assumptions, and seek inspiration from diverse sources.",
-                'medium': "Experiment with combining ideas from different fields and practice thinking outside conventional frameworks.",
-                'high': "Lead creative initiatives, mentor others in innovative thinking, and develop original methodologies."
-            },
-            'critical_thinking': {
-                'low': "Practice analyzing information systematically, question assumptions, and evaluate evidence objectively.",
-                'medium': "Develop skills in logical reasoning, learn to identify biases, and practice structured problem-solving.",
-                'high': "Apply critical thinking to complex scenarios, teach analytical skills to others, and develop evaluation frameworks."
-            },
-            'presentation': {
-                'low': "Practice organizing content clearly, work on public speaking confidence, and use visual aids effectively.",
-                'medium': "Develop storytelling skills, improve audience engagement techniques, and refine delivery style.",
-                'high': "Master advanced presentation techniques, adapt to diverse audiences, and mentor others in presentation skills."
-            }
-        }
-        
         if score <= 5:
             level = 'low'
         elif score <= 7:
@@ -156,4 +417,4 @@ Structure the feedback to address each criterion meaningfully while keeping it c
         else:
             level = 'high'
         
-        return suggestions.get(skill, {}).get(level, "Continue developing this skill through practice and feedback.")
\ No newline at end of file
+        return IMPROVEMENT_SUGGESTIONS.get(skill, {}).get(level, "Continue developing this skill through practice and feedback.")
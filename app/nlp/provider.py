@@ -0,0 +1,104 @@
+"""
+Application-scoped access to a shared FeedbackGenerator
+
+The generator is built on first use instead of at import time. Worker
+processes therefore boot without importing the OpenAI client or checking
+the API key, which is only required when an openai route is configured.
+Every blueprint and background job in a process shares one generator,
+its cache and the pooled connections of its LLM client.
+"""
+import threading
+from flask import current_app
+
+
+class FeedbackGeneratorProvider:
+    """Lazily builds and holds one FeedbackGenerator per application"""
+
+    def __init__(self, app=None):
+        self._generator = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the provider with a Flask application"""
+        self.config = app.config
+        self.extensions = app.extensions
+        self.circuit_breakers = self._build_circuit_breakers() if app.config['LLM_BREAKER'] else None
+        app.extensions['feedback_generator'] = self
+
+    def get(self):
+        """Return the shared generator, building it on first use"""
+        if self._generator is None:
+            with self._lock:
+                if self._generator is None:
+                    self._generator = self._build()
+        return self._generator
+
+    def _build_circuit_breakers(self):
+        from .circuit_breaker import RouteBreakers
+        
+        config = self.config
+        return RouteBreakers(
+            window_seconds=config['LLM_BREAKER_WINDOW'],
+            min_calls=config['LLM_BREAKER_MIN_CALLS'],
+            error_rate_threshold=config['LLM_BREAKER_ERROR_RATE'],
+            slow_call_seconds=config['LLM_BREAKER_SLOW_SECONDS'],
+            slow_rate_threshold=config['LLM_BREAKER_SLOW_RATE'],
+            open_seconds=config['LLM_BREAKER_OPEN_SECONDS'],
+            half_open_probes=config['LLM_BREAKER_PROBES']
+        )
+
+    def _build(self):
+        from .cache import create_cache
+        from .feedback_generator import FeedbackGenerator
+        from .llm_client import LLMClient
+        from .model_providers import build_router, configured_providers
+        from .prompt_templates import PromptTemplates, load_template_set
+
+        config = self.config
+        api_key = config['OPENAI_API_KEY']
+
+        # Routers using only the local provider run without an OpenAI client or key
+        llm_client = None
+        if 'openai' in configured_providers(config):
+            if not api_key:
+                raise ValueError("OpenAI API key is required")
+            llm_client = LLMClient(
+                api_key,
+                api_base=config['OPENAI_API_BASE'],
+                pool_size=config['OPENAI_HTTP_POOL_SIZE'],
+                connect_timeout=config['OPENAI_CONNECT_TIMEOUT'],
+                read_timeout=config['OPENAI_REQUEST_TIMEOUT'],
+                max_retries=config['OPENAI_MAX_RETRIES'],
+                requests_per_minute=config['OPENAI_REQUESTS_PER_MINUTE']
+            )
+
+        # Per-application settings, not the Config class defaults
+        cache = create_cache(
+            config['FEEDBACK_CACHE_BACKEND'],
+            path=config['FEEDBACK_CACHE_PATH'],
+            ttl=config['FEEDBACK_CACHE_TTL'],
+            max_entries=config['FEEDBACK_CACHE_MAX_ENTRIES']
+        )
+
+        return FeedbackGenerator(
+            api_key=api_key,
+            cache=False if cache is None else cache,
+            llm_client=llm_client,
+            prompt_templates=PromptTemplates(
+                # Rubric prompts resolve criteria from the in-memory rubric registry
+                rubric_source=self.extensions.get('rubric_registry'),
+                templates=load_template_set(config['PROMPT_TEMPLATES_PATH'])
+            ),
+            cohort_stats=self.extensions.get('score_histograms') if config['FEEDBACK_COHORT_CONTEXT'] else None,
+            similarity_index=self.extensions.get('similarity_index') if config['FEEDBACK_DEDUP'] else None,
+            profile_index=self.extensions.get('profile_reuse_index') if config['FEEDBACK_PROFILE_REUSE'] else None,
+            circuit_breakers=self.circuit_breakers,
+            model_router=build_router(config, llm_client)
+        )
+
+
+def get_feedback_generator():
+    """Shared FeedbackGenerator of the current application"""
+    return current_app.extensions['feedback_generator'].get()
@@ -0,0 +1,141 @@
+"""
+Rubric-driven scoring
+
+A CompiledRubric turns a rubric definition into a fixed criterion order.
+Scores become a compact tuple in that order, checked by a validator and
+rendered into prompts from templates prepared once per rubric. Any rubric,
+with any number of criteria, goes through the same code path.
+"""
+from typing import Dict, List, Sequence, Tuple, Union
+
+DEFAULT_MAX_SCORE = 10
+
+ScoreInput = Union[Dict[str, int], Sequence[int]]
+
+
+class CompiledRubric:
+    """Rubric criteria prepared for score validation and prompt rendering"""
+
+    __slots__ = ('id', 'name', 'criterion_ids', 'names', 'max_scores', '_index', '_lines')
+
+    def __init__(self, rubric_id: int, name: str, criteria: List[Dict]):
+        """
+        Args:
+            rubric_id: Rubric id
+            name: Rubric name
+            criteria: Criterion dictionaries with 'id', 'name', 'description'
+                and 'max_score', in rubric order
+        """
+        if not criteria:
+            raise ValueError(f"Rubric {name} has no criteria")
+
+        self.id = rubric_id
+        self.name = name
+        self.criterion_ids = tuple(criterion['id'] for criterion in criteria)
+        self.names = tuple(criterion['name'] for criterion in criteria)
+        self.max_scores = tuple(criterion.get('max_score') or DEFAULT_MAX_SCORE for criterion in criteria)
+
+        # Scores may be keyed by criterion name, snake_case key or id
+        self._index = {}
+        for index, criterion in enumerate(criteria):
+            self._index[criterion['name']] = index
+            self._index[self.key(criterion['name'])] = index
+            self._index[str(criterion['id'])] = index
+
+        self._lines = tuple(
+            self._escape(f"- {criterion['name']}: {criterion.get('description') or criterion['name']} ")
+            + f"(Score: {{}}/{max_score})"
+            for criterion, max_score in zip(criteria, self.max_scores)
+        )
+
+    @classmethod
+    def from_entry(cls, entry: Dict) -> 'CompiledRubric':
+        """Compile a rubric entry from app.rubrics.RubricRegistry"""
+        return cls(entry['id'], entry['name'], entry['criteria'])
+
+    @staticmethod
+    def key(criterion_name: str) -> str:
+        """snake_case key of a criterion name, as used in score dictionaries"""
+        return criterion_name.lower().replace(' ', '_')
+
+    @staticmethod
+    def _escape(text: str) -> str:
+        return text.replace('{', '{{').replace('}', '}}')
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def vector(self, scores: ScoreInput) -> Tuple[int, ...]:
+        """
+        Validate scores and return them in criterion order
+
+        Args:
+            scores: Scores keyed by criterion name, key or id, or a list in
+                criterion order
+
+        Raises:
+            ValueError: If a criterion is missing or unknown, or a score is
+                not an integer within its range
+        """
+        if isinstance(scores, dict):
+            values = [None] * len(self.names)
+            for criterion, score in scores.items():
+                index = self._index.get(str(criterion))
+                if index is None:
+                    raise ValueError(f"Unknown criterion for {self.name}: {criterion}")
+                values[index] = score
+            missing = [name for name, value in zip(self.names, values) if value is None]
+            if missing:
+                raise ValueError(f"Missing score for {', '.join(missing)}")
+
+        elif isinstance(scores, (list, tuple)):
+            if len(scores) != len(self.names):
+                raise ValueError(f"{self.name} expects {len(self.names)} scores, got {len(scores)}")
+            values = scores
+
+        else:
+            raise ValueError("Scores must be an object or a list")
+
+        for name, score, max_score in zip(self.names, values, self.max_scores):
+            if not isinstance(score, int) or isinstance(score, bool) or score < 1 or score > max_score:
+                raise ValueError(f"Invalid score for {name}: {score}. Must be integer 1-{max_score}")
+
+        return tuple(values)
+
+    def scores_dict(self, vector: Tuple[int, ...]) -> Dict[str, int]:
+        """Scores keyed by criterion name"""
+        return dict(zip(self.names, vector))
+
+    def analyze(self, vector: Tuple[int, ...]) -> Dict:
+        """
+        Group criteria by performance, relative to each criterion's maximum
+
+        Returns:
+            Dictionary with 'strengths', 'good_areas', 'improvement_areas' and
+            'average_score' (scaled to 10)
+        """
+        strengths = []
+        good_areas = []
+        improvement_areas = []
+        total = 0.0
+
+        for name, score, max_score in zip(self.names, vector, self.max_scores):
+            ratio = score / max_score
+            total += ratio
+            if ratio >= 0.8:
+                strengths.append(name)
+            elif ratio >= 0.6:
+                good_areas.append(name)
+            else:
+                improvement_areas.append(name)
+
+        return {
+            'strengths': strengths,
+            'good_areas': good_areas,
+            'improvement_areas': improvement_areas,
+            'average_score': 10 * total / len(self.names)
+        }
+
+    def render_criteria(self, vector: Tuple[int, ...]) -> str:
+        """Criterion lines with descriptions and scores for a prompt"""
+        return "\n".join(line.format(score) for line, score in zip(self._lines, vector))
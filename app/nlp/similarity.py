@@ -0,0 +1,162 @@
+"""
+MinHash signatures and an LSH index for near-duplicate feedback
+
+Feedback is reduced to word 3-gram shingles, with the student's name replaced
+so that two students' paragraphs compare on wording alone. A 64-value MinHash
+signature estimates the Jaccard similarity of two shingle sets. The LSH index
+splits signatures into 16 bands of 4 values. Only entries sharing a band
+with the query are compared, so lookups touch a handful of candidates
+however many signatures are indexed.
+"""
+import random
+import re
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Hashable, List, Optional, Tuple
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# Signatures are stored as NUM_PERM unsigned 32-bit values
+SIGNATURE_BYTES = NUM_PERM * 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed: signatures are persisted and must stay comparable across processes
+_rng = random.Random(1729)
+_PERMUTATIONS = tuple(
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+)
+
+_WORD = re.compile(r"[a-z0-9']+")
+NAME_TOKEN = '<student>'
+
+
+def shingles(text: str, student_name: Optional[str] = None) -> List[int]:
+    """
+    Hashed word 3-grams of a text
+
+    Words of the student's name are replaced with a placeholder first.
+    """
+    words = _WORD.findall(text.lower())
+    if student_name:
+        name_words = set(_WORD.findall(student_name.lower()))
+        words = [NAME_TOKEN if word in name_words else word for word in words]
+
+    if len(words) < SHINGLE_SIZE:
+        return [zlib.crc32(' '.join(words).encode('utf-8'))] if words else []
+
+    return list({
+        zlib.crc32(' '.join(words[i:i + SHINGLE_SIZE]).encode('utf-8'))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    })
+
+
+@lru_cache(maxsize=1024)
+def feedback_signature(text: str, student_name: Optional[str] = None) -> bytes:
+    """
+    MinHash signature of a feedback text
+
+    Cached, because the same text is usually checked before it is stored.
+
+    Returns:
+        SIGNATURE_BYTES bytes; all 0xff for a text without words
+    """
+    hashes = shingles(text, student_name)
+    if not hashes:
+        return array('I', [_MAX_HASH] * NUM_PERM).tobytes()
+
+    return array('I', [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]).tobytes()
+
+
+def signature_similarity(first: bytes, second: bytes) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures"""
+    a = array('I', first)
+    b = array('I', second)
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+class MinHashLSH:
+    """
+    Bounded LSH index of MinHash signatures
+
+    Entries are grouped by cohort: a query only matches entries added with
+    the same cohort. When the index is full, the oldest entries are evicted.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._buckets: Dict[int, List[Hashable]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _band_keys(cohort: Optional[str], signature: bytes) -> List[int]:
+        step = ROWS_PER_BAND * 4
+        return [hash((cohort, band, signature[band * step:(band + 1) * step])) for band in range(BANDS)]
+
+    def add(self, key: Hashable, signature: bytes, cohort: Optional[str] = None, owner: Optional[str] = None) -> None:
+        """
+        Index a signature
+
+        Args:
+            key: Unique key of the entry, such as a feedback id
+            signature: Output of feedback_signature
+            cohort: Group the entry belongs to
+            owner: Student the text was written for; queries can skip them
+        """
+        band_keys = self._band_keys(cohort, signature)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (signature, band_keys, owner)
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, []).append(key)
+
+            while len(self._entries) > self.max_entries:
+                old_key, (_, old_band_keys, _) = self._entries.popitem(last=False)
+                for band_key in old_band_keys:
+                    bucket = self._buckets.get(band_key)
+                    if bucket is not None:
+                        bucket.remove(old_key)
+                        if not bucket:
+                            del self._buckets[band_key]
+
+    def query(self,
+              signature: bytes,
+              threshold: float,
+              cohort: Optional[str] = None,
+              exclude_owner: Optional[str] = None) -> Optional[Tuple[Hashable, float]]:
+        """
+        Most similar indexed entry at or above a similarity threshold
+
+        Returns:
+            (key, estimated similarity), or None if no entry is that similar
+        """
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(cohort, signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            entries = [(key, self._entries[key]) for key in candidates]
+
+        best = None
+        for key, (candidate, _, owner) in entries:
+            if exclude_owner is not None and owner == exclude_owner:
+                continue
+            similarity = signature_similarity(signature, candidate)
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (key, similarity)
+        return best
@@ -0,0 +1,165 @@
+"""
+Compiled prompt templates
+
+Templates use str.format style slots ('{student_name}', with '{{' and '}}'
+for literal braces). Each one is parsed once into a normalised format string,
+so rendering is a single str.format_map call that copies the static text and
+fills the slots. Templates without slots are returned as is.
+
+Every template carries a content hash as its version. A TemplateSet combines
+these into one version, which is recorded with cache keys and stored feedback.
+"""
+import hashlib
+import keyword
+import re
+from typing import Dict, Iterable
+
+_TOKEN = re.compile(r'\{\{|\}\}|\{(\w+)\}')
+_MARKDOWN_HEADING = re.compile(r'^#{2,3}\s+(.+?)\s*$')
+
+
+class CompiledTemplate:
+    """
+    Prompt template parsed once for rendering
+
+    render(**values) fills the slots. Values for slots the template does not
+    use are ignored, and a missing slot raises TypeError.
+    """
+
+    __slots__ = ('name', 'source', 'version', 'slots', '_format', '_static')
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        self.version = hashlib.sha256(source.encode('utf-8')).hexdigest()[:8]
+
+        literals = []
+        slots = []
+        current = []
+        position = 0
+        for match in _TOKEN.finditer(source):
+            current.append(source[position:match.start()])
+            token = match.group(0)
+            if token == '{{':
+                current.append('{')
+            elif token == '}}':
+                current.append('}')
+            else:
+                slot = match.group(1)
+                if not slot.isidentifier() or keyword.iskeyword(slot):
+                    raise ValueError(f"Invalid slot name in template {name}: {slot}")
+                literals.append(''.join(current))
+                slots.append(slot)
+                current = []
+            position = match.end()
+        current.append(source[position:])
+        literals.append(''.join(current))
+
+        self.slots = frozenset(slots)
+        if slots:
+            # Escape literal braces again so only the slots are replacement fields
+            pieces = []
+            for index, literal in enumerate(literals):
+                pieces.append(literal.replace('{', '{{').replace('}', '}}'))
+                if index < len(slots):
+                    pieces.append('{' + slots[index] + '}')
+            self._format = ''.join(pieces)
+            self._static = None
+        else:
+            self._format = None
+            self._static = literals[0]
+
+    def render(self, **values) -> str:
+        """
+        Fill the template slots
+
+        Raises:
+            TypeError: If a slot used by the template has no value
+        """
+        if self._format is None:
+            return self._static
+        try:
+            return self._format.format_map(values)
+        except KeyError as e:
+            raise TypeError(f"Template {self.name} is missing slot: {e.args[0]}") from None
+
+
+class TemplateSet:
+    """Named compiled templates sharing one combined version"""
+
+    def __init__(self, sources: Dict[str, str]):
+        self._templates = {name: CompiledTemplate(name, source) for name, source in sources.items()}
+        digest = hashlib.sha256()
+        for name in sorted(self._templates):
+            digest.update(f"{name}:{self._templates[name].version};".encode('utf-8'))
+        self.version = digest.hexdigest()[:12]
+
+    def __getitem__(self, name: str) -> CompiledTemplate:
+        return self._templates[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def names(self) -> Iterable[str]:
+        return self._templates.keys()
+
+    def render(self, name: str, **values) -> str:
+        return self._templates[name].render(**values)
+
+    def override(self, sources: Dict[str, str]) -> 'TemplateSet':
+        """
+        New set with some templates replaced
+
+        Raises:
+            ValueError: If an override names a template that does not exist
+                or uses a slot the template is not rendered with
+        """
+        merged = {name: template.source for name, template in self._templates.items()}
+        for name, source in sources.items():
+            if name not in merged:
+                raise ValueError(f"Unknown prompt template: {name} "
+                                 f"(headings must name one of: {', '.join(sorted(merged))})")
+            missing = CompiledTemplate(name, source).slots - self._templates[name].slots
+            if missing:
+                raise ValueError(f"Template {name} uses unknown slots: {', '.join(sorted(missing))}")
+            merged[name] = source
+        return TemplateSet(merged)
+
+
+def parse_markdown_templates(text: str) -> Dict[str, str]:
+    """
+    Read templates from markdown
+
+    Each '## name' or '### name' heading starts a template. Its body runs
+    until the next heading, with surrounding blank lines removed.
+
+    Returns:
+        Template sources keyed by heading
+    """
+    sources = {}
+    name = None
+    lines = []
+
+    def flush():
+        if name is not None:
+            body = '\n'.join(lines).strip('\n')
+            if body.strip():
+                sources[name] = body
+
+    for line in text.splitlines():
+        heading = _MARKDOWN_HEADING.match(line)
+        if heading:
+            flush()
+            name, lines = heading.group(1), []
+        elif name is not None:
+            lines.append(line)
+    flush()
+
+    return sources
+
+
+def load_markdown_templates(path: str) -> Dict[str, str]:
+    """Read templates from a markdown file, see parse_markdown_templates"""
+    with open(path, encoding='utf-8') as f:
+        return parse_markdown_templates(f.read())
+
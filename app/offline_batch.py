@@ -0,0 +1,353 @@
+"""
+Offline bulk feedback generation through the OpenAI Batch API
+
+The pipeline has three steps, each streaming its input so no file is
+ever held in memory:
+
+1. prepare: read a student performance CSV and write a Batch API JSONL
+   file of chat completion requests. Every student is also recorded as a
+   BatchJobItem, so the results can be matched back to their scores.
+2. submit: upload the file and create a batch, either on OpenAI or on
+   LocalBatchBackend, a stand-in that runs without network access.
+3. load: read the results file and bulk insert the feedback into the
+   Feedback table in chunks.
+"""
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import update
+
+from app import db
+from app.models import BatchJob, BatchJobItem
+from app.nlp.feedback_generator import FeedbackGenerator
+from app.nlp.model_providers import batch_model
+from app.nlp.prompt_templates import PromptTemplates, load_template_set
+from app.ingest import iter_performance_rows
+from app.utils.bulk_insert import bulk_insert_feedback, chunked, rubric_feedback_row
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+
+
+def _custom_id(job_id: str, position: int) -> str:
+    return f"{job_id}-{position}"
+
+
+def _parse_custom_id(custom_id: str) -> Tuple[str, int]:
+    job_id, position = custom_id.rsplit('-', 1)
+    return job_id, int(position)
+
+
+def prepare_batch_file(csv_path: str,
+                       output_path: str,
+                       rubrics: Dict[str, List[Tuple[str, str]]],
+                       chunk_size: int = 1000) -> BatchJob:
+    """
+    Write a Batch API request file for every student in a performance CSV
+
+    Args:
+        csv_path: Student performance CSV
+        output_path: JSONL file to write
+        rubrics: Rubric criteria from app.ingest.load_rubric_criteria
+        chunk_size: Rows written to the database per insert
+
+    Returns:
+        The BatchJob recording the students, with status 'prepared'
+    """
+    templates = PromptTemplates(templates=load_template_set(current_app.config['PROMPT_TEMPLATES_PATH']))
+    system_prompt = templates.get_system_prompt()
+    model = batch_model(current_app.config)
+
+    job = BatchJob(id=uuid.uuid4().hex, status='prepared', total=0)
+    db.session.add(job)
+    db.session.commit()
+
+    position = 0
+    skipped = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for chunk in chunked(iter_performance_rows(csv_path), chunk_size):
+            items = []
+            for row in chunk:
+                criteria = rubrics.get(row['rubric_name'])
+                if not criteria or len(criteria) != len(row['scores']):
+                    logger.warning(f"Skipping {row['student_name']}: unknown rubric "
+                                   f"or score count mismatch for {row['rubric_name']}")
+                    skipped += 1
+                    continue
+
+                criterion_scores = {name: score for (name, _), score in zip(criteria, row['scores'])}
+                prompt = templates.get_rubric_based_prompt(
+                    row['student_name'],
+                    dict(criteria),
+                    {name.lower().replace(' ', '_'): score for name, score in criterion_scores.items()}
+                )
+
+                out.write(json.dumps({
+                    'custom_id': _custom_id(job.id, position),
+                    'method': 'POST',
+                    'url': BATCH_ENDPOINT,
+                    'body': {
+                        'model': model,
+                        'messages': [
+                            {'role': 'system', 'content': system_prompt},
+                            {'role': 'user', 'content': prompt}
+                        ],
+                        **FeedbackGenerator.generation_params
+                    }
+                }) + '\n')
+
+                items.append({
+                    'job_id': job.id,
+                    'position': position,
+                    'student_name': row['student_name'],
+                    'rubric_name': row['rubric_name'],
+                    'scores': criterion_scores,
+                    'feedback_type': 'comprehensive',
+                    'status': 'pending'
+                })
+                position += 1
+
+            if items:
+                db.session.execute(BatchJobItem.__table__.insert(), items)
+                db.session.commit()
+
+    job.total = position
+    db.session.commit()
+    logger.info(f"Prepared {position} batch requests for job {job.id} ({skipped} rows skipped)")
+    return job
+
+
+def job_id_for_file(path: str) -> str:
+    """Job id encoded in the first request of a prepared batch file"""
+    with open(path, encoding='utf-8') as f:
+        first = f.readline()
+    return _parse_custom_id(json.loads(first)['custom_id'])[0]
+
+
+class OpenAIBatchBackend:
+    """Submits request files to the OpenAI Batch API"""
+
+    def __init__(self, api_key: str):
+        import openai
+        self._openai = openai
+        self.api_key = api_key
+
+    def _request(self, method: str, url: str, params: Optional[Dict] = None):
+        requestor = self._openai.api_requestor.APIRequestor(key=self.api_key)
+        response, _, _ = requestor.request(method, url, params)
+        return response.data
+
+    def submit(self, path: str) -> str:
+        """Upload a request file and create a batch, returning its id"""
+        with open(path, 'rb') as f:
+            uploaded = self._openai.File.create(file=f, purpose='batch', api_key=self.api_key)
+
+        batch = self._request('post', '/batches', {
+            'input_file_id': uploaded['id'],
+            'endpoint': BATCH_ENDPOINT,
+            'completion_window': '24h'
+        })
+        return batch['id']
+
+    def status(self, batch_id: str) -> Dict:
+        """Batch status as reported by the API"""
+        return self._request('get', f'/batches/{batch_id}')
+
+    def download(self, batch_id: str, output_path: str) -> Optional[str]:
+        """
+        Stream the results file of a finished batch to disk
+
+        Returns:
+            output_path, or None while the batch has no output yet
+        """
+        import requests
+
+        output_file_id = self.status(batch_id).get('output_file_id')
+        if not output_file_id:
+            return None
+
+        response = requests.get(
+            f"{self._openai.api_base}/files/{output_file_id}/content",
+            headers={'Authorization': f'Bearer {self.api_key}'},
+            stream=True,
+            timeout=(5, 300)
+        )
+        response.raise_for_status()
+        with open(output_path, 'wb') as f:
+            for block in response.iter_content(chunk_size=1 << 16):
+                f.write(block)
+        return output_path
+
+
+class LocalBatchBackend:
+    """
+    Stand-in for the Batch API that answers every request locally
+
+    Results are written next to the request file immediately, which makes
+    the whole pipeline runnable in tests and development without network
+    access or API credits.
+    """
+
+    def submit(self, path: str) -> str:
+        results_path = f"{path}.results.jsonl"
+        with open(path, encoding='utf-8') as requests_file, \
+                open(results_path, 'w', encoding='utf-8') as results_file:
+            for line in requests_file:
+                request = json.loads(line)
+                results_file.write(json.dumps({
+                    'id': f"batch_req_{uuid.uuid4().hex}",
+                    'custom_id': request['custom_id'],
+                    'response': {
+                        'status_code': 200,
+                        'body': {
+                            'model': request['body']['model'],
+                            'choices': [{
+                                'index': 0,
+                                'message': {
+                                    'role': 'assistant',
+                                    'content': 'shows steady progress against every rubric criterion. '
+                                               'Keep building on these results'
+                                },
+                                'finish_reason': 'stop'
+                            }]
+                        }
+                    },
+                    'error': None
+                }) + '\n')
+        return f"local:{results_path}"
+
+    def status(self, batch_id: str) -> Dict:
+        return {'id': batch_id, 'status': 'completed'}
+
+    def download(self, batch_id: str, output_path: str) -> Optional[str]:
+        results_path = batch_id.split(':', 1)[1]
+        if os.path.abspath(results_path) != os.path.abspath(output_path):
+            os.replace(results_path, output_path)
+        return output_path
+
+
+def submit_batch_file(path: str, backend) -> BatchJob:
+    """
+    Submit a prepared request file and record the batch id on its job
+
+    Args:
+        path: JSONL file written by prepare_batch_file
+        backend: OpenAIBatchBackend or LocalBatchBackend
+
+    Returns:
+        The updated BatchJob, with status 'submitted'
+    """
+    job = db.session.get(BatchJob, job_id_for_file(path))
+    if job is None:
+        raise ValueError(f"No batch job found for {path}")
+
+    job.external_batch_id = backend.submit(path)
+    job.status = 'submitted'
+    db.session.commit()
+    return job
+
+
+def load_batch_results(results_path: str, chunk_size: int = 500) -> Dict[str, int]:
+    """
+    Stream a Batch API results file into the Feedback table
+
+    Items that already have a result are skipped, so a partially loaded
+    file can be loaded again.
+
+    Args:
+        results_path: Results JSONL downloaded from the Batch API
+        chunk_size: Results matched, inserted and committed together
+
+    Returns:
+        Counts of 'loaded', 'failed' and 'skipped' results
+    """
+    counts = {'loaded': 0, 'failed': 0, 'skipped': 0}
+    jobs = {}
+
+    with open(results_path, encoding='utf-8') as f:
+        for chunk in chunked(f, chunk_size):
+            results = {}
+            for line in chunk:
+                if line.strip():
+                    result = json.loads(line)
+                    results[_parse_custom_id(result['custom_id'])] = result
+
+            _load_results_chunk(results, jobs, counts)
+
+    for job in jobs.values():
+        if job.processed >= job.total:
+            job.status = 'completed'
+            job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    logger.info(f"Loaded batch results: {counts}")
+    return counts
+
+
+def _load_results_chunk(results: Dict[Tuple[str, int], Dict],
+                        jobs: Dict[str, BatchJob],
+                        counts: Dict[str, int]) -> None:
+    """Match one chunk of results to job items and persist them"""
+    items = []
+    for job_id in {job_id for job_id, _ in results}:
+        if job_id not in jobs:
+            jobs[job_id] = db.session.get(BatchJob, job_id)
+        positions = [position for result_job_id, position in results if result_job_id == job_id]
+        items.extend(BatchJobItem.query.filter(
+            BatchJobItem.job_id == job_id,
+            BatchJobItem.position.in_(positions)
+        ).all())
+
+    completed_at = datetime.utcnow()
+    rows = []
+    loaded_items = []
+    item_updates = []
+
+    for item in items:
+        if item.status != 'pending':
+            counts['skipped'] += 1
+            continue
+
+        job = jobs[item.job_id]
+        result = results[(item.job_id, item.position)]
+        response = result.get('response') or {}
+        body = response.get('body') or {}
+
+        try:
+            if response.get('status_code') != 200:
+                raise ValueError(result.get('error') or f"status {response.get('status_code')}")
+            content = body['choices'][0]['message']['content'].strip()
+            if not content:
+                raise ValueError('empty completion')
+        except Exception as e:
+            job.failed += 1
+            counts['failed'] += 1
+            item_updates.append({
+                'id': item.id, 'status': 'error', 'error': str(e),
+                'sequence': job.processed, 'completed_at': completed_at
+            })
+            continue
+
+        feedback = FeedbackGenerator._post_process_feedback(content, item.student_name)
+        rows.append(rubric_feedback_row(item.student_name, item.rubric_name, item.scores,
+                                        feedback, body.get('model')))
+        loaded_items.append((item, job, feedback))
+
+    feedback_ids = bulk_insert_feedback(rows)
+    for (item, job, feedback), feedback_id in zip(loaded_items, feedback_ids):
+        job.succeeded += 1
+        counts['loaded'] += 1
+        item_updates.append({
+            'id': item.id, 'status': 'success', 'feedback_text': feedback,
+            'feedback_id': feedback_id, 'sequence': job.processed, 'completed_at': completed_at
+        })
+
+    if item_updates:
+        db.session.execute(update(BatchJobItem), item_updates)
+    db.session.commit()
@@ -0,0 +1,165 @@
+"""
+Score-profile index for reusing stored feedback
+
+There are only 10^5 possible skill-score vectors and real cohorts cluster on
+far fewer. The index keeps the latest LLM feedback for each vector and
+feedback type. A lookup checks the exact vector first, then every vector
+within FEEDBACK_REUSE_MAX_DISTANCE (sum of absolute score differences) in
+order of distance. These are dictionary probes, at most a few hundred, so a
+lookup never scans the stored feedback.
+
+A neighbour is only used when every skill falls in the same strength, good
+or improvement band, so the reused text describes the same strengths and
+weaknesses. Feedback quoting numbers is only reused for the exact vector.
+Feedback using gendered pronouns is never indexed, since the pronouns would
+describe the original student rather than the one it is reused for.
+"""
+import itertools
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from app import db
+from app.analytics import GOOD_MIN_SCORE, SKILLS, STRENGTH_MIN_SCORE, skill_score_filters
+from app.events import register_feedback_index
+from app.models import Feedback
+
+_DIGIT = re.compile(r'\d')
+_GENDERED_PRONOUN = re.compile(r'\b(?:he|she|him|her|his|hers|himself|herself)\b', re.IGNORECASE)
+
+
+def _band(score: int) -> int:
+    if score >= STRENGTH_MIN_SCORE:
+        return 2
+    if score >= GOOD_MIN_SCORE:
+        return 1
+    return 0
+
+
+def neighbour_offsets(max_distance: int) -> List[Tuple[int, ...]]:
+    """Non-zero score offsets within an L1 distance, nearest first"""
+    steps = range(-max_distance, max_distance + 1)
+    offsets = [
+        offset for offset in itertools.product(steps, repeat=len(SKILLS))
+        if 0 < sum(abs(step) for step in offset) <= max_distance
+    ]
+    offsets.sort(key=lambda offset: sum(abs(step) for step in offset))
+    return offsets
+
+
+class ProfileReuseIndex:
+    """Latest LLM feedback per score vector and feedback type"""
+
+    def __init__(self, app=None):
+        self._profiles = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the index with a Flask application"""
+        self.app = app
+        self.max_distance = app.config['FEEDBACK_REUSE_MAX_DISTANCE']
+        self.ttl = app.config['FEEDBACK_REUSE_TTL']
+        self._offsets = neighbour_offsets(self.max_distance)
+        app.extensions['profile_reuse_index'] = self
+        register_feedback_index(app, self, ('student_name', 'feedback_text', 'feedback_type', 'model_used',
+                                            'template_version') + SKILLS)
+
+    def find(self, scores: Dict[str, int], feedback_type: str, template_version: str) -> Optional[Dict]:
+        """
+        Nearest stored feedback for a score profile
+
+        Args:
+            scores: Skill scores of the student
+            feedback_type: 'comprehensive' or 'brief'
+            template_version: Only feedback from these prompt templates is used
+
+        Returns:
+            Dictionary with 'feedback_id', 'feedback', 'student_name',
+            'model_used', 'template_version' and 'distance', or None
+        """
+        profiles = self._get_profiles()
+        vector = tuple(scores[skill] for skill in SKILLS)
+
+        entry = profiles.get((feedback_type, vector))
+        if entry is not None and entry['template_version'] == template_version:
+            return {**entry, 'distance': 0}
+
+        bands = tuple(_band(score) for score in vector)
+        for offset in self._offsets:
+            neighbour = tuple(score + step for score, step in zip(vector, offset))
+            entry = profiles.get((feedback_type, neighbour))
+            if (entry is not None
+                    and entry['template_version'] == template_version
+                    and not entry['has_numbers']
+                    and tuple(_band(score) for score in neighbour) == bands):
+                return {**entry, 'distance': sum(abs(step) for step in offset)}
+
+        return None
+
+    def add(self, rows: List[Dict]) -> None:
+        """Index committed feedback rows"""
+        profiles = self._profiles
+        if profiles is None:
+            # Not loaded yet; the first load reads these rows from the database
+            return
+        for row in rows:
+            self._add(profiles, row)
+
+    def invalidate(self) -> None:
+        """Reload the index on the next lookup"""
+        with self._lock:
+            self._profiles = None
+
+    @staticmethod
+    def _add(profiles: Dict, row: Dict) -> None:
+        # Only LLM feedback records a template version
+        if not row.get('feedback_type') or not row.get('template_version'):
+            return
+        if not all(1 <= (row.get(skill) or 0) <= 10 for skill in SKILLS):
+            return
+        if not row.get('feedback_text') or _GENDERED_PRONOUN.search(row['feedback_text']):
+            return
+
+        profiles[row['feedback_type'], tuple(row[skill] for skill in SKILLS)] = {
+            'feedback_id': row.get('id'),
+            'feedback': row['feedback_text'],
+            'student_name': row['student_name'],
+            'model_used': row.get('model_used'),
+            'template_version': row['template_version'],
+            'has_numbers': _DIGIT.search(row['feedback_text']) is not None
+        }
+
+    def _get_profiles(self) -> Dict:
+        profiles = self._profiles
+        if profiles is None or (self.ttl and time.monotonic() - self._loaded_at > self.ttl):
+            with self._lock:
+                if self._profiles is profiles:
+                    self._profiles = self._load()
+                    self._loaded_at = time.monotonic()
+                profiles = self._profiles
+        return profiles
+
+    def _load(self) -> Dict:
+        filters = skill_score_filters() + [Feedback.feedback_type.isnot(None), Feedback.template_version.isnot(None)]
+        latest = (
+            select(func.max(Feedback.id))
+            .where(*filters)
+            .group_by(Feedback.feedback_type, *(getattr(Feedback, skill) for skill in SKILLS))
+        )
+        columns = [Feedback.id, Feedback.student_name, Feedback.feedback_text, Feedback.feedback_type,
+                   Feedback.model_used, Feedback.template_version] + [getattr(Feedback, skill) for skill in SKILLS]
+
+        # A fresh application context lets worker threads use the index too
+        with self.app.app_context():
+            rows = db.session.execute(select(*columns).where(Feedback.id.in_(latest))).mappings().all()
+
+        profiles = {}
+        for row in rows:
+            self._add(profiles, row)
+        return profiles
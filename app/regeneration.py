@@ -0,0 +1,356 @@
+"""
+Background regeneration of fallback-quality feedback
+
+Requests that could not reach the LLM get local feedback straight away:
+fallback text after a failed call, degraded feedback while the circuit
+breaker is open, and overflow feedback above FEEDBACK_LLM_MAX_INFLIGHT.
+The worker finds these rows, queues them as RegenerationTask rows and later
+asks the LLM again, replacing the text in place.
+
+Tasks are claimed with a lease, so several worker processes can share the
+queue. Generation runs with bounded concurrency behind a token bucket,
+optionally only within off-peak hours, and results are written back with one
+commit per batch. Failed attempts are retried with exponential backoff.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import and_, case, exists, func, insert, literal, or_, select, update
+
+from app import db
+from app.models import Feedback, RegenerationTask
+from app.nlp.llm_client import TokenBucket
+from app.nlp.local_renderer import FALLBACK_MODEL_NAME, LOCAL_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+SKILLS = ('communication', 'teamwork', 'creativity', 'critical_thinking', 'presentation')
+
+# Closing sentences of FeedbackGenerator._generate_fallback_feedback, which
+# older rows stored under the LLM model name
+LEGACY_FALLBACK_ENDINGS = (
+    'Continue maintaining this high standard of work.',
+    'Focus on strengthening weaker areas to achieve excellence.',
+    'Consider additional practice and support in key skill areas.',
+)
+
+# Sources of results that came from the LLM rather than a local fallback
+LLM_SOURCES = ('llm', 'cache', 'reuse')
+
+
+def _is_overflow():
+    # LLM feedback was requested but rendered locally; rubric rows do not
+    # record the requested type, so only skill-score rows qualify
+    return and_(Feedback.model_used == LOCAL_MODEL_NAME, Feedback.feedback_type.in_(('comprehensive', 'brief')))
+
+
+def _is_legacy_fallback():
+    return and_(Feedback.model_used.notin_((FALLBACK_MODEL_NAME, LOCAL_MODEL_NAME)),
+                or_(*(Feedback.feedback_text.like(f'%{ending}') for ending in LEGACY_FALLBACK_ENDINGS)))
+
+
+def candidate_reason():
+    """SQL expression naming why a feedback row needs regenerating, or NULL"""
+    return case(
+        (Feedback.model_used == FALLBACK_MODEL_NAME, literal('fallback')),
+        (_is_overflow(), literal('overflow')),
+        (_is_legacy_fallback(), literal('legacy_fallback')),
+        else_=None
+    )
+
+
+def in_hours(hours: str, now: datetime) -> bool:
+    """
+    Whether a time falls within an hour window such as '1-6' or '22-5'
+
+    An empty window matches any time. The end hour is exclusive.
+    """
+    if not hours:
+        return True
+    start, _, end = hours.partition('-')
+    start, end = int(start), int(end or start)
+    if start == end:
+        return True
+    if start < end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+class RegenerationWorker:
+    """Queues fallback-quality feedback and regenerates it in the background"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.worker_id = uuid.uuid4().hex
+        self._scanned_id = 0
+        self._thread = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the worker with a Flask application"""
+        self.app = app
+        config = app.config
+        self.concurrency = max(1, config['REGEN_CONCURRENCY'])
+        self.batch_size = config['REGEN_BATCH_SIZE']
+        self.interval = config['REGEN_INTERVAL']
+        self.hours = config['REGEN_HOURS']
+        self.max_attempts = config['REGEN_MAX_ATTEMPTS']
+        self.retry_delay = config['REGEN_RETRY_DELAY']
+        self.lookback = config['REGEN_SCAN_LOOKBACK']
+        self.limiter = TokenBucket(rate=config['REGEN_REQUESTS_PER_MINUTE'] / 60.0)
+        app.extensions['regeneration_worker'] = self
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, generator) -> None:
+        """Poll the queue every REGEN_INTERVAL seconds on a daemon thread"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(generator,),
+                                        name='feedback-regeneration', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def enqueue_candidates(self) -> int:
+        """
+        Queue feedback rows stored since the last scan that need regenerating
+
+        The scan starts after the newest row this process has scanned or any
+        process has queued, so a restarted worker resumes from the last
+        queued feedback instead of rescanning the whole table. Ids are not
+        committed in order, so it also rechecks the REGEN_SCAN_LOOKBACK ids
+        below that point; rows already queued are skipped.
+
+        Returns:
+            Number of tasks created
+        """
+        upper = db.session.execute(select(func.max(Feedback.id))).scalar() or 0
+
+        # feedback_id is unique, so this reads the end of its index
+        queued_through = db.session.execute(select(func.max(RegenerationTask.feedback_id))).scalar() or 0
+        lower = max(0, max(self._scanned_id, queued_through) - self.lookback)
+        if upper <= lower:
+            return 0
+
+        now = datetime.utcnow()
+        reason = candidate_reason()
+        candidates = (
+            select(Feedback.id, reason, literal('pending'), literal(0), literal(now), literal(now), literal(now))
+            .where(
+                Feedback.id > lower,
+                Feedback.id <= upper,
+                reason.isnot(None),
+                ~exists().where(RegenerationTask.feedback_id == Feedback.id)
+            )
+        )
+        result = db.session.execute(
+            insert(RegenerationTask).from_select(
+                ['feedback_id', 'reason', 'status', 'attempts', 'next_attempt_at', 'created_at', 'updated_at'],
+                candidates
+            )
+        )
+        db.session.commit()
+
+        self._scanned_id = upper
+        if result.rowcount:
+            logger.info(f"Queued {result.rowcount} feedback rows for regeneration")
+        return max(result.rowcount, 0)
+
+    def run_once(self, generator, limit: Optional[int] = None) -> Dict[str, int]:
+        """
+        Scan for new candidates and process due tasks until none are left
+
+        Args:
+            generator: FeedbackGenerator used to regenerate feedback
+            limit: Maximum number of tasks to process, None for all due tasks
+
+        Returns:
+            Counts of 'queued', 'regenerated', 'retried' and 'failed' tasks
+        """
+        counts = {'queued': self.enqueue_candidates(), 'regenerated': 0, 'retried': 0, 'failed': 0}
+
+        while limit is None or limit > 0:
+            if self._stop.is_set() or not self._llm_available(generator):
+                break
+
+            size = self.batch_size if limit is None else min(self.batch_size, limit)
+            tasks = self._claim(size)
+            if not tasks:
+                break
+
+            for outcome, count in self._process(tasks, generator).items():
+                counts[outcome] += count
+            if limit is not None:
+                limit -= len(tasks)
+
+        return counts
+
+    def stats(self) -> Dict:
+        """Task counts by status"""
+        rows = db.session.execute(
+            select(RegenerationTask.status, func.count()).group_by(RegenerationTask.status)
+        ).all()
+        return {
+            'running': self.running,
+            'tasks': {status: count for status, count in rows}
+        }
+
+    def _llm_available(self, generator) -> bool:
+        # The same per-route check requests use, so a healthy fallback route is used
+        return generator.llm_available()
+
+    def _loop(self, generator) -> None:
+        while not self._stop.is_set():
+            if in_hours(self.hours, datetime.now()):
+                with self.app.app_context():
+                    try:
+                        counts = self.run_once(generator)
+                        if any(counts.values()):
+                            logger.info(f"Regeneration pass: {counts}")
+                    except Exception as e:
+                        logger.error(f"Regeneration pass failed: {str(e)}")
+                        db.session.rollback()
+                    finally:
+                        db.session.remove()
+            self._stop.wait(self.interval)
+
+    def _claim(self, size: int) -> List[Tuple[RegenerationTask, Feedback]]:
+        """Lease up to size due tasks to this worker"""
+        now = datetime.utcnow()
+        due = or_(
+            and_(RegenerationTask.status == 'pending', RegenerationTask.next_attempt_at <= now),
+            # Tasks of a worker that stopped mid-batch
+            and_(RegenerationTask.status == 'running', RegenerationTask.locked_until < now)
+        )
+        task_ids = db.session.execute(
+            select(RegenerationTask.id).where(due).order_by(RegenerationTask.next_attempt_at).limit(size)
+        ).scalars().all()
+        if not task_ids:
+            return []
+
+        # Leases long enough for the batch at the configured request rate
+        rate = self.limiter.rate or 1.0
+        lease = timedelta(seconds=600 + len(task_ids) / rate)
+        db.session.execute(
+            update(RegenerationTask)
+            .where(RegenerationTask.id.in_(task_ids), due)
+            .values(status='running', worker_id=self.worker_id, locked_until=now + lease, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        return db.session.execute(
+            select(RegenerationTask, Feedback)
+            .join(Feedback, Feedback.id == RegenerationTask.feedback_id)
+            .where(RegenerationTask.id.in_(task_ids), RegenerationTask.worker_id == self.worker_id,
+                   RegenerationTask.status == 'running')
+        ).all()
+
+    def _process(self, tasks: List[Tuple[RegenerationTask, Feedback]], generator) -> Dict[str, int]:
+        """Regenerate a claimed batch and write every result in one commit"""
+        requests = [self._request(feedback) for _, feedback in tasks]
+
+        def regenerate(request):
+            if request is None:
+                return None
+            self.limiter.acquire()
+            try:
+                return request(generator)
+            except Exception as e:
+                return {'source': 'error', 'error': str(e)}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='feedback-regen') as pool:
+            results = list(pool.map(regenerate, requests))
+
+        now = datetime.utcnow()
+        counts = {'regenerated': 0, 'retried': 0, 'failed': 0}
+        feedback_rows = []
+        task_rows = []
+
+        for (task, feedback), result in zip(tasks, results):
+            attempts = task.attempts + 1
+            if result is not None and result.get('source') in LLM_SOURCES:
+                feedback_rows.append({
+                    'id': feedback.id,
+                    'feedback_text': result['feedback'],
+                    'model_used': result['model_used'],
+                    'template_version': result.get('template_version'),
+                    # Signed again when the near-duplicate index next loads it
+                    'text_signature': None
+                })
+                task_rows.append({'id': task.id, 'status': 'done', 'attempts': attempts, 'error': None,
+                                  'worker_id': None, 'locked_until': None, 'finished_at': now, 'updated_at': now})
+                counts['regenerated'] += 1
+                continue
+
+            if result is None:
+                error = 'Feedback has no scores to regenerate from'
+            else:
+                error = result.get('error') or f"LLM unavailable (source {result.get('source')})"
+
+            if result is None or attempts >= self.max_attempts:
+                task_rows.append({'id': task.id, 'status': 'failed', 'attempts': attempts, 'error': error,
+                                  'worker_id': None, 'locked_until': None, 'finished_at': now, 'updated_at': now})
+                counts['failed'] += 1
+            else:
+                delay = timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+                task_rows.append({'id': task.id, 'status': 'pending', 'attempts': attempts, 'error': error,
+                                  'worker_id': None, 'locked_until': None, 'next_attempt_at': now + delay,
+                                  'updated_at': now})
+                counts['retried'] += 1
+
+        if feedback_rows:
+            db.session.execute(update(Feedback), feedback_rows)
+        # Bulk updates need the same keys in every row
+        for rows in _group_by_keys(task_rows).values():
+            db.session.execute(update(RegenerationTask), rows)
+        db.session.commit()
+        return counts
+
+    def _request(self, feedback: Feedback):
+        """Callable regenerating one feedback row, or None if it cannot be regenerated"""
+        student_name = feedback.student_name
+
+        if feedback.rubric_name:
+            rubric = self.app.extensions['rubric_registry'].compiled(feedback.rubric_name)
+            if rubric is None or not feedback.criterion_scores:
+                return None
+            try:
+                vector = rubric.vector(feedback.criterion_scores)
+            except ValueError:
+                return None
+            return lambda generator: generator.generate_rubric_feedback(student_name, rubric, vector)
+
+        scores = {skill: getattr(feedback, skill) for skill in SKILLS}
+        # Rows stored as fallback because their scores failed validation would fail again
+        if any(score is None or not 1 <= score <= 10 for score in scores.values()):
+            return None
+        feedback_type = feedback.feedback_type if feedback.feedback_type in ('comprehensive', 'brief') \
+            else 'comprehensive'
+        return lambda generator: generator.generate_feedback_with_metadata(student_name, scores, feedback_type)
+
+
+def _group_by_keys(rows: List[Dict]) -> Dict[Tuple[str, ...], List[Dict]]:
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return groups
+
+
+def get_regeneration_worker() -> RegenerationWorker:
+    """Regeneration worker of the current application"""
+    return current_app.extensions['regeneration_worker']
@@ -2,17 +2,16 @@
 Web interface routes for the Auto Feedback Generator
 """
 from flask import Blueprint, render_template, request, flash, redirect, url_for
-from app.nlp import FeedbackGenerator
+from app.nlp import get_feedback_generator
 from app.models import Feedback, db
+from app.utils.metrics import stage_timer
+from app.utils.pagination import keyset_paginate
 import logging
 
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('main', __name__)
 
-# Initialize feedback generator
-feedback_generator = FeedbackGenerator()
-
 @bp.route('/')
 def index():
     """Main page with feedback form"""
@@ -47,11 +46,12 @@ def generate_feedback_web():
                 return redirect(url_for('main.index'))
         
         # Generate feedback
-        feedback_text = feedback_generator.generate_feedback(
+        generated = get_feedback_generator().generate_feedback_with_metadata(
             student_name=student_name,
             scores=scores,
             feedback_type='comprehensive'
         )
+        feedback_text = generated['feedback']
         
         # Save to database
         feedback_record = Feedback(
@@ -61,11 +61,15 @@ def generate_feedback_web():
             creativity=scores['creativity'],
             critical_thinking=scores['critical_thinking'],
             presentation=scores['presentation'],
-            feedback_text=feedback_text
+            feedback_text=feedback_text,
+            model_used=generated['model_used'],
+            feedback_type='comprehensive',
+            template_version=generated.get('template_version')
         )
         
         db.session.add(feedback_record)
-        db.session.commit()
+        with stage_timer('db_commit'):
+            db.session.commit()
         
         flash('Feedback generated successfully!', 'success')
         return render_template('result.html', 
@@ -82,14 +86,20 @@ def generate_feedback_web():
 def feedback_history():
     """View feedback history"""
     try:
-        page = request.args.get('page', 1, type=int)
         per_page = 10
         
-        feedbacks = Feedback.query.order_by(Feedback.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        try:
+            result = keyset_paginate(
+                Feedback.query, Feedback.created_at, Feedback.id,
+                per_page=per_page,
+                cursor=request.args.get('cursor')
+            )
+        except ValueError:
+            return redirect(url_for('main.feedback_history'))
         
-        return render_template('history.html', feedbacks=feedbacks)
+        return render_template('history.html',
+                             feedbacks=result['items'],
+                             next_cursor=result['next_cursor'])
         
     except Exception as e:
         logger.error(f"Error loading feedback history: {str(e)}")
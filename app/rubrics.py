@@ -0,0 +1,241 @@
+"""
+Rubric storage and the process-wide rubric registry
+
+The registry loads every rubric with its criteria in one query and serves
+lookups from memory, so building a rubric prompt touches neither the
+database nor the uploaded files. Uploads invalidate it in the process that
+handled them. Other worker processes reload once RUBRIC_CACHE_TTL expires.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import Criterion, Feedback, MentorInput, PerformanceData, Rubric, Student
+from app.nlp.rubric_scoring import CompiledRubric
+
+
+class RubricRegistry:
+    """In-memory view of all rubrics and their criteria"""
+
+    def __init__(self, app=None):
+        self._rubrics = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the registry with a Flask application"""
+        self.app = app
+        self.ttl = app.config['RUBRIC_CACHE_TTL']
+        app.extensions['rubric_registry'] = self
+
+    def get(self, rubric: Union[int, str]) -> Optional[Dict]:
+        """
+        Look up a rubric by id or name
+
+        Returns:
+            Dictionary with 'id', 'name' and 'criteria' (list of criterion
+            dictionaries in rubric order), or None if it does not exist
+        """
+        return self._lookup(self._get_rubrics(), rubric)
+
+    def get_criteria(self, rubric: Union[int, str]) -> Dict[str, str]:
+        """
+        Criterion descriptions keyed by criterion name
+
+        Raises:
+            KeyError: If the rubric does not exist
+        """
+        entry = self.get(rubric)
+        if entry is None:
+            raise KeyError(f"Unknown rubric: {rubric}")
+        return {criterion['name']: criterion['description'] for criterion in entry['criteria']}
+
+    def compiled(self, rubric: Union[int, str]) -> Optional[CompiledRubric]:
+        """
+        Compiled form of a rubric, built once per registry load
+
+        Returns:
+            The CompiledRubric, or None if the rubric does not exist or has
+            no criteria
+        """
+        rubrics = self._get_rubrics()
+        entry = self._lookup(rubrics, rubric)
+        if entry is None or not entry['criteria']:
+            return None
+
+        compiled = rubrics['compiled'].get(entry['id'])
+        if compiled is None:
+            compiled = rubrics['compiled'].setdefault(entry['id'], CompiledRubric.from_entry(entry))
+        return compiled
+
+    def all(self) -> List[Dict]:
+        """All rubrics ordered by id"""
+        return list(self._get_rubrics()['by_id'].values())
+
+    def invalidate(self) -> None:
+        """Drop the cached rubrics; the next lookup reloads them"""
+        with self._lock:
+            self._rubrics = None
+
+    @staticmethod
+    def _lookup(rubrics: Dict[str, Dict], rubric: Union[int, str]) -> Optional[Dict]:
+        if isinstance(rubric, int):
+            return rubrics['by_id'].get(rubric)
+        return rubrics['by_name'].get(rubric)
+
+    def _get_rubrics(self) -> Dict[str, Dict]:
+        rubrics = self._rubrics
+        if rubrics is None or (self.ttl and time.monotonic() - self._loaded_at > self.ttl):
+            with self._lock:
+                if self._rubrics is rubrics:
+                    self._rubrics = self._load()
+                    self._loaded_at = time.monotonic()
+                rubrics = self._rubrics
+        return rubrics
+
+    def _load(self) -> Dict[str, Dict]:
+        # A fresh application context lets worker threads use the registry too
+        with self.app.app_context():
+            rows = db.session.execute(
+                select(Rubric.id, Rubric.name, Criterion.id, Criterion.name,
+                       Criterion.description, Criterion.max_score)
+                .outerjoin(Criterion, (Criterion.rubric_id == Rubric.id) & Criterion.retired_at.is_(None))
+                .order_by(Rubric.id, Criterion.position, Criterion.id)
+            ).all()
+
+        by_id = {}
+        for rubric_id, rubric_name, criterion_id, name, description, max_score in rows:
+            entry = by_id.setdefault(rubric_id, {'id': rubric_id, 'name': rubric_name, 'criteria': []})
+            if criterion_id is not None:
+                entry['criteria'].append({
+                    'id': criterion_id,
+                    'name': name,
+                    'description': description,
+                    'max_score': max_score
+                })
+
+        by_name = {}
+        for entry in by_id.values():
+            # Keep the first rubric when names are duplicated
+            by_name.setdefault(entry['name'], entry)
+
+        return {'by_id': by_id, 'by_name': by_name, 'compiled': {}}
+
+
+def get_rubric_registry() -> RubricRegistry:
+    """Rubric registry of the current application"""
+    return current_app.extensions['rubric_registry']
+
+
+def store_rubrics(criteria_rows: Iterable[Dict]) -> List[Rubric]:
+    """
+    Create or replace rubrics from parsed criterion rows
+
+    An existing rubric with the same name takes the uploaded definition:
+    matching criteria are updated in place, so stored scores keep pointing
+    at them, and new criteria are added. Criteria missing from the upload
+    are retired rather than deleted, so their scores are kept; uploading
+    them again brings them back. Every criterion takes its position in the
+    upload, which is the order of the Criterion 1..N columns of later
+    performance imports.
+
+    Args:
+        criteria_rows: Rows from app.ingest.iter_rubric_rows
+
+    Returns:
+        The created or updated rubrics, in upload order
+    """
+    uploaded = {}
+    for row in criteria_rows:
+        uploaded.setdefault(row['rubric_name'], []).append(row)
+
+    existing = {rubric.name: rubric for rubric in Rubric.query.filter(Rubric.name.in_(list(uploaded)))}
+    stored = []
+
+    for rubric_name, rows in uploaded.items():
+        rubric = existing.get(rubric_name)
+        if rubric is None:
+            rubric = Rubric(name=rubric_name)
+            db.session.add(rubric)
+
+        current = {criterion.name: criterion for criterion in rubric.criteria_rows}
+        criteria = []
+        for position, row in enumerate(rows):
+            criterion = current.pop(row['name'], None) or Criterion(name=row['name'])
+            criterion.description = row['description']
+            criterion.max_score = row['max_score']
+            criterion.position = position
+            criterion.retired_at = None
+            criteria.append(criterion)
+
+        for criterion in current.values():
+            if criterion.retired_at is None:
+                criterion.retired_at = datetime.utcnow()
+            criterion.position = None
+            criteria.append(criterion)
+
+        rubric.criteria_rows = criteria
+        rubric.criteria = {row['name']: row['description'] for row in rows}
+        stored.append(rubric)
+
+    db.session.commit()
+    get_rubric_registry().invalidate()
+    return stored
+
+
+def record_rubric_feedback(student_name: str,
+                           rubric: CompiledRubric,
+                           vector: Tuple[int, ...],
+                           generated: Dict[str, str],
+                           evaluator_id: Optional[int] = None) -> Feedback:
+    """
+    Persist rubric scores and their feedback in one transaction
+
+    Creates the mentor input with one performance data row per criterion
+    and the feedback that references it. The student is matched by name
+    and created when missing.
+
+    Args:
+        student_name: Name of the student
+        rubric: Compiled rubric the scores belong to
+        vector: Scores in criterion order
+        generated: Result of FeedbackGenerator.generate_rubric_feedback
+        evaluator_id: Optional id of the evaluator who entered the scores
+
+    Returns:
+        The stored Feedback
+    """
+    student = Student.query.filter_by(name=student_name).first()
+    if student is None:
+        student = Student(name=student_name)
+        db.session.add(student)
+        db.session.flush()
+
+    mentor_input = MentorInput(student_id=student.id, rubric_id=rubric.id, evaluator_id=evaluator_id)
+    mentor_input.performance_data = [
+        PerformanceData(criterion_id=criterion_id, score=score)
+        for criterion_id, score in zip(rubric.criterion_ids, vector)
+    ]
+    db.session.add(mentor_input)
+    db.session.flush()
+
+    feedback = Feedback(
+        student_id=student.id,
+        student_name=student_name,
+        rubric_name=rubric.name,
+        criterion_scores=rubric.scores_dict(vector),
+        mentor_input_id=mentor_input.id,
+        feedback_text=generated['feedback'],
+        model_used=generated['model_used'],
+        template_version=generated.get('template_version')
+    )
+    db.session.add(feedback)
+    db.session.commit()
+    return feedback
@@ -0,0 +1,135 @@
+"""
+Indexed student name search for feedback listings
+
+SQLite gets an FTS5 table with the trigram tokenizer, kept in sync with
+the feedbacks table by triggers, so substring and prefix LIKE patterns are
+answered from the index. PostgreSQL gets a pg_trgm GIN index, which the
+planner uses for ILIKE directly. Other backends fall back to a plain ILIKE.
+"""
+import logging
+from sqlalchemy import column, select, table, text
+from app import db
+from app.models import Feedback
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'feedbacks_fts'
+
+# Trigram indexes cannot serve patterns with fewer than three characters
+MIN_INDEXED_TERM_LENGTH = 3
+
+_SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "student_name, content='feedbacks', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON feedbacks BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, student_name) VALUES (new.id, new.student_name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON feedbacks BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, student_name) "
+    "VALUES ('delete', old.id, old.student_name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF student_name ON feedbacks BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, student_name) "
+    "VALUES ('delete', old.id, old.student_name); "
+    f"INSERT INTO {FTS_TABLE}(rowid, student_name) VALUES (new.id, new.student_name); END",
+]
+
+_POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_feedbacks_student_name_trgm "
+    "ON feedbacks USING gin (student_name gin_trgm_ops)",
+]
+
+_fts_table = table(FTS_TABLE, column('rowid'), column('student_name'))
+
+# Search mode per database URL, filled in by setup_feedback_indexes or on first use
+_search_modes = {}
+
+def setup_feedback_indexes() -> str:
+    """
+    Create the listing indexes and the name search index for the backend
+
+    Safe to run repeatedly; existing indexes are left untouched. Must be
+    called within an application context after the tables exist.
+
+    Returns:
+        The search mode now available: 'fts5', 'trigram' or 'like'
+    """
+    engine = db.engine
+
+    # create_all() does not add indexes to tables that already exist
+    for index in Feedback.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
+    dialect = engine.dialect.name
+    try:
+        if dialect == 'sqlite':
+            with engine.begin() as conn:
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+                ), {'name': FTS_TABLE}).first() is not None
+
+                for statement in _SQLITE_FTS_DDL:
+                    conn.execute(text(statement))
+
+                if not exists:
+                    # Index rows written before the search table existed
+                    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+            mode = 'fts5'
+
+        elif dialect == 'postgresql':
+            with engine.begin() as conn:
+                for statement in _POSTGRES_TRGM_DDL:
+                    conn.execute(text(statement))
+            mode = 'trigram'
+
+        else:
+            mode = 'like'
+
+    except Exception as e:
+        logger.warning(f"Name search index unavailable, falling back to LIKE: {str(e)}")
+        mode = 'like'
+
+    _search_modes[engine.url] = mode
+    return mode
+
+def get_search_mode() -> str:
+    """Search mode supported by the current database"""
+    engine = db.engine
+    mode = _search_modes.get(engine.url)
+
+    if mode is None:
+        mode = 'like'
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                if conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+                ), {'name': FTS_TABLE}).first() is not None:
+                    mode = 'fts5'
+        elif engine.dialect.name == 'postgresql':
+            mode = 'trigram'
+        _search_modes[engine.url] = mode
+
+    return mode
+
+def student_name_filter(student_name: str, match: str = 'contains'):
+    """
+    Build a filter on Feedback.student_name that uses the search index when possible
+
+    Args:
+        student_name: Search term
+        match: 'contains' for a substring match or 'prefix' to match the start of the name
+
+    Returns:
+        SQLAlchemy filter expression
+    """
+    if match == 'prefix':
+        pattern = f'{student_name}%'
+    else:
+        pattern = f'%{student_name}%'
+
+    if get_search_mode() == 'fts5' and len(student_name) >= MIN_INDEXED_TERM_LENGTH:
+        # The trigram tokenizer answers LIKE from the index, case-insensitively
+        matching_ids = select(_fts_table.c.rowid).where(_fts_table.c.student_name.like(pattern))
+        return Feedback.id.in_(matching_ids)
+
+    # PostgreSQL serves ILIKE from the pg_trgm index; elsewhere this is a scan
+    return Feedback.student_name.ilike(pattern)
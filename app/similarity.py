@@ -0,0 +1,177 @@
+"""
+Near-duplicate index over stored feedback
+
+Feedback rows store the MinHash signature of their text, but writes do not
+compute it: the index is only built when FEEDBACK_DEDUP is enabled. It holds
+the signatures of the most recent FEEDBACK_DEDUP_MAX_ENTRIES rows, loaded in
+one query; rows loaded without a signature are signed then and the signature
+stored. Rows committed in this process are signed as they are added. Feedback
+is grouped by rubric, and skill-score feedback forms one group.
+"""
+import itertools
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from app import db
+from app.events import register_feedback_index
+from app.models import Feedback
+from app.nlp.similarity import MinHashLSH, feedback_signature
+
+
+class FeedbackSimilarityIndex:
+    """Recent feedback signatures for near-duplicate lookups"""
+
+    def __init__(self, app=None):
+        self._lsh = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._unsaved_keys = itertools.count(-1, -1)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the index with a Flask application"""
+        self.app = app
+        self.threshold = app.config['FEEDBACK_DEDUP_THRESHOLD']
+        self.max_entries = app.config['FEEDBACK_DEDUP_MAX_ENTRIES']
+        self.ttl = app.config['FEEDBACK_DEDUP_TTL']
+        app.extensions['similarity_index'] = self
+        register_feedback_index(app, self, ('feedback_text', 'student_name', 'rubric_name'))
+
+    def find_near_duplicate(self,
+                            text: str,
+                            student_name: str,
+                            cohort: Optional[str] = None) -> Optional[Dict]:
+        """
+        Look for recent feedback to another student with nearly the same text
+
+        Args:
+            text: Generated feedback
+            student_name: Student the feedback is for
+            cohort: Rubric name, or None for skill-score feedback
+
+        Returns:
+            Dictionary with 'feedback_id' (None for rows added by a bulk
+            insert in this process) and 'similarity', or None
+        """
+        match = self._get_lsh().query(
+            feedback_signature(text, student_name), self.threshold, cohort=cohort, exclude_owner=student_name
+        )
+        if match is None:
+            return None
+
+        key, similarity = match
+        return {'feedback_id': key if key > 0 else None, 'similarity': similarity}
+
+    def add(self, rows) -> None:
+        """Index committed feedback rows"""
+        lsh = self._lsh
+        if lsh is None:
+            # Not loaded yet; the first load reads and signs these rows
+            return
+        for row in rows:
+            text, student_name = row.get('feedback_text'), row.get('student_name')
+            if text:
+                lsh.add(row.get('id') or next(self._unsaved_keys), feedback_signature(text, student_name),
+                        row.get('rubric_name'), student_name)
+
+    def invalidate(self) -> None:
+        """Reload the index on the next lookup"""
+        with self._lock:
+            self._lsh = None
+
+    def _get_lsh(self) -> MinHashLSH:
+        lsh = self._lsh
+        if lsh is None or (self.ttl and time.monotonic() - self._loaded_at > self.ttl):
+            with self._lock:
+                if self._lsh is lsh:
+                    self._lsh = self._load()
+                    self._loaded_at = time.monotonic()
+                lsh = self._lsh
+        return lsh
+
+    def _load(self) -> MinHashLSH:
+        lsh = MinHashLSH(self.max_entries)
+
+        # A fresh application context lets worker threads use the index too
+        with self.app.app_context():
+            rows = db.session.execute(
+                select(Feedback.id, Feedback.text_signature, Feedback.feedback_text,
+                       Feedback.rubric_name, Feedback.student_name)
+                .where(Feedback.feedback_text.isnot(None))
+                .order_by(Feedback.id.desc())
+                .limit(self.max_entries)
+            ).all()
+
+            # Sign rows written since the last load once, and keep the result
+            unsigned = [(row.id, row.feedback_text, row.student_name)
+                        for row in rows if row.text_signature is None]
+            signatures = _store_signatures(unsigned) if unsigned else {}
+
+        # Oldest first, so eviction keeps the most recent rows
+        for feedback_id, signature, _, cohort, student_name in reversed(rows):
+            lsh.add(feedback_id, signature or signatures[feedback_id], cohort, student_name)
+        return lsh
+
+
+def _store_signatures(rows) -> Dict[int, bytes]:
+    """
+    Compute and store signatures for (feedback id, text, student name) rows
+
+    Returns:
+        Signatures keyed by feedback id
+    """
+    signatures = {
+        feedback_id: feedback_signature(text, student_name)
+        for feedback_id, text, student_name in rows
+    }
+    db.session.execute(update(Feedback), [
+        {'id': feedback_id, 'text_signature': signature}
+        for feedback_id, signature in signatures.items()
+    ])
+    db.session.commit()
+    return signatures
+
+
+def backfill_signatures(chunk_size: int = 1000, progress=None) -> int:
+    """
+    Compute signatures for feedback stored without one
+
+    The near-duplicate index signs unsigned rows as it loads them; this
+    does it ahead of time, so enabling FEEDBACK_DEDUP on a large table
+    does not slow the first lookup.
+
+    Args:
+        chunk_size: Rows updated per transaction
+        progress: Optional callable receiving the running count
+
+    Returns:
+        Number of rows updated
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Feedback.id, Feedback.feedback_text, Feedback.student_name)
+            .where(Feedback.text_signature.is_(None), Feedback.id > last_id)
+            .order_by(Feedback.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return updated
+
+        _store_signatures(rows)
+
+        updated += len(rows)
+        last_id = rows[-1][0]
+        if progress is not None:
+            progress(updated)
+
+
+def get_similarity_index() -> FeedbackSimilarityIndex:
+    """Similarity index of the current application"""
+    return current_app.extensions['similarity_index']
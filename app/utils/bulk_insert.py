@@ -0,0 +1,115 @@
+"""
+Bulk persistence helpers for the Auto Feedback Generator
+"""
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import insert
+from app.models import Feedback, db
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Yield lists of up to size items without materialising the iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def feedback_row(student_name: str,
+                 scores: Dict[str, int],
+                 feedback_text: str,
+                 model_used: Optional[str] = None,
+                 template_version: Optional[str] = None,
+                 feedback_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build a Feedback insert mapping from a student's scores
+    
+    Args:
+        student_name: Name of the student
+        scores: Dictionary of skill scores
+        feedback_text: Generated feedback
+        model_used: Model that produced the feedback, defaults to the column default
+        template_version: Version of the prompt templates used, if any
+        feedback_type: Requested feedback type
+        
+    Returns:
+        Column mapping for bulk_insert_feedback
+    """
+    row = {
+        'student_name': student_name,
+        'communication': scores['communication'],
+        'teamwork': scores['teamwork'],
+        'creativity': scores['creativity'],
+        'critical_thinking': scores['critical_thinking'],
+        'presentation': scores['presentation'],
+        'feedback_text': feedback_text
+    }
+    if model_used:
+        row['model_used'] = model_used
+    if template_version:
+        row['template_version'] = template_version
+    if feedback_type:
+        row['feedback_type'] = feedback_type
+    return row
+
+def rubric_feedback_row(student_name: str,
+                        rubric_name: str,
+                        criterion_scores: Dict[str, int],
+                        feedback_text: str,
+                        model_used: Optional[str] = None,
+                        template_version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build a Feedback insert mapping for rubric-based scores
+    
+    Args:
+        student_name: Name of the student
+        rubric_name: Rubric the scores belong to
+        criterion_scores: Scores keyed by criterion name
+        feedback_text: Generated feedback
+        model_used: Model that produced the feedback, defaults to the column default
+        template_version: Version of the prompt templates used, if any
+        
+    Returns:
+        Column mapping for bulk_insert_feedback
+    """
+    row = {
+        'student_name': student_name,
+        'rubric_name': rubric_name,
+        'criterion_scores': criterion_scores,
+        'feedback_text': feedback_text
+    }
+    if model_used:
+        row['model_used'] = model_used
+    if template_version:
+        row['template_version'] = template_version
+    return row
+
+def bulk_insert_feedback(rows: List[Dict[str, Any]], chunk_size: Optional[int] = None) -> List[int]:
+    """
+    Insert many Feedback rows with multi-row INSERT statements
+    
+    Args:
+        rows: Column mappings, see feedback_row
+        chunk_size: When set, insert and commit in chunks of this many rows
+            so very large batches do not build one huge transaction.
+            When None or 0, everything is inserted in one statement and
+            nothing is committed: the caller must commit.
+        
+    Returns:
+        Generated feedback ids, in the same order as rows
+    """
+    if not rows:
+        return []
+    
+    stmt = insert(Feedback).returning(Feedback.id, sort_by_parameter_order=True)
+    size = chunk_size or len(rows)
+    ids = []
+    
+    for start in range(0, len(rows), size):
+        result = db.session.execute(stmt, rows[start:start + size])
+        ids.extend(result.scalars().all())
+        
+        if chunk_size:
+            db.session.commit()
+    
+    return ids
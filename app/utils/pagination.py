@@ -0,0 +1,87 @@
+"""
+Keyset (cursor) pagination helpers
+
+Pages are addressed by the sort key of the last row seen, not by an
+offset. Every page is then an index range scan, however deep it is, and
+the exact total is only counted when a caller asks for it.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import tuple_
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    Encode a (created_at, id) sort key as an opaque cursor
+    
+    Args:
+        created_at: Timestamp of the last row on the page
+        row_id: Primary key of the last row on the page
+        
+    Returns:
+        URL-safe cursor string
+    """
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+
+def keyset_paginate(query,
+                    created_at_column,
+                    id_column,
+                    per_page: int,
+                    cursor: Optional[str] = None,
+                    include_total: bool = False) -> Dict[str, Any]:
+    """
+    Fetch one page of a query ordered newest first by (created_at, id)
+    
+    Args:
+        query: SQLAlchemy query, without ordering
+        created_at_column: Timestamp column of the sort key
+        id_column: Primary key column used as the tie-breaker
+        per_page: Page size
+        cursor: Cursor returned with the previous page, None for the first page
+        include_total: Also count all rows matching the query
+        
+    Returns:
+        Dictionary with 'items', 'next_cursor', 'has_next' and 'total'
+        (None unless include_total is set)
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    total = query.order_by(None).count() if include_total else None
+    
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(created_at_column, id_column) < tuple_(created_at, row_id))
+    
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(created_at_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    items = rows[:per_page]
+    
+    next_cursor = None
+    if has_next:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, created_at_column.key), getattr(last, id_column.key))
+    
+    return {
+        'items': items,
+        'next_cursor': next_cursor,
+        'has_next': has_next,
+        'total': total
+    }
@@ -49,7 +49,7 @@ def validate_feedback_request(data: Dict[str, Any]) -> Dict[str, Any]:
     
     # Validate optional feedback_type
     if 'feedback_type' in data:
-        valid_types = ['comprehensive', 'brief']
+        valid_types = ['comprehensive', 'brief', 'local']
         if data['feedback_type'] not in valid_types:
             return {
                 'valid': False,
@@ -61,12 +61,13 @@ def validate_feedback_request(data: Dict[str, Any]) -> Dict[str, Any]:
         'message': 'Valid request'
     }
 
-def validate_batch_request(data: Dict[str, Any]) -> Dict[str, Any]:
+def validate_batch_request(data: Dict[str, Any], max_students: int = 50) -> Dict[str, Any]:
     """
     Validate batch feedback generation request
     
     Args:
         data: Request data dictionary
+        max_students: Maximum number of students allowed in the batch
         
     Returns:
         Dictionary with 'valid' boolean and 'message' string
@@ -90,10 +91,10 @@ def validate_batch_request(data: Dict[str, Any]) -> Dict[str, Any]:
             'message': 'students list cannot be empty'
         }
     
-    if len(students) > 50:  # Reasonable batch limit
+    if len(students) > max_students:  # Reasonable batch limit
         return {
             'valid': False,
-            'message': 'Maximum 50 students allowed per batch request'
+            'message': f'Maximum {max_students} students allowed per batch request'
         }
     
     # Validate each student entry
@@ -129,6 +130,56 @@ def validate_batch_request(data: Dict[str, Any]) -> Dict[str, Any]:
         'message': 'Valid batch request'
     }
 
+def validate_rubric_feedback_request(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate the shape of a rubric feedback request
+    
+    Scores are checked against the rubric by CompiledRubric.vector.
+    
+    Args:
+        data: Request data dictionary
+        
+    Returns:
+        Dictionary with 'valid' boolean and 'message' string
+    """
+    for field in ('student_name', 'scores'):
+        if field not in data:
+            return {
+                'valid': False,
+                'message': f'Missing required field: {field}'
+            }
+    
+    if not isinstance(data['student_name'], str) or not data['student_name'].strip():
+        return {
+            'valid': False,
+            'message': 'Student name must be a non-empty string'
+        }
+    
+    if not isinstance(data['scores'], (dict, list)):
+        return {
+            'valid': False,
+            'message': 'scores must be an object keyed by criterion or a list in criterion order'
+        }
+    
+    if data.get('evaluator_id') is not None and not isinstance(data['evaluator_id'], int):
+        return {
+            'valid': False,
+            'message': 'evaluator_id must be an integer'
+        }
+    
+    if 'feedback_type' in data:
+        valid_types = ['comprehensive', 'brief', 'local']
+        if data['feedback_type'] not in valid_types:
+            return {
+                'valid': False,
+                'message': f'feedback_type must be one of: {", ".join(valid_types)}'
+            }
+    
+    return {
+        'valid': True,
+        'message': 'Valid request'
+    }
+
 def sanitize_student_name(name: str) -> str:
     """
     Sanitize student name for safe processing
@@ -0,0 +1 @@
+"""Load tests against a local stub LLM; see benchmarks/run.py"""
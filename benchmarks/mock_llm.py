@@ -0,0 +1,299 @@
+"""
+OpenAI-compatible stub server for load tests
+
+Answers POST /v1/chat/completions like the OpenAI API, including streamed
+responses and the JSON object asked for by packed batch prompts, after a
+configurable delay. A share of requests can fail with 500, and requests are
+rejected with 429 and rate-limit headers above a requests-per-minute limit
+or at random, so retries and backoff are exercised without API credits.
+
+    python -m benchmarks.mock_llm --port 8089 --latency 0.8 --error-rate 0.02 --rpm 600
+
+Point the app at it with OPENAI_API_BASE=http://127.0.0.1:8089/v1.
+GET /stats returns request counts by status; POST /stats/reset clears them.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+_PACKED_STUDENT = re.compile(r'^\[(s\d+)\] (.+)$', re.MULTILINE)
+
+FEEDBACK_TEXT = (
+    "shows steady progress this term. Their communication is clear and they "
+    "contribute well in group work, bringing creative ideas to shared tasks. "
+    "To grow further, they should practise structuring arguments step by step "
+    "and rehearse presentations so that key points land with confidence. "
+    "Keep building on these strengths with the same consistent effort."
+)
+
+
+class MockLLM:
+    """Behaviour and counters shared by all request handlers"""
+
+    def __init__(self,
+                 latency: float = 0.5,
+                 jitter: float = 0.2,
+                 error_rate: float = 0.0,
+                 throttle_rate: float = 0.0,
+                 requests_per_minute: int = 0,
+                 retry_after: float = 1.0,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            latency: Mean seconds before a completion is returned
+            jitter: Latency varies uniformly by up to this many seconds either way
+            error_rate: Share of requests answered with a 500 error
+            throttle_rate: Share of requests answered with a 429 error at random
+            requests_per_minute: Requests accepted per sliding minute before
+                answering 429 (0 = unlimited)
+            retry_after: Retry-After seconds sent with 429 responses
+            seed: Random seed, for repeatable error sequences
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.requests_per_minute = requests_per_minute
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._accepted = deque()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {'requests': 0, 'completions': 0, 'rate_limited': 0, 'errors': 0,
+                          'prompt_tokens': 0, 'completion_tokens': 0, 'started_at': time.time()}
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, elapsed_seconds=time.time() - self.stats['started_at'])
+
+    def admit(self) -> Dict:
+        """
+        Decide how to answer the next request
+
+        Returns:
+            Dictionary with 'status' (200, 429 or 500), 'delay' and the
+            rate-limit 'headers' to send
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            headers = {}
+
+            if self.requests_per_minute:
+                while self._accepted and now - self._accepted[0] >= 60:
+                    self._accepted.popleft()
+                remaining = self.requests_per_minute - len(self._accepted)
+                reset = 60 - (now - self._accepted[0]) if self._accepted else 0
+                headers = {
+                    'x-ratelimit-limit-requests': str(self.requests_per_minute),
+                    'x-ratelimit-remaining-requests': str(max(0, remaining - 1)),
+                    'x-ratelimit-reset-requests': f'{reset:.3f}s'
+                }
+                if remaining <= 0:
+                    self.stats['rate_limited'] += 1
+                    return {'status': 429, 'delay': 0.0,
+                            'headers': dict(headers, **{'retry-after': f'{max(reset, self.retry_after):.3f}'})}
+
+            if self.throttle_rate and self._random.random() < self.throttle_rate:
+                self.stats['rate_limited'] += 1
+                return {'status': 429, 'delay': 0.0,
+                        'headers': dict(headers, **{'retry-after': f'{self.retry_after:.3f}'})}
+
+            if self.requests_per_minute:
+                self._accepted.append(now)
+
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return {'status': 500, 'delay': delay / 2, 'headers': headers}
+
+            self.stats['completions'] += 1
+            return {'status': 200, 'delay': delay, 'headers': headers}
+
+    def count_tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['completion_tokens'] += completion_tokens
+
+
+def completion_text(messages: List[Dict]) -> str:
+    """Feedback text, or a JSON object of feedback per student for packed prompts"""
+    prompt = messages[-1].get('content', '') if messages else ''
+    students = _PACKED_STUDENT.findall(prompt)
+    if students:
+        return json.dumps({student_id: f"{name.strip()} {FEEDBACK_TEXT}" for student_id, name in students})
+    return f"The student {FEEDBACK_TEXT}"
+
+
+def _count_tokens(text: str) -> int:
+    # Roughly four characters per token, as for English text
+    return max(1, len(text) // 4)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """HTTP handler; the MockLLM is read from the server"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._send_json(200, self.server.mock.snapshot())
+        else:
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        path = self.path.rstrip('/')
+        if path == '/stats/reset':
+            self.server.mock.reset_stats()
+            self._send_json(200, {'reset': True})
+            return
+        if not path.endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+            return
+
+        try:
+            params = json.loads(body or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+            return
+
+        mock = self.server.mock
+        decision = mock.admit()
+        time.sleep(decision['delay'])
+
+        if decision['status'] == 429:
+            self._send_json(429, {'error': {'message': 'Rate limit reached for requests',
+                                            'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                            decision['headers'])
+            return
+        if decision['status'] == 500:
+            self._send_json(500, {'error': {'message': 'The server had an error while processing your request',
+                                            'type': 'server_error'}}, decision['headers'])
+            return
+
+        messages = params.get('messages') or []
+        text = completion_text(messages)
+        prompt_tokens = sum(_count_tokens(message.get('content', '')) for message in messages)
+        completion_tokens = _count_tokens(text)
+        mock.count_tokens(prompt_tokens, completion_tokens)
+
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+        model = params.get('model', 'mock')
+        if params.get('stream'):
+            self._send_stream(completion_id, model, text, decision['headers'])
+            return
+
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens}
+        }, decision['headers'])
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, completion_id: str, model: str, text: str, headers: Dict) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+
+        event({'role': 'assistant'})
+        for word in re.findall(r'\S+\s*', text):
+            event({'content': word})
+        event({}, 'stop')
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Threaded stub server; serve_forever() or start() in a background thread"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, mock: Optional[MockLLM] = None):
+        super().__init__((host, port), MockLLMHandler)
+        self.mock = mock or MockLLM()
+
+    @property
+    def api_base(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name='mock-llm', daemon=True)
+        thread.start()
+        return thread
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    """Stub behaviour options, shared with the benchmark harness"""
+    parser.add_argument('--latency', type=float, default=0.5, help='Mean completion latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Uniform latency variation in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests failing with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests rejected with 429')
+    parser.add_argument('--rpm', type=int, default=0, help='Requests per minute before 429 (0 = unlimited)')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for errors and latency')
+
+
+def mock_from_arguments(args: argparse.Namespace) -> MockLLM:
+    return MockLLM(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                   throttle_rate=args.throttle_rate, requests_per_minute=args.rpm,
+                   retry_after=args.retry_after, seed=args.seed)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='OpenAI-compatible stub server for load tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer(args.host, args.port, mock_from_arguments(args))
+    print(f'Mock LLM listening on {server.api_base}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
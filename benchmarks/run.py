@@ -0,0 +1,451 @@
+"""
+Load-test harness for the feedback API
+
+Drives POST /api/generate-feedback, POST /api/batch-feedback and
+GET /api/feedback at a fixed concurrency and reports throughput, latency
+percentiles and the rate at which feedback rows were written. Students are
+taken from student_performance_list.csv (criteria 1-5 become the five skill
+scores).
+
+By default the app runs in this process on a temporary SQLite database and
+calls a local stub LLM (benchmarks/mock_llm.py), so no API credits are used:
+
+    python -m benchmarks.run --requests 200 --concurrency 16 --latency 0.8
+    python -m benchmarks.run --scenarios generate --set FEEDBACK_PACK_SIZE=10 --rpm 600
+
+With --target the harness drives an already running server instead. Start
+that server with OPENAI_API_BASE pointing at a stub (python -m benchmarks.mock_llm).
+
+Results are written to benchmarks/results/<timestamp>.json. --compare checks
+them against an earlier result and exits with status 1 when throughput drops
+or p95 latency rises by more than --tolerance.
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+import requests
+
+from benchmarks.mock_llm import MockLLMServer, add_mock_arguments, mock_from_arguments
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CSV = os.path.join(REPO_ROOT, 'student_performance_list.csv')
+DEFAULT_OUTPUT = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+SKILLS = ('communication', 'teamwork', 'creativity', 'critical_thinking', 'presentation')
+SCENARIOS = ('generate', 'batch', 'list')
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_students(path: str) -> List[Dict]:
+    """
+    Students and skill scores from a performance CSV
+
+    Returns:
+        Dictionaries with 'student_name' and 'scores'
+    """
+    students = []
+    with open(path, newline='', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            try:
+                scores = {skill: int(row[f'Criterion {position}']) for position, skill in enumerate(SKILLS, 1)}
+            except (KeyError, TypeError, ValueError):
+                continue
+            name = (row.get('Student') or '').strip()
+            if name and all(1 <= score <= 10 for score in scores.values()):
+                students.append({'student_name': name, 'scores': scores})
+    if not students:
+        raise SystemExit(f'No usable student rows in {path}')
+    return students
+
+
+def student_stream(students: List[Dict]) -> Iterator[Dict]:
+    """Students in order, renamed on every pass so prompts never repeat"""
+    for round_number in itertools.count(1):
+        for student in students:
+            name = student['student_name'] if round_number == 1 else f"{student['student_name']} {round_number}"
+            yield {'student_name': name, 'scores': student['scores']}
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted values"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict:
+    values = sorted(latencies)
+    summary = {f'p{q}': _ms(percentile(values, q)) for q in PERCENTILES}
+    summary['mean'] = _ms(sum(values) / len(values)) if values else None
+    summary['max'] = _ms(values[-1]) if values else None
+    return summary
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+class Harness:
+    """Runs scenarios against one API base URL"""
+
+    def __init__(self, base_url: str, students: List[Dict], concurrency: int, mock_url: Optional[str] = None):
+        self.base_url = base_url.rstrip('/')
+        self.students = students
+        self.concurrency = concurrency
+        self.mock_url = mock_url
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def feedback_count(self) -> int:
+        response = requests.get(f'{self.base_url}/api/feedback', params={'per_page': 1, 'include_total': 'true'})
+        response.raise_for_status()
+        return response.json()['pagination']['total']
+
+    def mock_stats(self) -> Optional[Dict]:
+        if not self.mock_url:
+            return None
+        try:
+            return requests.get(f'{self.mock_url}/stats', timeout=5).json()
+        except (requests.RequestException, ValueError):
+            return None
+
+    def run(self, name: str, total: int, make_request: Callable[[requests.Session, int], Dict]) -> Dict:
+        """
+        Send total requests from concurrency threads
+
+        Args:
+            name: Scenario name
+            total: Number of requests
+            make_request: Sends request i with a session and returns a dict
+                with 'status' and optionally 'students'
+
+        Returns:
+            Throughput, latency, error and write-rate statistics
+        """
+        rows_before = self.feedback_count()
+        mock_before = self.mock_stats()
+
+        latencies = []
+        statuses = {}
+        students = 0
+        lock = threading.Lock()
+
+        def worker(index):
+            nonlocal students
+            started = time.perf_counter()
+            try:
+                outcome = make_request(self._session(), index)
+            except requests.RequestException as e:
+                outcome = {'status': type(e).__name__}
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[str(outcome['status'])] = statuses.get(str(outcome['status']), 0) + 1
+                if outcome['status'] in (200, 201):
+                    latencies.append(elapsed)
+                    students += outcome.get('students', 0)
+
+        print(f'{name}: {total} requests at concurrency {self.concurrency}', file=sys.stderr)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f'bench-{name}') as pool:
+            list(pool.map(worker, range(total)))
+        duration = time.perf_counter() - started
+
+        rows_written = self.feedback_count() - rows_before
+        succeeded = len(latencies)
+        result = {
+            'requests': total,
+            'succeeded': succeeded,
+            'statuses': statuses,
+            'duration_seconds': round(duration, 3),
+            'throughput_rps': round(succeeded / duration, 2) if duration else None,
+            'latency_ms': summarize_latencies(latencies),
+            'rows_written': rows_written,
+            'rows_per_second': round(rows_written / duration, 2) if duration else None
+        }
+        if students:
+            result['students'] = students
+            result['students_per_second'] = round(students / duration, 2)
+
+        mock_after = self.mock_stats()
+        if mock_before and mock_after:
+            result['llm'] = {
+                key: mock_after[key] - mock_before[key]
+                for key in ('requests', 'completions', 'rate_limited', 'errors', 'prompt_tokens', 'completion_tokens')
+            }
+        return result
+
+    def generate(self, total: int) -> Dict:
+        stream = student_stream(self.students)
+        lock = threading.Lock()
+
+        def send(session, index):
+            with lock:
+                student = next(stream)
+            response = session.post(f'{self.base_url}/api/generate-feedback',
+                                    json={'student_name': student['student_name'], **student['scores']})
+            return {'status': response.status_code, 'students': 1 if response.ok else 0}
+
+        return self.run('generate', total, send)
+
+    def batch(self, total: int, batch_size: int) -> Dict:
+        stream = student_stream(self.students)
+        lock = threading.Lock()
+
+        def send(session, index):
+            with lock:
+                students = list(itertools.islice(stream, batch_size))
+            response = session.post(f'{self.base_url}/api/batch-feedback', json={'students': students})
+            saved = response.json().get('saved_count', 0) if response.ok else 0
+            return {'status': response.status_code, 'students': saved}
+
+        return self.run('batch', total, send)
+
+    def list(self, total: int, per_page: int, pages: int) -> Dict:
+        """Walk up to pages cursor pages per chain; every fourth request searches by name"""
+        first_names = [student['student_name'].split()[0] for student in self.students]
+
+        def send(session, index):
+            if index % 4 == 3:
+                params = {'per_page': per_page, 'student_name': first_names[index % len(first_names)],
+                          'match': 'prefix'}
+                response = session.get(f'{self.base_url}/api/feedback', params=params)
+                return {'status': response.status_code}
+
+            cursor = None
+            status = 200
+            for _ in range(pages):
+                params = {'per_page': per_page}
+                if cursor:
+                    params['cursor'] = cursor
+                response = session.get(f'{self.base_url}/api/feedback', params=params)
+                status = response.status_code
+                if not response.ok:
+                    break
+                cursor = response.json()['pagination']['next_cursor']
+                if not cursor:
+                    break
+            return {'status': status}
+
+        return self.run('list', total, send)
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions of result against a baseline result"""
+    regressions = []
+    for name, current in result['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+
+        if previous.get('throughput_rps') and current.get('throughput_rps') is not None:
+            if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+                regressions.append(f"{name}: throughput {current['throughput_rps']} req/s, "
+                                   f"baseline {previous['throughput_rps']} req/s")
+
+        old_p95 = (previous.get('latency_ms') or {}).get('p95')
+        new_p95 = (current.get('latency_ms') or {}).get('p95')
+        if old_p95 and new_p95 is not None and new_p95 > old_p95 * (1 + tolerance):
+            regressions.append(f"{name}: p95 latency {new_p95} ms, baseline {old_p95} ms")
+
+        if current['succeeded'] < current['requests'] and previous['succeeded'] == previous['requests']:
+            regressions.append(f"{name}: {current['requests'] - current['succeeded']} failed requests, "
+                               f"baseline had none")
+    return regressions
+
+
+def _parse_setting(value: str):
+    key, sep, raw = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f'Expected KEY=VALUE, got {value!r}')
+    lowered = raw.lower()
+    if lowered in ('true', 'false'):
+        return key, lowered == 'true'
+    try:
+        return key, json.loads(raw)
+    except ValueError:
+        return key, raw
+
+
+def start_app(settings: Dict, database_url: str, api_base: str, seed_rows: int, students: List[Dict]):
+    """
+    Run the app in a background thread
+
+    Returns:
+        (server, base URL)
+    """
+    from werkzeug.serving import make_server
+
+    from app import create_app, db
+    from app.config import Config
+    from app.search import setup_feedback_indexes
+    from app.utils.bulk_insert import bulk_insert_feedback, feedback_row
+
+    overrides = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'OPENAI_API_BASE': api_base,
+        'OPENAI_API_KEY': Config.OPENAI_API_KEY or 'sk-benchmark',
+        # Every request should reach the LLM unless a run opts into the cache
+        'FEEDBACK_CACHE_BACKEND': 'none',
+        'DEBUG': False,
+        **settings
+    }
+    config = type('BenchmarkConfig', (Config,), overrides)
+    app = create_app(config)
+
+    with app.app_context():
+        db.create_all()
+        setup_feedback_indexes()
+        if seed_rows:
+            rows = [
+                feedback_row(student['student_name'], student['scores'],
+                             f"{student['student_name']} seeded benchmark feedback.", 'seed')
+                for student in itertools.islice(student_stream(students), seed_rows)
+            ]
+            bulk_insert_feedback(rows, chunk_size=1000)
+            db.session.commit()
+
+    # One access log line per request would dominate the output
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='benchmark-app', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Load-test the feedback API against a stub LLM')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f'Comma-separated scenarios to run ({", ".join(SCENARIOS)})')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads')
+    parser.add_argument('--batch-size', type=int, default=20, help='Students per batch request')
+    parser.add_argument('--per-page', type=int, default=20, help='Page size of list requests')
+    parser.add_argument('--pages', type=int, default=5, help='Cursor pages walked per list request')
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='Performance CSV to take students from')
+    parser.add_argument('--seed-rows', type=int, default=1000,
+                        help='Feedback rows inserted before the run (in-process app only)')
+    parser.add_argument('--database-url', default=None,
+                        help='Database of the in-process app [default: a temporary SQLite file]')
+    parser.add_argument('--set', dest='settings', action='append', type=_parse_setting, default=[],
+                        metavar='KEY=VALUE', help='Config override for the in-process app, repeatable')
+    parser.add_argument('--target', default=None, help='Base URL of a running server instead of the in-process app')
+    parser.add_argument('--mock-url', default=None,
+                        help='Stub server URL for LLM call counts when using --target')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Directory for the JSON result')
+    parser.add_argument('--compare', default=None, help='Earlier result JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative throughput drop or p95 rise for --compare')
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+    students = load_students(args.csv)
+    mock_server = app_server = None
+    temp_dir = None
+    try:
+        if args.target:
+            base_url, mock_url = args.target, args.mock_url
+        else:
+            mock_server = MockLLMServer(mock=mock_from_arguments(args))
+            mock_server.start()
+            mock_url = mock_server.api_base[:-len('/v1')]
+
+            database_url = args.database_url
+            if not database_url:
+                temp_dir = tempfile.TemporaryDirectory(prefix='feedback-bench-')
+                database_url = f"sqlite:///{os.path.join(temp_dir.name, 'benchmark.db')}"
+            app_server, base_url = start_app(dict(args.settings), database_url, mock_server.api_base,
+                                             args.seed_rows, students)
+
+        harness = Harness(base_url, students, args.concurrency, mock_url)
+        results = {}
+        for name in scenarios:
+            if name == 'generate':
+                results[name] = harness.generate(args.requests)
+            elif name == 'batch':
+                results[name] = harness.batch(args.requests, args.batch_size)
+            else:
+                results[name] = harness.list(args.requests, args.per_page, args.pages)
+    finally:
+        if app_server is not None:
+            app_server.shutdown()
+        if mock_server is not None:
+            mock_server.shutdown()
+            mock_server.server_close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    result = {
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'git_commit': _git_commit(),
+        'settings': {
+            'target': args.target or 'in-process',
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'batch_size': args.batch_size,
+            'per_page': args.per_page,
+            'pages': args.pages,
+            'seed_rows': 0 if args.target else args.seed_rows,
+            'config': dict(args.settings),
+            'mock': None if args.target else {
+                'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+                'throttle_rate': args.throttle_rate, 'rpm': args.rpm, 'retry_after': args.retry_after
+            }
+        },
+        'scenarios': results
+    }
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json")
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(result, handle, indent=2)
+
+    for name, stats in results.items():
+        latency = stats['latency_ms']
+        print(f"{name:9} {stats['throughput_rps']} req/s  p50 {latency['p50']} ms  p95 {latency['p95']} ms  "
+              f"p99 {latency['p99']} ms  {stats['rows_per_second']} rows/s  statuses {stats['statuses']}")
+    print(f'Results written to {path}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            regressions = compare(result, json.load(handle), args.tolerance)
+        if regressions:
+            print('Regressions against ' + args.compare + ':')
+            for regression in regressions:
+                print(f'  {regression}')
+            return 1
+        print(f'No regressions against {args.compare}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,9 +7,32 @@ from app.config import config
 
 def create_tables():
     """Create database tables"""
+    from app.search import setup_feedback_indexes
+    
     with app.app_context():
         db.create_all()
-        print("Database tables created successfully!")
+        search_mode = setup_feedback_indexes()
+        print(f"Database tables created successfully! (name search: {search_mode})")
+
+def resume_jobs():
+    """Re-queue batch jobs interrupted by a previous shutdown before serving requests"""
+    from app.jobs import job_runner
+    from app.nlp import get_feedback_generator
+    
+    with app.app_context():
+        resumed = job_runner.resume_incomplete(get_feedback_generator())
+        if resumed:
+            print(f"Resumed {resumed} unfinished batch job(s)")
+
+def start_regeneration():
+    """Regenerate fallback-quality feedback in the background when enabled"""
+    from app.nlp import get_feedback_generator
+    from app.regeneration import get_regeneration_worker
+    
+    if app.config['REGEN_WORKER']:
+        with app.app_context():
+            get_regeneration_worker().start(get_feedback_generator())
+        print("Started the feedback regeneration worker")
 
 if __name__ == '__main__':
     # Get configuration from environment
@@ -21,6 +44,12 @@ if __name__ == '__main__':
     # Create tables if they don't exist
     create_tables()
     
+    # Pick up batch jobs that were still running at the last shutdown
+    resume_jobs()
+    
+    # Improve feedback that was rendered locally while the LLM was unavailable
+    start_regeneration()
+    
     # Run the application
     app.run(
         host='0.0.0.0',